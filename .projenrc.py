@@ -25,6 +25,8 @@ project = PythonProject(
         "jmespath@^1.0.1",
         "boto3@^1.28.78",
         "pydantic@^2.4.0",
+        "numpy@^1.24.0",
+        "aiohttp@^3.8.0",
     ],
     dev_deps=["projen@<=0.72.20"],
 )
@@ -0,0 +1 @@
+"""Offline benchmarks of the agent's hot paths, emitting machine-readable JSON."""
@@ -0,0 +1,57 @@
+"""
+Run the benchmarks and write a JSON report.
+
+    python -m benchmarks --output .cache/benchmarks/current.json
+    python -m benchmarks --quick --only chat_session code_writer
+    python -m benchmarks --baseline .cache/benchmarks/main.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks import chat_session, code_runner, code_writer, indexing, retrieval
+from benchmarks.harness import DEFAULT_REGRESSION_THRESHOLD, Suite, compare
+
+GROUPS = {
+    "indexing": indexing.run,
+    "retrieval": retrieval.run,
+    "chat_session": chat_session.run,
+    "code_writer": code_writer.run,
+    "code_runner": code_runner.run,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, help="where to write the JSON report, stdout by default")
+    parser.add_argument("--quick", action="store_true", help="small corpora and a single repetition, for smoke testing")
+    parser.add_argument("--only", nargs="+", choices=sorted(GROUPS), help="the groups to run, all by default")
+    parser.add_argument("--baseline", type=Path, help="a previous report to compare against, exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="the slowdown ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    suite = Suite(quick=args.quick)
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as workdir:
+        for group in args.only or GROUPS:
+            group_dir = Path(workdir) / group
+            group_dir.mkdir()
+            GROUPS[group](suite, group_dir)
+    report = suite.report()
+    if args.output:
+        suite.write(args.output)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        regressions = compare(json.loads(args.baseline.read_text(encoding="utf-8")), report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['key']}: {regression['before'] * 1000:.3f} ms -> {regression['after'] * 1000:.3f} ms ({regression['ratio']:.2f}x)", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
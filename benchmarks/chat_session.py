@@ -0,0 +1,57 @@
+"""Benchmark the cost of appending to, streaming into, windowing and serializing chat sessions."""
+from pathlib import Path
+from uuid import uuid4
+
+from langchain.schema.messages import AIMessageChunk
+
+from benchmarks.harness import Suite
+from llm_cdk_app_agent.llms.schemas import ChatRole, ChatSession, ModelName, UserChat
+
+GROUP = "chat_session"
+SIZES = (10, 100, 1_000)
+STREAM_CHUNKS = 200
+
+
+def encode_words(text):
+    """Count whitespace separated words as tokens, so the benchmark doesn't need tiktoken's encoding files."""
+    return text.split()
+
+
+def session_of(messages: int) -> ChatSession:
+    """Get a session of alternating user questions, function outputs and answers."""
+    session = ChatSession(chats=[])
+    for number in range(messages):
+        if number % 3 == 0:
+            session.append_chat(UserChat(content=f"how do I add a queue to function {number}?", role=ChatRole.USER, id=uuid4()))
+        elif number % 3 == 1:
+            session.append_function_response("read_file", "def handler(event, context):\n    return event\n" * 20)
+        else:
+            session.append_ai_chat(f"use aws_sqs.Queue and grant the function access, step {number}")
+    return session
+
+
+def _stream(session: ChatSession) -> None:
+    session.start_ai_stream()
+    for number in range(STREAM_CHUNKS):
+        session.append_message_chunk(AIMessageChunk(content=f"token{number} "))
+    session.finish_ai_stream()
+
+
+def run(suite: Suite, workdir: Path) -> None:
+    """Time each operation at 10, 100 and 1,000 messages."""
+    for messages in SIZES:
+        params = {"messages": messages}
+        suite.measure(GROUP, "append", lambda: session_of(messages), params, items=messages, unit="messages")
+        suite.measure(GROUP, "stream", _stream, params, items=STREAM_CHUNKS, unit="chunks", setup=lambda: session_of(messages))
+        session = session_of(messages)
+        suite.measure(
+            GROUP,
+            "window",
+            lambda: session.windowed_chats(ModelName.GPT_TURBO, encoder=encode_words),
+            params,
+            items=messages,
+            unit="messages",
+        )
+        suite.measure(GROUP, "serialize", session.json, params, items=messages, unit="messages")
+        raw = session.json()
+        suite.measure(GROUP, "deserialize", lambda: ChatSession.parse_raw(raw), params, items=messages, unit="messages")
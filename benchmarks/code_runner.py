@@ -0,0 +1,21 @@
+"""Benchmark the per-run overhead of executing generated code."""
+from pathlib import Path
+
+from benchmarks.harness import Suite
+from llm_cdk_app_agent.code_writer.async_runner import RunLimits
+from llm_cdk_app_agent.code_writer.code_runner import FileRunner
+from llm_cdk_app_agent.code_writer.warm_runner import WarmRunner
+
+GROUP = "code_runner"
+
+
+def run(suite: Suite, workdir: Path) -> None:
+    """Time cold FileRunner runs and warm pre-forked runs of a trivial file."""
+    runs = 3 if suite.quick else 10
+    script = workdir / "noop.py"
+    script.write_text("print('ok')\n", encoding="utf-8")
+    limits = RunLimits(timeout_seconds=30)
+    runner = FileRunner(limits)
+    suite.measure(GROUP, "file_runner", lambda: [runner.run_file(str(script)) for _ in range(runs)], {"runs": runs}, items=runs, unit="runs", repeat=3)
+    with WarmRunner(limits=limits) as warm_runner:
+        suite.measure(GROUP, "warm_runner", lambda: [warm_runner.run(str(script)) for _ in range(runs)], {"runs": runs}, items=runs, unit="runs", repeat=3)
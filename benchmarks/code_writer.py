@@ -0,0 +1,55 @@
+"""Benchmark edits to large files through the CodeWriter and its workspace."""
+import random
+from pathlib import Path
+
+from benchmarks.corpora import python_file
+from benchmarks.harness import Suite
+from llm_cdk_app_agent.code_writer.code_writer_base import CodeWriter
+from llm_cdk_app_agent.code_writer.patch import Edit, EditKind
+from llm_cdk_app_agent.code_writer.workspace import Workspace
+
+GROUP = "code_writer"
+EDITS = 100
+
+
+def run(suite: Suite, workdir: Path) -> None:
+    """Time single-line updates, one-pass multi edits and patches on a large file."""
+    lines = 3_000 if suite.quick else 60_000
+    content = python_file(lines)
+    line_count = content.count("\n")
+    rng = random.Random(2)
+    params = {"lines": line_count, "edits": EDITS}
+
+    def fresh_writer(autoflush: bool = True) -> CodeWriter:
+        writer = CodeWriter(Workspace(str(workdir / "code")), autoflush=autoflush)
+        writer.create(content, "app/handlers.py")
+        return writer
+
+    def updates(writer: CodeWriter) -> None:
+        for _ in range(EDITS):
+            writer.update("app/handlers.py", rng.randint(1, line_count), "# reviewed\n")
+
+    suite.measure(GROUP, "update_autoflush", updates, params, items=EDITS, unit="edits", repeat=3, setup=fresh_writer)
+
+    def batched_updates(writer: CodeWriter) -> None:
+        with writer.batch():
+            updates(writer)
+
+    suite.measure(GROUP, "update_batched", batched_updates, params, items=EDITS, unit="edits", repeat=3, setup=fresh_writer)
+
+    starts = sorted(rng.sample(range(1, line_count, 3), EDITS))
+    edits = [Edit(EditKind.REPLACE, start, start, f"def replaced_{start}(event, context):") for start in starts]
+    suite.measure(GROUP, "apply_edits", lambda writer: writer.apply_edits("app/handlers.py", edits), params, items=EDITS, unit="edits", repeat=3, setup=fresh_writer)
+
+    diff = fresh_writer(autoflush=False).apply_edits("app/handlers.py", edits)
+    suite.measure(GROUP, "apply_patch", lambda writer: writer.apply_patch(diff), params, items=EDITS, unit="edits", repeat=3, setup=fresh_writer)
+    suite.measure(
+        GROUP,
+        "delete_lines",
+        lambda writer: [writer.delete_file("app/handlers.py", 10, 12, False) for _ in range(EDITS)],
+        params,
+        items=EDITS,
+        unit="edits",
+        repeat=3,
+        setup=lambda: fresh_writer(autoflush=False),
+    )
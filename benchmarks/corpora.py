@@ -0,0 +1,124 @@
+"""Build the synthetic corpora the benchmarks run on, so they never need the network or real data."""
+import random
+import zipfile
+from pathlib import Path
+from typing import List
+
+from llm_cdk_app_agent.search.indexer.fetch_urls import HttpCache
+
+
+WORDS = [
+    "construct", "props", "scope", "function", "bucket", "queue", "role", "policy", "stack", "table",
+    "lambda", "grant", "read", "write", "event", "source", "mapping", "alias", "version", "runtime",
+    "handler", "timeout", "memory", "encryption", "key", "stream", "topic", "subscription", "vpc", "subnet",
+]
+
+
+def sentence(rng: random.Random, words: int = 12) -> str:
+    """Get a sentence of random CDK-ish words."""
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def identifier(rng: random.Random, parts: int = 3) -> str:
+    """Get a random CamelCase identifier, e.g. `EventSourceMapping`."""
+    return "".join(word.capitalize() for word in rng.choices(WORDS, k=parts))
+
+
+def jsii_module(module: str, classes: int, seed: int = 0) -> str:
+    """Get the source of a module shaped like the jsii generated aws_cdk modules."""
+    rng = random.Random(seed)
+    lines = ["import builtins", "import typing", "import jsii", "import constructs as _constructs_77d1e7e8", ""]
+    for number in range(classes):
+        name = f"{identifier(rng)}{number}"
+        props = [f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{position}" for position in range(8)]
+        lines += [
+            "",
+            f'class {name}(Resource, metaclass=jsii.JSIIMeta, jsii_type="aws-cdk-lib.{module}.{name}"):',
+            f"    '''{sentence(rng, 20)}",
+            "",
+            f"    {sentence(rng, 30)}",
+            "",
+            "    Example::",
+            "",
+            f"        {name.lower()} = {module}.{name}(self, \"Resource\",",
+            f"            {props[0]}=\"value\",",
+            "        )",
+            "    '''",
+            "",
+            "    def __init__(self, scope: _constructs_77d1e7e8.Construct, id: builtins.str, *,",
+            *(f"        {prop}: typing.Optional[builtins.str] = None," for prop in props),
+            "    ) -> None:",
+            "        '''",
+            *(f"        :param {prop}: {sentence(rng)}" for prop in props),
+            "        '''",
+            "",
+        ]
+        for method in range(4):
+            lines += [
+                f"    @jsii.member(jsii_name=\"method{method}\")",
+                f"    def {rng.choice(WORDS)}_{method}(self, value: builtins.str, *, option: typing.Optional[builtins.int] = None) -> None:",
+                f"        '''{sentence(rng, 15)}",
+                "",
+                "        :param value: The value.",
+                "        '''",
+                "        return typing.cast(None, jsii.invoke(self, \"method\", [value]))",
+                "",
+            ]
+        lines += [
+            "    @builtins.property",
+            "    def arn(self) -> builtins.str:",
+            f"        '''{sentence(rng)}'''",
+            "        return typing.cast(builtins.str, jsii.get(self, \"arn\"))",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def build_wheel(path: Path, modules: int, classes: int) -> Path:
+    """Write a wheel of synthetic aws_cdk modules."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as wheel:
+        for number in range(modules):
+            module = f"aws_module{number}"
+            wheel.writestr(f"aws_cdk/{module}/__init__.py", jsii_module(module, classes, seed=number))
+        wheel.writestr("aws_cdk_lib-2.0.0.dist-info/METADATA", "Name: aws-cdk-lib\nVersion: 2.0.0\n")
+    return path
+
+
+def reference_page(construct: str, rng: random.Random, members: int = 20) -> str:
+    """Get the html of a page shaped like the CDK API reference."""
+    parts = [
+        "<html><head><script>window.analytics = {};</script><style>body {}</style></head><body>",
+        "<nav><a href='/'>API Reference</a></nav>",
+        f"<h1>class {construct} (construct)</h1><p>{sentence(rng, 40)}</p><p>Example</p>",
+        f"<pre>const x = new {construct}(this, 'Resource', {{ {rng.choice(WORDS)}: true }});</pre>",
+        "<h2>Construct Props</h2><table><tr><th>Name</th><th>Type</th><th>Description</th></tr>",
+        *(f"<tr><td>{rng.choice(WORDS)}{number}</td><td><code>string</code></td><td>{sentence(rng)}</td></tr>" for number in range(members)),
+        "</table><h2>Methods</h2>",
+    ]
+    for number in range(members):
+        parts.append(f"<h3 id='m{number}'>{rng.choice(WORDS)}{number}()</h3><pre>public m{number}(): void</pre><p>{sentence(rng, 30)}</p>")
+    parts.append("<footer>Copyright</footer></body></html>")
+    return "".join(parts)
+
+
+def build_page_cache(root: Path, pages: int, seed: int = 0) -> HttpCache:
+    """Write an http cache of synthetic reference pages."""
+    rng = random.Random(seed)
+    cache = HttpCache(root)
+    for number in range(pages):
+        construct = f"{identifier(rng)}{number}"
+        url = f"https://docs.aws.amazon.com/cdk/api/v2/docs/aws-cdk-lib.aws_module{number % 20}.{construct}.html"
+        cache.store(url, reference_page(construct, rng).encode("utf-8"), None, None)
+    cache.save()
+    return cache
+
+
+def chunk_texts(count: int, seed: int = 0) -> List[str]:
+    """Get chunk texts mixing prose with CDK identifiers."""
+    rng = random.Random(seed)
+    return [f"{identifier(rng)} {sentence(rng, 25)} {identifier(rng, 2)}.{rng.choice(WORDS)}_{rng.choice(WORDS)}" for _ in range(count)]
+
+
+def python_file(lines: int) -> str:
+    """Get the source of a large python file."""
+    return "".join(f"def handler_{number}(event, context):\n    return {{'status': {number}}}\n\n" for number in range(lines // 3))
@@ -0,0 +1,148 @@
+"""Time benchmark cases and collect their results into a JSON report."""
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+
+REPORT_VERSION = 1
+# a case is a regression when it got slower than its baseline by more than this ratio
+DEFAULT_REGRESSION_THRESHOLD = 1.2
+
+
+@dataclass
+class BenchmarkResult:
+    """Define the timings of a benchmark case."""
+
+    name: str
+    group: str
+    params: Dict[str, Any]
+    # the seconds of every measured repetition
+    samples: List[float]
+    # the items (chunks, messages, lines, ...) a repetition processes, for throughput
+    items: int = 1
+    unit: str = "ops"
+
+    @property
+    def key(self) -> str:
+        """Get the id baselines are matched on, e.g. `chat_session.append[messages=100]`."""
+        params = ",".join(f"{name}={value}" for name, value in sorted(self.params.items()))
+        return f"{self.group}.{self.name}[{params}]"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the result with its summary statistics, as written to the report."""
+        ordered = sorted(self.samples)
+        median = statistics.median(ordered)
+        return {
+            **asdict(self),
+            "key": self.key,
+            "min_seconds": ordered[0],
+            "median_seconds": median,
+            "mean_seconds": statistics.fmean(ordered),
+            "p95_seconds": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            "per_second": self.items / median if median else 0.0,
+        }
+
+
+def _git_sha() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@dataclass
+class Suite:
+    """Define a benchmark run, collecting results in the order they ran."""
+
+    quick: bool = False
+    results: List[BenchmarkResult] = field(default_factory=list)
+
+    def measure(
+        self,
+        group: str,
+        name: str,
+        run: Callable[[], Any],
+        params: Optional[Dict[str, Any]] = None,
+        items: int = 1,
+        unit: str = "ops",
+        repeat: int = 5,
+        warmup: int = 1,
+        setup: Optional[Callable[[], Any]] = None,
+    ) -> BenchmarkResult:
+        """
+        Time `run` over `repeat` repetitions after `warmup` unmeasured ones.
+
+        Args
+        ----
+            group: The area the case belongs to, e.g. "retrieval".
+            name: The name of the case.
+            run: The code to time, called with the result of `setup` if there is one.
+            params: The parameters of the case, e.g. {"messages": 100}.
+            items: The items a repetition processes, throughput is reported per item.
+            unit: What an item is, e.g. "chunks".
+            repeat: The measured repetitions, a single one in quick mode.
+            warmup: The unmeasured repetitions run first.
+            setup: Builds fresh state before every repetition, outside the timing.
+
+        Returns
+        -------
+            The result, which is also added to the suite.
+
+        """
+        repeat = 1 if self.quick else repeat
+        samples = []
+        for iteration in range(warmup + repeat):
+            state = setup() if setup is not None else None
+            started_at = time.perf_counter()
+            if setup is not None:
+                run(state)
+            else:
+                run()
+            elapsed = time.perf_counter() - started_at
+            if iteration >= warmup:
+                samples.append(elapsed)
+        result = BenchmarkResult(name=name, group=group, params=params or {}, samples=samples, items=items, unit=unit)
+        self.results.append(result)
+        summary = result.to_dict()
+        print(f"{result.key:<60} {summary['median_seconds'] * 1000:10.3f} ms  {summary['per_second']:12.1f} {unit}/s", file=sys.stderr)
+        return result
+
+    def report(self) -> Dict[str, Any]:
+        """Get the JSON report of the run."""
+        return {
+            "version": REPORT_VERSION,
+            "git_sha": _git_sha(),
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": self.quick,
+            "results": [result.to_dict() for result in self.results],
+        }
+
+    def write(self, path: Union[str, Path]) -> None:
+        """Write the JSON report."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.report(), indent=2), encoding="utf-8")
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_REGRESSION_THRESHOLD
+) -> List[Dict[str, Any]]:
+    """Get the cases of `current` whose median got slower than in `baseline` by more than `threshold`."""
+    before = {result["key"]: result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        previous = before.get(result["key"])
+        if previous is None or not previous["median_seconds"]:
+            continue
+        ratio = result["median_seconds"] / previous["median_seconds"]
+        if ratio > threshold:
+            regressions.append({"key": result["key"], "ratio": ratio, "before": previous["median_seconds"], "after": result["median_seconds"]})
+    return regressions
@@ -0,0 +1,66 @@
+"""Benchmark how fast the indexers turn sources and pages into chunks."""
+from pathlib import Path
+
+from benchmarks.corpora import build_page_cache, build_wheel, chunk_texts, jsii_module
+from benchmarks.harness import Suite
+from llm_cdk_app_agent.search.indexer.cdk_symbols import SymbolIndex, parse_module
+from llm_cdk_app_agent.search.indexer.fetch_cdk import ChunkingStats, iter_cdk_chunks
+from llm_cdk_app_agent.search.indexer.html_sections import iter_page_sections, iter_section_documents
+from llm_cdk_app_agent.search.retrieval.bm25 import BM25Index
+
+GROUP = "indexing"
+
+
+def run(suite: Suite, workdir: Path) -> None:
+    """Time symbol parsing, wheel chunking, page sectioning and lexical indexing."""
+    classes = 20 if suite.quick else 200
+    modules = 4 if suite.quick else 24
+    pages = 20 if suite.quick else 200
+    workers = 2
+
+    source = jsii_module("aws_module0", classes)
+    symbols = parse_module(source, "aws_cdk.aws_module0")
+    suite.measure(GROUP, "parse_module", lambda: parse_module(source, "aws_cdk.aws_module0"), {"classes": classes}, items=len(symbols), unit="symbols")
+    suite.measure(GROUP, "symbol_index_build", lambda: SymbolIndex(symbols * 50), {"symbols": len(symbols) * 50}, items=len(symbols) * 50, unit="symbols")
+
+    wheel = build_wheel(workdir / "aws_cdk_lib-2.0.0-py3-none-any.whl", modules, classes)
+    stats = ChunkingStats()
+    chunks = sum(1 for _ in iter_cdk_chunks(wheel, max_workers=workers, stats=stats))
+    suite.measure(
+        GROUP,
+        "cdk_wheel_chunks",
+        lambda: sum(1 for _ in iter_cdk_chunks(wheel, max_workers=workers)),
+        {"modules": modules, "classes": classes, "workers": workers},
+        items=chunks,
+        unit="chunks",
+        repeat=3,
+        warmup=0,
+    )
+
+    cache = build_page_cache(workdir / "http", pages)
+    page_list = list(cache.iter_pages())
+    sections = sum(1 for url, path in page_list for _ in iter_page_sections(url, path))
+    suite.measure(
+        GROUP,
+        "html_sections",
+        lambda: sum(1 for url, path in page_list for _ in iter_page_sections(url, path)),
+        {"pages": pages},
+        items=sections,
+        unit="sections",
+        repeat=3,
+    )
+    documents = sum(1 for _ in iter_section_documents(page_list, max_workers=workers))
+    suite.measure(
+        GROUP,
+        "html_section_documents",
+        lambda: sum(1 for _ in iter_section_documents(page_list, max_workers=workers)),
+        {"pages": pages, "workers": workers},
+        items=documents,
+        unit="chunks",
+        repeat=3,
+        warmup=0,
+    )
+
+    texts = chunk_texts(2_000 if suite.quick else 20_000)
+    items = [(str(number), text, {"module": f"aws_module{number % 20}"}) for number, text in enumerate(texts)]
+    suite.measure(GROUP, "bm25_upsert", lambda: BM25Index().upsert(items, namespace="cdk-docs"), {"chunks": len(items)}, items=len(items), unit="chunks", repeat=3)
@@ -0,0 +1,75 @@
+"""Benchmark the latency of lexical, vector, hybrid and symbol lookups over a synthetic corpus."""
+import random
+from pathlib import Path
+
+from langchain.embeddings.fake import DeterministicFakeEmbedding
+from langchain.schema import Document
+
+from benchmarks.corpora import WORDS, chunk_texts, identifier, jsii_module
+from benchmarks.harness import Suite
+from llm_cdk_app_agent.search.bulk_load import BulkLoader
+from llm_cdk_app_agent.search.indexer.cdk_symbols import SymbolIndex, parse_module
+from llm_cdk_app_agent.search.local_index import LocalIndexManager
+from llm_cdk_app_agent.search.retrieval.bm25 import BM25Index
+from llm_cdk_app_agent.search.retrieval.hybrid import HybridRetriever
+from llm_cdk_app_agent.search.retrieval.rerank import rerank
+
+GROUP = "retrieval"
+DIMENSION = 256
+QUERIES = 20
+
+
+def run(suite: Suite, workdir: Path) -> None:
+    """Time a bulk load, then queries against the loaded indexes."""
+    rng = random.Random(1)
+    texts = chunk_texts(2_000 if suite.quick else 20_000)
+    documents = [Document(page_content=text, metadata={"source": f"module{number % 50}.py", "chunk_number": number}) for number, text in enumerate(texts)]
+    embeddings = DeterministicFakeEmbedding(size=DIMENSION)
+    queries = [f"{identifier(rng, 2)} {' '.join(rng.choices(WORDS, k=4))}" for _ in range(QUERIES)]
+
+    manager = LocalIndexManager(root_dir=workdir / "vectors")
+    index = manager.create_or_get_index(dimension=DIMENSION)
+    lexical_index = BM25Index()
+    lexical_index.upsert(((str(number), text, {}) for number, text in enumerate(texts)), namespace="cdk-docs")
+    loader = BulkLoader(index, embeddings, batch_size=500)
+    suite.measure(
+        GROUP,
+        "bulk_load",
+        lambda: loader.load(documents, namespace="cdk-docs"),
+        {"chunks": len(documents), "dimension": DIMENSION},
+        items=len(documents),
+        unit="vectors",
+        repeat=1,
+        warmup=0,
+    )
+
+    vectors = [embeddings.embed_query(query) for query in queries]
+    params = {"chunks": len(documents), "queries": QUERIES}
+    suite.measure(GROUP, "bm25_search", lambda: [lexical_index.search(query, 50, "cdk-docs") for query in queries], params, items=QUERIES, unit="queries")
+    suite.measure(
+        GROUP,
+        "vector_query",
+        lambda: [index.query(vector=vector, top_k=50, namespace="cdk-docs", include_metadata=True) for vector in vectors],
+        params,
+        items=QUERIES,
+        unit="queries",
+    )
+    # the hybrid retriever embeds each query, the fake embedder keeps that cost out of the measurement
+    retriever = HybridRetriever(lexical_index, index, embeddings)
+    suite.measure(GROUP, "hybrid_search", lambda: [retriever.search(query, top_k=20, namespace="cdk-docs") for query in queries], params, items=QUERIES, unit="queries")
+    pools = [retriever.search(query, top_k=50, namespace="cdk-docs", include_values=True) for query in queries]
+    suite.measure(
+        GROUP,
+        "rerank",
+        lambda: [rerank(query, pool, embeddings, max_tokens=3000, query_vector=vector) for query, pool, vector in zip(queries, pools, vectors)],
+        {"candidates": 50, "queries": QUERIES},
+        items=QUERIES,
+        unit="queries",
+    )
+    retriever.close()
+
+    symbols = [symbol for number in range(5 if suite.quick else 50) for symbol in parse_module(jsii_module(f"aws_module{number}", 40, seed=number), f"aws_cdk.aws_module{number}")]
+    symbol_index = SymbolIndex(symbols)
+    names = [symbol.short_name for symbol in rng.sample(symbols, 100)]
+    suite.measure(GROUP, "symbol_get", lambda: [symbol_index.get(name) for name in names], {"symbols": len(symbols)}, items=len(names), unit="lookups")
+    suite.measure(GROUP, "symbol_prefix", lambda: [symbol_index.prefix(name[:12]) for name in names], {"symbols": len(symbols)}, items=len(names), unit="lookups")
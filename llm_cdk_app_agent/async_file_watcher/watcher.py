@@ -1,10 +1,29 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
 from watchdog.observers import Observer
 from watchdog.events import (
+    EVENT_TYPE_DELETED,
+    EVENT_TYPE_MOVED,
     FileSystemEvent,
     FileSystemEventHandler,
 )
 
+from llm_cdk_app_agent.tracing import current_span, traced
+
+
+# how long a path must be quiet before its events are flushed to the indexer
+DEFAULT_DEBOUNCE_SECONDS = 0.5
+# the maximum number of paths handed to the indexer in one call
+DEFAULT_BATCH_SIZE = 64
+
+INDEX = "index"
+DELETE = "delete"
+
 
 class MyHandler(FileSystemEventHandler):
 
@@ -17,13 +36,189 @@ class MyHandler(FileSystemEventHandler):
 
     def on_any_event(self, event: FileSystemEvent):
         print(f'Event type: {event.event_type}  path : {event.src_path}')
-        # TODO: Handle file deletion
-        self.indexer.delete_file
-        self.indexer.index_file(event.src_path)
+        if event.is_directory:
+            return
+        if event.event_type == EVENT_TYPE_DELETED:
+            self.indexer.delete_file(event.src_path)
+        elif event.event_type == EVENT_TYPE_MOVED:
+            self.indexer.delete_file(event.src_path)
+            self.indexer.index_file(event.dest_path)
+        else:
+            self.indexer.index_file(event.src_path)
 
 
-def watch_directory(path: Path, indexer: Any) -> None:
+def watch_directory(path: Path, indexer: Any, recursive: bool = False) -> Observer:
     event_handler = MyHandler(indexer)
     observer = Observer()
-    observer.schedule(event_handler, path=str(path), recursive=False)
+    observer.schedule(event_handler, path=str(path), recursive=recursive)
     observer.start()
+    return observer
+
+
+@dataclass
+class WatcherStats:
+    """Define the health metrics of a `DebouncedIndexWatcher`."""
+
+    queue_depth: int
+    lag_seconds: float
+    received_events: int
+    coalesced_events: int
+    indexed_files: int
+    deleted_files: int
+
+
+class DebouncedIndexWatcher(FileSystemEventHandler):
+    """
+    Re-index a directory tree from file system events, debounced and batched.
+
+    Watchdog calls `on_any_event` on its own thread, which only records the latest action per path
+    and hands it to the asyncio loop. A path is flushed once it has been quiet for the debounce window,
+    so the burst of modify events from a single file rewrite costs one re-index. Flushed paths go
+    through an asyncio queue to a single consumer that calls the indexer in batches, off the loop.
+
+    The indexer must provide `index_file(path)` and `delete_file(path)`; if it also provides
+    `index_files(paths)` and `delete_files(paths)`, those are used for whole batches instead.
+    """
+
+    def __init__(
+        self,
+        indexer: Any,
+        debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        super().__init__()
+        self.indexer = indexer
+        self.debounce_seconds = debounce_seconds
+        self.batch_size = batch_size
+        # path -> (action, first event time, last event time)
+        self._pending: Dict[str, Tuple[str, float, float]] = {}
+        self._queue: "Optional[asyncio.Queue[List[Tuple[str, str, float]]]]" = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._observer: Optional[Observer] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        # (size, oldest first event time) of every batch waiting in the queue, in queue order
+        self._queued_batches: Deque[Tuple[int, float]] = deque()
+        self._oldest_in_flight: Optional[float] = None
+        self._received_events = 0
+        self._coalesced_events = 0
+        self._indexed_files = 0
+        self._deleted_files = 0
+
+    def on_any_event(self, event: FileSystemEvent) -> None:
+        """Hand an event from the watchdog thread to the asyncio loop."""
+        if event.is_directory or self._loop is None:
+            return
+        if event.event_type == EVENT_TYPE_DELETED:
+            actions = [(event.src_path, DELETE)]
+        elif event.event_type == EVENT_TYPE_MOVED:
+            actions = [(event.src_path, DELETE), (event.dest_path, INDEX)]
+        else:
+            actions = [(event.src_path, INDEX)]
+        self._loop.call_soon_threadsafe(self._record, actions)
+
+    def _record(self, actions: List[Tuple[str, str]]) -> None:
+        now = time.monotonic()
+        for path, action in actions:
+            self._received_events += 1
+            previous = self._pending.get(path)
+            if previous is None:
+                self._pending[path] = (action, now, now)
+            else:
+                # only the latest action matters, e.g. create -> modify -> delete is a single delete
+                self._coalesced_events += 1
+                self._pending[path] = (action, previous[1], now)
+
+    async def _debounce(self) -> None:
+        assert self._queue is not None
+        while True:
+            await asyncio.sleep(self.debounce_seconds / 4)
+            now = time.monotonic()
+            ready = [
+                (path, action, first_seen)
+                for path, (action, first_seen, last_seen) in self._pending.items()
+                if now - last_seen >= self.debounce_seconds
+            ]
+            for path, _, _ in ready:
+                del self._pending[path]
+            for start in range(0, len(ready), self.batch_size):
+                batch = ready[start : start + self.batch_size]
+                self._queued_batches.append((len(batch), min(first_seen for _, _, first_seen in batch)))
+                await self._queue.put(batch)
+
+    async def _consume(self) -> None:
+        assert self._queue is not None and self._loop is not None
+        while True:
+            batch = await self._queue.get()
+            _, self._oldest_in_flight = self._queued_batches.popleft()
+            try:
+                deleted = [path for path, action, _ in batch if action == DELETE]
+                indexed = [path for path, action, _ in batch if action == INDEX]
+                if deleted:
+                    await self._loop.run_in_executor(None, self._apply, "delete", deleted)
+                    self._deleted_files += len(deleted)
+                if indexed:
+                    await self._loop.run_in_executor(None, self._apply, "index", indexed)
+                    self._indexed_files += len(indexed)
+            except Exception as e:  # pylint: disable=broad-except
+                # a failing batch must not kill the watcher, the next change to those paths retries it
+                print(f"An error occurred while re-indexing: {e}")
+            finally:
+                self._oldest_in_flight = None
+                self._queue.task_done()
+
+    @traced("watcher.reindex", "operation")
+    def _apply(self, operation: str, paths: List[str]) -> None:
+        current_span().set_attribute("files", len(paths))
+        batch_method = getattr(self.indexer, f"{operation}_files", None)
+        if batch_method is not None:
+            batch_method(paths)
+            return
+        single_method = getattr(self.indexer, f"{operation}_file")
+        for path in paths:
+            single_method(path)
+
+    async def start(self, path: Path, recursive: bool = True) -> None:
+        """Start watching a directory, scheduling the debounce and index tasks on the running loop."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.ensure_future(self._debounce()),
+            asyncio.ensure_future(self._consume()),
+        ]
+        self._observer = Observer()
+        self._observer.schedule(self, path=str(path), recursive=recursive)
+        self._observer.start()
+
+    async def drain(self) -> None:
+        """Wait until every pending event has been indexed."""
+        assert self._queue is not None
+        while self._pending:
+            await asyncio.sleep(self.debounce_seconds / 4)
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        """Stop watching and cancel the background tasks, dropping unflushed events."""
+        if self._observer is not None:
+            self._observer.stop()
+            await asyncio.get_running_loop().run_in_executor(None, self._observer.join)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @property
+    def stats(self) -> WatcherStats:
+        """Get the queue depth, lag and counters of the watcher."""
+        now = time.monotonic()
+        first_seen = [first for _, first, _ in self._pending.values()]
+        first_seen.extend(first for _, first in self._queued_batches)
+        if self._oldest_in_flight is not None:
+            first_seen.append(self._oldest_in_flight)
+        return WatcherStats(
+            queue_depth=len(self._pending) + sum(size for size, _ in self._queued_batches),
+            lag_seconds=now - min(first_seen) if first_seen else 0.0,
+            received_events=self._received_events,
+            coalesced_events=self._coalesced_events,
+            indexed_files=self._indexed_files,
+            deleted_files=self._deleted_files,
+        )
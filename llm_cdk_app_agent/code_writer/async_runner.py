@@ -0,0 +1,263 @@
+"""Run generated files concurrently in resource-limited subprocesses."""
+import asyncio
+import codecs
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import IO, Callable, List, Optional, Sequence
+
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_MEMORY_BYTES = 1 << 30
+# how much of each stream is kept in the result, enough for a traceback without flooding the prompt
+DEFAULT_MAX_OUTPUT_BYTES = 16 * 1024
+_READ_SIZE = 4096
+# applies the limits given as arguments and execs the run in its place, no python code may run in the
+# forked child before exec (like a preexec_fn) as the pool's other threads may hold locks at fork time
+_LIMIT_RESOURCES_SHIM = (
+    "import os, resource, sys\n"
+    "cpu_seconds, memory_bytes = int(sys.argv[1]), int(sys.argv[2])\n"
+    "resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))\n"
+    "if memory_bytes >= 0:\n"
+    "    resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))\n"
+    "os.execv(sys.argv[3], sys.argv[3:])\n"
+)
+
+# called with the stream name ("stdout" or "stderr") and the text read from it
+OutputCallback = Callable[[str, str], None]
+
+
+@dataclass(frozen=True)
+class RunLimits:
+    """Define the resource limits of a run."""
+
+    timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS
+    # cpu time limit, defaults to the wall-clock timeout
+    cpu_seconds: Optional[int] = None
+    # address space limit, None leaves it unlimited
+    memory_bytes: Optional[int] = DEFAULT_MEMORY_BYTES
+    max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES
+
+
+@dataclass
+class RunResult:
+    """Define the outcome of running a file."""
+
+    filepath: str
+    # negative when the process was killed by a signal, like subprocess
+    exit_code: int
+    duration_seconds: float
+    peak_rss_bytes: int
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    truncated: bool = False
+
+    @property
+    def ok(self) -> bool:
+        """Get whether the run exited cleanly."""
+        return self.exit_code == 0 and not self.timed_out
+
+    def summary(self) -> str:
+        """Get a short description of the run, to feed back to the LLM."""
+        if self.timed_out:
+            status = "timed out"
+        elif self.exit_code < 0:
+            status = f"killed by signal {-self.exit_code}"
+        else:
+            status = f"exited with code {self.exit_code}"
+        parts = [f"{self.filepath} {status} after {self.duration_seconds:.2f}s"]
+        if self.stdout:
+            parts.append(f"stdout:\n{self.stdout}")
+        if self.stderr:
+            parts.append(f"stderr:\n{self.stderr}")
+        if self.truncated:
+            parts.append("(output truncated)")
+        return "\n".join(parts)
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _limited_command(python: str, filepath: str, limits: RunLimits) -> List[str]:
+    cpu_seconds = limits.cpu_seconds or max(1, int(limits.timeout_seconds + 0.999))
+    memory_bytes = -1 if limits.memory_bytes is None else limits.memory_bytes
+    # -S skips site, the shim only needs builtin modules
+    return [python, "-S", "-c", _LIMIT_RESOURCES_SHIM, str(cpu_seconds), str(memory_bytes), python, filepath]
+
+
+class _OutputCollector:
+    """Drain a pipe, keeping the first bytes of it and passing decoded text to a callback."""
+
+    def __init__(self, name: str, pipe: IO[bytes], max_bytes: int, on_output: Optional[OutputCallback]) -> None:
+        self.name = name
+        self.pipe = pipe
+        self.max_bytes = max_bytes
+        self.on_output = on_output
+        self.kept = bytearray()
+        self.truncated = False
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # keep reading past the limit, so a chatty child never blocks on a full pipe
+        for data in iter(lambda: self.pipe.read1(_READ_SIZE), b""):  # type: ignore[attr-defined]
+            room = self.max_bytes - len(self.kept)
+            if room > 0:
+                self.kept += data[:room]
+            if len(data) > room:
+                self.truncated = True
+            if self.on_output is not None:
+                text = decoder.decode(data)
+                if text:
+                    self.on_output(self.name, text)
+        self.pipe.close()
+
+    def drain(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the pipe to close, returning whether it did."""
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def text(self) -> str:
+        # a copy, the drain thread may still be appending when the pipe is held open past the deadline
+        return bytes(self.kept).decode("utf-8", errors="replace")
+
+
+def _kill_group(pgid: int) -> None:
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_file_blocking(
+    filepath: str,
+    limits: RunLimits = RunLimits(),
+    python: str = sys.executable,
+    cwd: Optional[str] = None,
+    on_output: Optional[OutputCallback] = None,
+) -> RunResult:
+    """
+    Run a python file under resource limits, blocking until it exits or times out.
+
+    The child runs in its own session so a timeout kills everything it spawned, and it is reaped with
+    `os.wait4` to read its peak resident memory. Anything it left running is killed once it's reaped,
+    and its output is only awaited until the deadline, so a background process that holds the pipes
+    open (even one that left the session) can't stretch the run past its timeout. The limits are set by a shim that then execs the file,
+    as a `preexec_fn` isn't safe to run from the pool's worker threads.
+    """
+    if not os.path.isfile(filepath):
+        raise ValueError("Not a valid file to run")
+    started_at = time.perf_counter()
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        _limited_command(python, filepath, limits),
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    stdout = _OutputCollector("stdout", process.stdout, limits.max_output_bytes, on_output)
+    stderr = _OutputCollector("stderr", process.stderr, limits.max_output_bytes, on_output)
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        _kill_group(process.pid)
+
+    timer = threading.Timer(limits.timeout_seconds, kill)
+    timer.start()
+    try:
+        _, status, usage = os.wait4(process.pid, 0)
+    finally:
+        timer.cancel()
+    # the run is over, background processes it left in its session would keep the pipes open
+    _kill_group(process.pid)
+    deadline = started_at + limits.timeout_seconds
+    for collector in (stdout, stderr):
+        if not collector.drain(max(0.0, deadline - time.perf_counter())):
+            timed_out.set()
+    duration = time.perf_counter() - started_at
+    # the child is reaped already, tell Popen so it doesn't try again
+    process.returncode = _exit_code(status)
+    return RunResult(
+        filepath=filepath,
+        exit_code=process.returncode,
+        duration_seconds=duration,
+        # ru_maxrss is in kilobytes on linux
+        peak_rss_bytes=usage.ru_maxrss * 1024,
+        stdout=stdout.text(),
+        stderr=stderr.text(),
+        timed_out=timed_out.is_set(),
+        truncated=stdout.truncated or stderr.truncated,
+    )
+
+
+class AsyncRunnerPool:
+    """
+    Run generated files concurrently, at most `max_workers` at a time.
+
+    Each run blocks a worker thread on its subprocess, so the event loop stays free. Output is passed
+    to the `on_output` callback on the event loop as it's produced.
+
+    Example
+    -------
+        async with AsyncRunnerPool(max_workers=4) as pool:
+            results = await pool.run_many(["app.py", "stack.py"])
+
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        limits: RunLimits = RunLimits(),
+        python: str = sys.executable,
+        cwd: Optional[str] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.limits = limits
+        self.python = python
+        self.cwd = cwd
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="runner")
+
+    async def run(
+        self,
+        filepath: str,
+        on_output: Optional[OutputCallback] = None,
+        limits: Optional[RunLimits] = None,
+    ) -> RunResult:
+        """Run a file, passing its output to `on_output` as it arrives."""
+        loop = asyncio.get_running_loop()
+        callback = None
+        if on_output is not None:
+
+            def callback(stream: str, text: str) -> None:
+                loop.call_soon_threadsafe(on_output, stream, text)
+
+        return await loop.run_in_executor(
+            self._executor, run_file_blocking, filepath, limits or self.limits, self.python, self.cwd, callback
+        )
+
+    async def run_many(self, filepaths: Sequence[str], on_output: Optional[OutputCallback] = None) -> List[RunResult]:
+        """Run several files concurrently, returning their results in order."""
+        return list(await asyncio.gather(*(self.run(filepath, on_output) for filepath in filepaths)))
+
+    def close(self) -> None:
+        """Wait for running files and stop the worker threads."""
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncRunnerPool":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.close()
@@ -1,21 +1,39 @@
-import subprocess
-import os
+from typing import Optional
+
+from llm_cdk_app_agent.code_writer.async_runner import RunLimits, RunResult, run_file_blocking
+from llm_cdk_app_agent.tracing import current_span, traced
 
 
 class FileRunner:
-    def run_file(self, filepath):
-        if os.path.isfile(filepath):
-            try:
-                # Run the specified file using the default associated program
-                subprocess.run(["python", filepath])
-            except Exception as e:
-                print(f"An error occurred: {e}")
-        else:
-            raise ValueError("Not a valid file to run")
+    def __init__(self, limits: Optional[RunLimits] = None) -> None:
+        self.limits = limits or RunLimits()
+
+    @traced("code_runner.run", "filepath")
+    def run_file(self, filepath) -> RunResult:
+        """
+        Run a python file under the runner's time, cpu and memory limits.
+
+        Use `AsyncRunnerPool` to run several files concurrently.
+
+        Parameters:
+        - filepath (str): The path of the file to run.
+
+        Returns:
+            RunResult: The exit code, duration, peak memory and captured output of the run.
+        """
+        # raises ValueError("Not a valid file to run") for a missing file
+        result = run_file_blocking(filepath, self.limits)
+        current_span().set_attributes(
+            exit_code=result.exit_code,
+            timed_out=result.timed_out,
+            duration_seconds=result.duration_seconds,
+            peak_rss_bytes=result.peak_rss_bytes,
+        )
+        return result
 
 
 # Example usage:
 if __name__ == "__main__":
     runner = FileRunner()
     file_to_run = "temp_code_dest/fml/kys/blah.py"  # Replace with the actual file path
-    runner.run_file(file_to_run)
+    print(runner.run_file(file_to_run).summary())
@@ -1,10 +1,63 @@
 import re
 import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+from llm_cdk_app_agent.code_writer.fence_parser import extract_code_blocks
+from llm_cdk_app_agent.code_writer.patch import (
+    Edit,
+    EditKind,
+    PatchError,
+    apply_edits,
+    check_expected,
+    parse_unified_diff,
+    unified_diff,
+)
+from llm_cdk_app_agent.code_writer.workspace import DEFAULT_BASE_PATH, Workspace, atomic_write
+from llm_cdk_app_agent.tracing import current_span, traced
 
 
 class CodeWriter:
-    BASE_PATH = "temp_code_dest/"
+    BASE_PATH = DEFAULT_BASE_PATH
 
+    def __init__(self, workspace: Optional[Workspace] = None, autoflush: bool = True) -> None:
+        """
+        Set up the writer on top of an in-memory workspace.
+
+        parameters
+        - workspace: the workspace overlay edits are applied to, one rooted at BASE_PATH by default
+        - autoflush: whether every call writes its changes to disk, use `batch` to group edits instead
+        """
+        self.workspace = workspace if workspace is not None else Workspace(self.BASE_PATH)
+        self.autoflush = autoflush
+        self._batch_depth = 0
+
+    @contextmanager
+    def batch(self) -> Iterator["CodeWriter"]:
+        """
+        Group edits so the changed files are written to disk once, when the outermost batch exits.
+
+        With autoflush off nothing is written until `flush` is called.
+
+        Returns:
+            the writer itself
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+        self._maybe_flush()
+
+    def flush(self) -> None:
+        """Write every pending edit to disk."""
+        self.workspace.flush()
+
+    def _maybe_flush(self) -> None:
+        if self.autoflush and self._batch_depth == 0:
+            self.workspace.flush()
+
+    @traced("code_writer.create", "filepath")
     def create(self, content: str, filepath: str) -> None:
         """
         This is the create method that will write passed code to a new file and write the the file to the provided path relative the BASE_PATH
@@ -17,69 +70,69 @@ class CodeWriter:
             void
         """
         # content will likely be markdown formatted, need to remove any extra characters that might pollute our python file
-        content = self.remove_markdown(content)
+        self.write(self.remove_markdown(content), filepath)
 
-        # file path should start with / - trim whitespace and append backslash if it doesn't exist
-        if filepath.strip()[0] == "/":
-            filepath = filepath[1::]
+    @traced("code_writer.write", "filepath")
+    def write(self, content: str, filepath: str) -> None:
+        """
+        Write content to a file as is, e.g. code already pulled out of its markdown fence.
 
-        filepath = os.path.join(self.BASE_PATH, filepath)
-        if self.is_valid_linux_filepath(filepath):
-            self.create_file(filepath, content)
-        else:
-            raise ValueError("file path is not valid please enter a valid linux filepath")
+        parameters
+        - content: the exact file content
+        - filepath: relative path of the file in the workspace, a leading / is ignored
 
-        # raise ValueError('This is not a valid linux filepath: reference this example to "/home/user/documents/example.py"')
+        Returns:
+            void
+        """
+        filepath = filepath.strip().lstrip("/")
+        if not self.is_valid_linux_filepath(os.path.join(self.workspace.base_path, filepath)):
+            raise ValueError("file path is not valid please enter a valid linux filepath")
+        self.workspace.write(filepath, content)
+        self._maybe_flush()
 
+    @traced("code_writer.delete_file", "filepath", "deleteAll")
     def delete_file(self, filepath: str, startLine: int, endLine: int, deleteAll) -> str:
-        fullPath = self.BASE_PATH + filepath
+        """
+        Delete a whole file, or the lines with 0-based indexes from startLine to endLine inclusive.
+
+        parameters
+        - filepath: relative path of the file in the workspace
+        - startLine: index of the first line to delete
+        - endLine: index of the last line to delete
+        - deleteAll: whether to delete the entire file
+
+        Returns:
+            a description of what was deleted
+        """
+        fullPath = os.path.join(self.workspace.base_path, filepath.strip().lstrip("/"))
 
-        if(os.path.exists(fullPath) and self.is_valid_linux_filepath(fullPath)):
+        if self.is_valid_linux_filepath(fullPath) and self.workspace.exists(filepath):
             if deleteAll:
-                os.remove(fullPath)
+                self.workspace.delete(filepath)
+                self._maybe_flush()
                 return "deleted entire file"
-            else:
-                with open(fullPath, "r") as fMatt:
-                    lines = fMatt.readlines()
-                with open(fullPath, "w") as fMattAgain:
-                    for number, line in enumerate(lines):
-                        if number not in range(startLine, endLine + 1):
-                            print(line)
-                            fMattAgain.write(line)
-                return "deleted lines " + str(startLine) + "-" + str(endLine)
+            self.workspace.delete_lines(filepath, startLine, endLine)
+            self._maybe_flush()
+            return "deleted lines " + str(startLine) + "-" + str(endLine)
         raise ValueError("file path does not exist, please try again!")
-    
 
     def remove_markdown(self, text):
         """
-        Remove Markdown syntax from the input text.
+        Get the code out of a markdown formatted completion.
 
-        This function removes common Markdown elements such as headers, bold and italic text, code blocks, inline code,
-        and lists from the provided text.
+        The text is parsed in a single pass. When it contains fenced code blocks their contents are
+        kept and the surrounding prose is dropped, text without fences is assumed to be code already.
 
         Parameters:
-        - text (str): The input text containing Markdown syntax.
+        - text (str): The completion, possibly containing markdown.
 
         Returns:
-            str: The cleaned text with Markdown syntax removed.
+            str: The code of every fenced block joined together, or the text unchanged.
         """
-        # Remove headers (## Header)
-        text = re.sub(r"^\s*#.*$", "", text, flags=re.MULTILINE)
-
-        # Remove bold and italic (**bold** or *italic*)
-        text = re.sub(r"(\*\*|__)(.*?)\1", r"\2", text)
-        text = re.sub(r"(\*|_)(.*?)\1", r"\2", text)
-
-        # Remove code blocks (```python ... ```)
-        text = re.sub(r"```.*?```", "", text, flags=re.DOTALL)
-
-        # Remove inline code (`code`)
-        text = re.sub(r"`([^`]+)`", "", text)
-
-        # Remove lists
-        text = re.sub(r"^\s*[-*+]\s+.*$", "", text, flags=re.MULTILINE)
-
-        return text
+        blocks = extract_code_blocks(text)
+        if not blocks:
+            return text
+        return "\n".join(block.content for block in blocks)
 
     def is_valid_linux_filepath(self, filepath):
         """
@@ -120,10 +173,9 @@ class CodeWriter:
             os.makedirs(directory)
 
         # Create the file and write content if provided
-        with open(filepath, "w") as file:
-            if content:
-                file.write(content)
+        atomic_write(filepath, content or "")
 
+    @traced("code_writer.update", "file_path", "line_number")
     def update(self, file_path: str, line_number: int, text_to_insert: str) -> None:
         """
         Insert text at a specific line in a file.
@@ -136,22 +188,80 @@ class CodeWriter:
         Returns:
         None
         """
-        print(135, file_path)
-        full_path = self.BASE_PATH + file_path
-        print(137, full_path)
+        full_path = os.path.join(self.workspace.base_path, file_path.strip().lstrip("/"))
         if self.is_valid_linux_filepath(full_path):
-            # Read the existing content
-            with open(full_path, "r") as file:
-                lines = file.readlines()
+            # Insert the new text at the specified line of the in-memory buffer
+            self.workspace.insert_lines(file_path, line_number, text_to_insert)
+            self._maybe_flush()
+        else:
+            raise ValueError("filepath not valid please enter a valid linux filepath")
+
+    @traced("code_writer.apply_edits", "filepath")
+    def apply_edits(self, filepath: str, edits: Sequence[Union[Edit, Dict[str, Any]]]) -> str:
+        """
+        Apply several edits to a file in one pass and one write.
 
-            # Insert the new text at the specified line
-            lines.insert(line_number - 1, text_to_insert + "\n")
+        Every edit uses the original line numbering of the file, so the caller never has to account for
+        lines shifted by earlier edits. Overlapping or out of range edits are rejected before anything changes.
 
-            # Write the modified content back to the file
-            with open(full_path, "w") as file:
-                file.writelines(lines)
-        else:
+        parameters
+        - filepath: relative path of the file in the workspace
+        - edits: Edit objects, or dicts like {"kind": "replace", "start": 3, "end": 5, "text": "..."}
+
+        Returns:
+            the unified diff of the change
+        """
+        if not self.is_valid_linux_filepath(os.path.join(self.workspace.base_path, filepath.strip().lstrip("/"))):
             raise ValueError("filepath not valid please enter a valid linux filepath")
+        edits = [edit if isinstance(edit, Edit) else Edit(**{**edit, "kind": EditKind(edit["kind"])}) for edit in edits]
+        before = self.workspace.lines(filepath)
+        after = apply_edits(before, edits)
+        current_span().set_attribute("edits", len(edits))
+        self.workspace.write(filepath, "".join(after))
+        self._maybe_flush()
+        return unified_diff(self.workspace.normalize(filepath), before, after)
+
+    @traced("code_writer.apply_patch")
+    def apply_patch(self, diff_text: str) -> str:
+        """
+        Apply a unified diff to the workspace, creating, editing or deleting the files it covers.
+
+        Every file is checked against the diff's context before any of them is changed, and all of
+        them are written in one flush.
+
+        parameters
+        - diff_text: the unified diff, paths may carry git's a/ and b/ prefixes
+
+        Returns:
+            the unified diff of what was actually changed
+        """
+        planned: List[tuple] = []
+        for patch in parse_unified_diff(diff_text):
+            path = patch.old_path if patch.is_deleted_file else patch.new_path
+            if not self.is_valid_linux_filepath(os.path.join(self.workspace.base_path, path)):
+                raise ValueError(f"{path} is not a valid linux filepath")
+            if patch.is_new_file:
+                if self.workspace.exists(path):
+                    raise PatchError(f"{path} already exists, the diff expects to create it.")
+                before: List[str] = []
+            else:
+                before = self.workspace.lines(path)
+                check_expected(path, before, patch.expected)
+            after = None if patch.is_deleted_file else apply_edits(before, patch.edits)
+            planned.append((path, before, after))
+        current_span().set_attribute("files", len(planned))
+
+        diffs = []
+        with self.batch():
+            for path, before, after in planned:
+                if after is None:
+                    self.workspace.delete(path)
+                    after = []
+                else:
+                    self.workspace.write(path, "".join(after))
+                diffs.append(unified_diff(self.workspace.normalize(path), before, after))
+        return "".join(diffs)
+
 
 
 # obj = CodeWriter()
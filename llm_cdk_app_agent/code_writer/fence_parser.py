@@ -0,0 +1,199 @@
+"""Pull fenced code blocks out of a streamed LLM completion and write them as they close."""
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, AsyncIterable, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from llm_cdk_app_agent.code_writer.code_writer_base import CodeWriter
+
+
+# an opening fence: up to 3 spaces, 3+ backticks or tildes, then the info string
+_OPENING_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([^`]*?)\s*$")
+# a line of prose that only names a file, e.g. "**app/stack.py**", "File: `app.py`" or "# app.py"
+_PATH_LINE = re.compile(r"^[\s#>*`]*(?:(?:file(?:name)?|path)\s*:\s*)?[`*]*([\w./-]+\.\w+)[`*:\s]*$", re.IGNORECASE)
+# a first line inside a block that names its file, e.g. "# filename: app.py"
+_PATH_COMMENT = re.compile(r"^\s*(?:#|//)\s*(?:file(?:name)?|path)\s*:\s*([\w./-]+\.\w+)\s*$", re.IGNORECASE)
+_PATH_ATTRIBUTE = re.compile(r"^(?:title|file(?:name)?|path)=[\"']?([\w./-]+)[\"']?$", re.IGNORECASE)
+
+
+@dataclass
+class CodeBlock:
+    """Define a fenced code block of a completion."""
+
+    language: Optional[str]
+    path: Optional[str]
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def content(self) -> str:
+        """Get the code of the block."""
+        return "".join(self.lines)
+
+
+def _path_from_info(tokens: List[str]) -> Optional[str]:
+    for token in tokens:
+        attribute = _PATH_ATTRIBUTE.match(token)
+        if attribute:
+            return attribute.group(1)
+        if "." in token or "/" in token:
+            return token
+    return None
+
+
+class CodeFenceParser:
+    """
+    Parse a completion incrementally, one chunk at a time, in a single pass.
+
+    Complete lines are classified as they arrive: prose outside a fence is only kept as the last
+    non-empty line (a possible file path hint for the next block), and lines inside a fence are
+    appended to the open block. `feed` returns every block closed by the chunk, so callers can act
+    on a block while the rest of the completion is still being generated.
+    """
+
+    def __init__(self) -> None:
+        self._pending = ""
+        self._fence: Optional[str] = None
+        self._block: Optional[CodeBlock] = None
+        self._last_prose_line = ""
+        self.blocks: List[CodeBlock] = []
+
+    @property
+    def in_block(self) -> bool:
+        """Get whether the parser is inside a fenced block."""
+        return self._block is not None
+
+    def feed(self, chunk: str) -> List[CodeBlock]:
+        """Consume a chunk of the completion, returning the blocks it closed."""
+        self._pending += chunk
+        closed = []
+        start = 0
+        while True:
+            end = self._pending.find("\n", start)
+            if end == -1:
+                break
+            block = self._line(self._pending[start : end + 1])
+            if block is not None:
+                closed.append(block)
+            start = end + 1
+        self._pending = self._pending[start:]
+        return closed
+
+    def close(self) -> List[CodeBlock]:
+        """Finish the completion, closing a block left open by a truncated response."""
+        closed = []
+        if self._pending:
+            block = self._line(self._pending)
+            self._pending = ""
+            if block is not None:
+                closed.append(block)
+        if self._block is not None:
+            closed.append(self._finish())
+        return closed
+
+    def _finish(self) -> CodeBlock:
+        block = self._block
+        self._block, self._fence = None, None
+        self.blocks.append(block)
+        return block
+
+    def _line(self, line: str) -> Optional[CodeBlock]:
+        stripped = line.strip()
+        if self._block is not None:
+            fence = self._fence
+            if stripped and stripped[0] == fence[0] and set(stripped) == {fence[0]} and len(stripped) >= len(fence):
+                return self._finish()
+            if not self._block.lines and self._block.path is None:
+                comment = _PATH_COMMENT.match(line)
+                if comment:
+                    self._block.path = comment.group(1)
+                    return None
+            self._block.lines.append(line)
+            return None
+        opening = _OPENING_FENCE.match(line.rstrip("\r\n"))
+        if opening:
+            tokens = opening.group(2).split()
+            language = tokens[0] if tokens and "=" not in tokens[0] and "." not in tokens[0] else None
+            path = _path_from_info(tokens[1:] if language else tokens)
+            if path is None:
+                hint = _PATH_LINE.match(self._last_prose_line)
+                path = hint.group(1) if hint else None
+            self._fence = opening.group(1)
+            self._block = CodeBlock(language=language, path=path)
+            self._last_prose_line = ""
+        elif stripped:
+            self._last_prose_line = stripped
+        return None
+
+
+def extract_code_blocks(text: str) -> List[CodeBlock]:
+    """Get every fenced code block of a complete text."""
+    parser = CodeFenceParser()
+    parser.feed(text)
+    parser.close()
+    return parser.blocks
+
+
+def _chunk_text(chunk: Any) -> str:
+    # chunks are plain strings or langchain message chunks
+    return chunk if isinstance(chunk, str) else chunk.content
+
+
+class CodeBlockStreamWriter:
+    """
+    Write the code blocks of a streamed completion to the workspace as soon as each one closes.
+
+    Blocks without a path hint are written to `default_path` when one is given. Blocks without a path,
+    or with a path the writer rejects, are only collected in `skipped`, so one bad block never stops
+    the rest of the stream.
+    """
+
+    def __init__(self, writer: "CodeWriter", default_path: Optional[str] = None) -> None:
+        self.writer = writer
+        self.default_path = default_path
+        self.parser = CodeFenceParser()
+        self.written: List[CodeBlock] = []
+        self.skipped: List[CodeBlock] = []
+
+    def _write(self, block: CodeBlock) -> None:
+        path = block.path or self.default_path
+        if path is None:
+            self.skipped.append(block)
+            return
+        block.path = path
+        try:
+            # the content is already out of its fence, `create` would strip any fence nested in it
+            self.writer.write(block.content, path)
+        except ValueError:
+            # e.g. a requirements.txt or cdk.json block, which the writer doesn't accept
+            self.skipped.append(block)
+            return
+        self.written.append(block)
+
+    def write(self, chunks: Iterable[Any]) -> List[CodeBlock]:
+        """Consume a stream of chunks, writing each block as it closes, and return the written blocks."""
+        for chunk in chunks:
+            for block in self.parser.feed(_chunk_text(chunk)):
+                self._write(block)
+        for block in self.parser.close():
+            self._write(block)
+        return self.written
+
+    async def awrite(self, chunks: AsyncIterable[Any]) -> List[CodeBlock]:
+        """
+        Consume an async stream of chunks, writing each block as it closes, and return the written blocks.
+
+        Files are written on a single background thread, so receiving tokens isn't blocked on disk writes
+        and blocks that target the same path are still written in order.
+        """
+        loop = asyncio.get_running_loop()
+        pending: List["asyncio.Future[None]"] = []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            async for chunk in chunks:
+                for block in self.parser.feed(_chunk_text(chunk)):
+                    pending.append(loop.run_in_executor(executor, self._write, block))
+            for block in self.parser.close():
+                pending.append(loop.run_in_executor(executor, self._write, block))
+            await asyncio.gather(*pending)
+        return self.written
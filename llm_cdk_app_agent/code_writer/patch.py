@@ -0,0 +1,210 @@
+"""Apply several line edits, or a unified diff, to a file in a single pass."""
+import difflib
+import re
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Sequence
+
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# path used by unified diffs for the missing side of a created or deleted file
+DEV_NULL = "/dev/null"
+
+
+class PatchError(ValueError):
+    """Raise when edits overlap, fall outside the file or don't match its content."""
+
+
+class EditKind(str, Enum):
+    """Define the kinds of line edits."""
+
+    INSERT = "insert"
+    REPLACE = "replace"
+    DELETE = "delete"
+
+
+@dataclass(frozen=True)
+class Edit:
+    """
+    Define a line edit against the original, 1-based line numbering of a file.
+
+    An insert puts `text` before line `start` (one past the last line appends). A replace or delete
+    covers the lines from `start` to `end` inclusive.
+    """
+
+    kind: EditKind
+    start: int
+    end: Optional[int] = None
+    text: str = ""
+
+    @property
+    def last_line(self) -> int:
+        """Get the last line the edit covers, which is `start - 1` for an insert as it covers none."""
+        if self.kind == EditKind.INSERT:
+            return self.start - 1
+        return self.start if self.end is None else self.end
+
+    def new_lines(self) -> List[str]:
+        """Get the lines the edit puts in place, each ending with a newline."""
+        if self.kind == EditKind.DELETE or (self.kind == EditKind.REPLACE and not self.text):
+            return []
+        return (self.text if self.text.endswith("\n") else self.text + "\n").splitlines(keepends=True)
+
+
+@dataclass
+class FilePatch:
+    """Define the edits a unified diff makes to one file."""
+
+    old_path: str
+    new_path: str
+    edits: List[Edit] = field(default_factory=list)
+    # the original lines each hunk expects, checked before the edits are applied
+    expected: Dict[int, str] = field(default_factory=dict)
+
+    @property
+    def is_new_file(self) -> bool:
+        """Get whether the diff creates the file."""
+        return self.old_path == DEV_NULL
+
+    @property
+    def is_deleted_file(self) -> bool:
+        """Get whether the diff deletes the file."""
+        return self.new_path == DEV_NULL
+
+
+def validate_edits(edits: Sequence[Edit], line_count: int) -> List[Edit]:
+    """
+    Check that edits fit the file and don't overlap.
+
+    Args
+    ----
+        edits: The edits, in any order.
+        line_count: The number of lines in the original file.
+
+    Returns
+    -------
+        The edits sorted by position, inserts before a range that starts at the same line.
+
+    """
+    for edit in edits:
+        if edit.kind == EditKind.INSERT:
+            if not 1 <= edit.start <= line_count + 1:
+                raise PatchError(f"Insert at line {edit.start} is outside lines 1-{line_count + 1}.")
+        elif not 1 <= edit.start <= edit.last_line <= line_count:
+            raise PatchError(f"{edit.kind.value} of lines {edit.start}-{edit.last_line} is outside lines 1-{line_count}.")
+    ordered = sorted(edits, key=lambda edit: (edit.start, edit.kind != EditKind.INSERT))
+    covered_until = 0
+    previous: Optional[Edit] = None
+    for edit in ordered:
+        if edit.start <= covered_until:
+            raise PatchError(f"{edit.kind.value} at line {edit.start} overlaps {previous.kind.value} at line {previous.start}.")
+        if edit.kind == EditKind.INSERT and previous is not None and previous.kind == EditKind.INSERT and previous.start == edit.start:
+            raise PatchError(f"Two inserts at line {edit.start}, merge them into one.")
+        covered_until = max(covered_until, edit.last_line)
+        previous = edit
+    return ordered
+
+
+def apply_edits(lines: Sequence[str], edits: Sequence[Edit]) -> List[str]:
+    """Get the lines of a file with every edit applied, in one pass over the original lines."""
+    ordered = validate_edits(edits, len(lines))
+    result: List[str] = []
+    position = 0
+    for edit in ordered:
+        result.extend(lines[position : edit.start - 1])
+        if result and not result[-1].endswith("\n"):
+            result[-1] += "\n"
+        result.extend(edit.new_lines())
+        position = max(position, edit.last_line, edit.start - 1)
+    result.extend(lines[position:])
+    return result
+
+
+def unified_diff(path: str, before: Sequence[str], after: Sequence[str]) -> str:
+    """Get the unified diff between two versions of a file."""
+    return "".join(difflib.unified_diff(before, after, fromfile=f"a/{path}", tofile=f"b/{path}"))
+
+
+def _strip_diff_path(path: str) -> str:
+    path = path.split("\t")[0].strip()
+    if path != DEV_NULL and path[:2] in ("a/", "b/"):
+        return path[2:]
+    return path
+
+
+def _flush_run(patch: FilePatch, start: int, removed: int, added: List[str]) -> None:
+    if removed and added:
+        patch.edits.append(Edit(EditKind.REPLACE, start, start + removed - 1, "".join(added)))
+    elif removed:
+        patch.edits.append(Edit(EditKind.DELETE, start, start + removed - 1))
+    elif added:
+        patch.edits.append(Edit(EditKind.INSERT, start, text="".join(added)))
+
+
+def parse_unified_diff(diff_text: str) -> List[FilePatch]:
+    """
+    Parse a unified diff into per-file edits against the original line numbering.
+
+    Each run of removed and added lines becomes one replace, delete or insert. Context and removed
+    lines are kept in `expected` so the patch can be checked against the file before it's applied.
+    """
+    patches: List[FilePatch] = []
+    patch: Optional[FilePatch] = None
+    lines = diff_text.splitlines(keepends=True)
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        if line.startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ "):
+            patch = FilePatch(_strip_diff_path(line[4:]), _strip_diff_path(lines[index + 1][4:]))
+            patches.append(patch)
+            index += 2
+            continue
+        header = _HUNK_HEADER.match(line)
+        if header is None:
+            index += 1
+            continue
+        if patch is None:
+            raise PatchError("Hunk found before a ---/+++ file header.")
+        old_line = int(header.group(1))
+        old_count = 1 if header.group(2) is None else int(header.group(2))
+        new_count = 1 if header.group(4) is None else int(header.group(4))
+        # a hunk that adds to an empty range starts after the given line
+        if old_count == 0:
+            old_line += 1
+        run_start, removed, added = old_line, 0, []
+        index += 1
+        while index < len(lines) and (old_count > 0 or new_count > 0):
+            body = lines[index]
+            if body.startswith("\\"):
+                index += 1
+                continue
+            marker, text = body[:1], body[1:]
+            if marker == "-":
+                patch.expected[old_line] = text
+                old_line += 1
+                old_count -= 1
+                removed += 1
+            elif marker == "+":
+                added.append(text)
+                new_count -= 1
+            elif marker in (" ", "\n", ""):
+                _flush_run(patch, run_start, removed, added)
+                patch.expected[old_line] = text if marker == " " else "\n"
+                old_line += 1
+                old_count -= 1
+                new_count -= 1
+                run_start, removed, added = old_line, 0, []
+            else:
+                raise PatchError(f"Unexpected line in hunk: {body!r}")
+            index += 1
+        _flush_run(patch, run_start, removed, added)
+    if not patches:
+        raise PatchError("No file headers found in the diff.")
+    return patches
+
+
+def check_expected(path: str, lines: Sequence[str], expected: Dict[int, str]) -> None:
+    """Check that a file still has the lines a diff was made against."""
+    for line_number, text in expected.items():
+        if line_number > len(lines) or lines[line_number - 1].rstrip("\r\n") != text.rstrip("\r\n"):
+            raise PatchError(f"{path} line {line_number} doesn't match the diff, re-read the file and try again.")
@@ -1,19 +1,303 @@
+import mmap
 import os
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
 
-def read_file_or_directory_contents(path: str):
-    try:
+
+# output budgets sized to leave most of the context window to the conversation
+DEFAULT_MAX_OUTPUT_CHARS = 16_000
+DEFAULT_MAX_TREE_ENTRIES = 400
+DEFAULT_MAX_DEPTH = 8
+DEFAULT_CACHE_SIZE = 256
+# directories that never hold code the agent wrote
+SKIP_DIRS = frozenset(["__pycache__", ".git", ".venv", "node_modules", "cdk.out", ".pytest_cache"])
+# how much of a file is sniffed for null bytes to tell binary files apart
+_BINARY_SNIFF_BYTES = 8192
+_NEWLINE = re.compile(rb"\n")
+
+
+@dataclass(frozen=True)
+class _FileIndex:
+    """Define the byte offset where every line of a file starts."""
+
+    mtime_ns: int
+    size: int
+    binary: bool
+    # line_starts[i] is the offset of line i + 1, the last entry is the size of the file
+    line_starts: array
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_starts) - 1
+
+
+@dataclass
+class FilePage:
+    """Define a page of a file."""
+
+    path: str
+    content: str
+    start_line: int
+    end_line: int
+    total_lines: int
+    start_byte: int
+    end_byte: int
+    total_bytes: int
+    truncated: bool = False
+
+    def render(self) -> str:
+        """Get the page with a header saying which part of the file it is."""
+        header = (
+            f"{self.path} lines {self.start_line}-{self.end_line} of {self.total_lines} "
+            f"(bytes {self.start_byte}-{self.end_byte} of {self.total_bytes})"
+        )
+        footer = ""
+        if self.truncated or self.end_line < self.total_lines:
+            footer = f"\n... truncated, read again from line {self.end_line + 1} to continue."
+        return f"{header}\n{self.content}{footer}"
+
+
+class DirectoryReader:
+    """
+    Read files and directory trees for the agent, within an output budget.
+
+    Files are memory-mapped and indexed by line once per (path, mtime, size), so paging through a
+    large file or re-reading it between edits doesn't read it again. Rendered results are cached
+    under the same key and are served for free until the file changes. Both caches keep the
+    `cache_size` most recently used entries.
+    """
+
+    def __init__(
+        self,
+        max_output_chars: int = DEFAULT_MAX_OUTPUT_CHARS,
+        max_tree_entries: int = DEFAULT_MAX_TREE_ENTRIES,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ) -> None:
+        self.max_output_chars = max_output_chars
+        self.max_tree_entries = max_tree_entries
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._indexes: "OrderedDict[str, _FileIndex]" = OrderedDict()
+        self._pages: "OrderedDict[Tuple, FilePage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached_index(self, path: str, stat: os.stat_result) -> Optional[_FileIndex]:
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is None or index.mtime_ns != stat.st_mtime_ns or index.size != stat.st_size:
+                return None
+            self._indexes.move_to_end(path)
+            return index
+
+    def _index(self, path: str) -> _FileIndex:
+        stat = os.stat(path)
+        index = self._cached_index(path, stat)
+        if index is not None:
+            return index
+        line_starts = array("q", [0])
+        binary = False
+        if stat.st_size:
+            with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                binary = b"\0" in mapped[:_BINARY_SNIFF_BYTES]
+                if not binary:
+                    line_starts.extend(match.end() for match in _NEWLINE.finditer(mapped))
+            if line_starts[-1] != stat.st_size:
+                line_starts.append(stat.st_size)
+        index = _FileIndex(stat.st_mtime_ns, stat.st_size, binary, line_starts)
+        with self._lock:
+            self._indexes[path] = index
+            self._indexes.move_to_end(path)
+            while len(self._indexes) > self.cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _cached_page(self, key: Tuple) -> Optional[FilePage]:
+        with self._lock:
+            page = self._pages.get(key)
+            if page is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pages.move_to_end(key)
+            return page
+
+    def _store_page(self, key: Tuple, page: FilePage) -> FilePage:
+        with self._lock:
+            self._pages[key] = page
+            while len(self._pages) > self.cache_size:
+                self._pages.popitem(last=False)
+        return page
+
+    def read_lines(self, path: str, start_line: int = 1, end_line: Optional[int] = None) -> FilePage:
+        """
+        Read a range of lines of a file, cut short at the output budget.
+
+        Parameters:
+        - path (str): The path of the file.
+        - start_line (int): The first line to read, 1-based.
+        - end_line (int): The last line to read, inclusive, defaults to the end of the file.
+
+        Returns:
+            FilePage: The lines read and where they sit in the file.
+        """
+        index = self._index(path)
+        if index.binary:
+            raise ValueError(f"{path} is a binary file")
+        start_line = max(1, start_line)
+        end_line = index.line_count if end_line is None else min(end_line, index.line_count)
+        key = ("lines", path, index.mtime_ns, index.size, start_line, end_line, self.max_output_chars)
+        page = self._cached_page(key)
+        if page is not None:
+            return page
+        start_byte = index.line_starts[min(start_line, index.line_count + 1) - 1]
+        stop_byte = index.line_starts[end_line] if end_line >= start_line else start_byte
+        content, end_byte, truncated = self._read_span(path, start_byte, stop_byte, whole_lines=True)
+        read_lines = content.count("\n") + (1 if content and not content.endswith("\n") else 0)
+        return self._store_page(
+            key,
+            FilePage(
+                path=path,
+                content=content,
+                start_line=start_line,
+                end_line=start_line + read_lines - 1,
+                total_lines=index.line_count,
+                start_byte=start_byte,
+                end_byte=end_byte,
+                total_bytes=index.size,
+                truncated=truncated,
+            ),
+        )
+
+    def read_bytes(self, path: str, start_byte: int = 0, length: Optional[int] = None) -> FilePage:
+        """
+        Read a byte range of a file, cut short at the output budget.
+
+        Parameters:
+        - path (str): The path of the file.
+        - start_byte (int): The offset to start reading from.
+        - length (int): How many bytes to read, defaults to the rest of the file.
+
+        Returns:
+            FilePage: The text read and where it sits in the file.
+        """
+        index = self._index(path)
+        start_byte = min(max(0, start_byte), index.size)
+        stop_byte = index.size if length is None else min(index.size, start_byte + length)
+        key = ("bytes", path, index.mtime_ns, index.size, start_byte, stop_byte, self.max_output_chars)
+        page = self._cached_page(key)
+        if page is not None:
+            return page
+        content, end_byte, truncated = self._read_span(path, start_byte, stop_byte, whole_lines=False)
+        # the line containing a byte is the number of line starts at or before it
+        start_line = self._line_of(index, start_byte)
+        end_line = self._line_of(index, max(start_byte, end_byte - 1))
+        return self._store_page(
+            key,
+            FilePage(path, content, start_line, end_line, index.line_count, start_byte, end_byte, index.size, truncated),
+        )
+
+    @staticmethod
+    def _line_of(index: _FileIndex, offset: int) -> int:
+        low, high = 0, max(0, index.line_count - 1)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if index.line_starts[middle] <= offset:
+                low = middle
+            else:
+                high = middle - 1
+        return low + 1
+
+    def _read_span(self, path: str, start_byte: int, stop_byte: int, whole_lines: bool) -> Tuple[str, int, bool]:
+        if stop_byte <= start_byte:
+            return "", start_byte, False
+        # a character is at most 4 bytes, so this many bytes always covers the budget
+        budget_bytes = self.max_output_chars * 4
+        end = min(stop_byte, start_byte + budget_bytes)
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            text = mapped[start_byte:end].decode("utf-8", errors="replace")
+        truncated = end < stop_byte or len(text) > self.max_output_chars
+        if not truncated:
+            return text, stop_byte, False
+        text = text[: self.max_output_chars]
+        if whole_lines and "\n" in text:
+            text = text[: text.rindex("\n") + 1]
+        return text, start_byte + len(text.encode("utf-8")), True
+
+    def tree(self, path: str, max_depth: int = DEFAULT_MAX_DEPTH) -> str:
+        """
+        List a directory recursively with the size of every file.
+
+        Files aren't opened, the line count is only shown for files already indexed by a read.
+
+        Parameters:
+        - path (str): The directory to list.
+        - max_depth (int): How many levels of subdirectories to descend into.
+
+        Returns:
+            str: One indented line per entry, cut short at the entry and output budgets.
+        """
+        lines: List[str] = [f"{os.path.basename(os.path.normpath(path)) or path}/"]
+        chars = len(lines[0])
+        truncated = False
+
+        def walk(directory: str, depth: int) -> bool:
+            nonlocal chars
+            try:
+                entries = sorted(os.scandir(directory), key=lambda entry: (not entry.is_dir(), entry.name))
+            except OSError as error:
+                lines.append(f"{'  ' * depth}<unreadable: {error.strerror}>")
+                return True
+            for entry in entries:
+                if len(lines) > self.max_tree_entries or chars > self.max_output_chars:
+                    return False
+                indent = "  " * depth
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in SKIP_DIRS:
+                        continue
+                    line = f"{indent}{entry.name}/"
+                    lines.append(line)
+                    chars += len(line) + 1
+                    if depth < max_depth and not walk(entry.path, depth + 1):
+                        return False
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    index = self._cached_index(entry.path, stat)
+                    detail = ""
+                    if index is not None:
+                        detail = ", binary" if index.binary else f", {index.line_count} lines"
+                    line = f"{indent}{entry.name} ({stat.st_size} bytes{detail})"
+                    lines.append(line)
+                    chars += len(line) + 1
+            return True
+
+        truncated = not walk(path, 1)
+        if truncated:
+            lines.append(f"... truncated at {len(lines) - 1} entries, list a subdirectory to see more.")
+        return "\n".join(lines)
+
+    def read(self, path: str, start_line: int = 1, end_line: Optional[int] = None) -> str:
+        """Get a rendered page of a file, or the tree of a directory."""
         if os.path.isfile(path):
-            # If the path is a file, read and return its content
-            with open(path, 'r') as file:
-                content = file.read()
-            return content
-        elif os.path.isdir(path):
-            # If the path is a directory, list and return its contents
-            files = [f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
-            files = (" ").join(files)
-            return files
-        else:
-            return f"Path '{path}' is neither a file nor a directory."
+            if self._index(path).binary:
+                return f"{path} is a binary file of {self._index(path).size} bytes."
+            return self.read_lines(path, start_line, end_line).render()
+        if os.path.isdir(path):
+            return self.tree(path)
+        return f"Path '{path}' is neither a file nor a directory."
+
+
+_default_reader = DirectoryReader()
+
+
+def read_file_or_directory_contents(path: str, start_line: int = 1, end_line: Optional[int] = None):
+    try:
+        # files are paged by line and directories are listed recursively, both within the output budget
+        return _default_reader.read(path, start_line, end_line)
     except Exception as e:
         return f"An error occurred: {e}"
 
@@ -0,0 +1,391 @@
+"""Run generated files in children forked from a warm interpreter with heavy modules pre-imported."""
+import asyncio
+import importlib
+import itertools
+import json
+import os
+import resource
+import runpy
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from llm_cdk_app_agent.code_writer.async_runner import RunLimits, RunResult
+
+
+# modules generated cdk apps import, which take most of a cold start
+DEFAULT_PRELOAD_MODULES = ("boto3", "pydantic")
+# packages that start the jsii node kernel on import, every forked child would share its process and
+# pipes, so they are never preloaded and each run imports them itself
+JSII_PACKAGES = frozenset({"aws_cdk", "constructs", "jsii"})
+_PACKAGE_ROOT = str(Path(__file__).resolve().parents[2])
+
+
+@dataclass
+class WarmRunStats:
+    """Define how much startup time the warm runner saved."""
+
+    runs: int = 0
+    # seconds a cold `python file.py` spends starting the interpreter and importing the preloaded modules
+    cold_startup_seconds: float = 0.0
+    # seconds the warm server spent forking children
+    warm_startup_seconds: float = 0.0
+
+    @property
+    def average_warm_startup_seconds(self) -> float:
+        """Get the average time to fork a child."""
+        return self.warm_startup_seconds / self.runs if self.runs else 0.0
+
+    @property
+    def saved_seconds(self) -> float:
+        """Get the total startup time saved compared with cold runs."""
+        return self.runs * self.cold_startup_seconds - self.warm_startup_seconds
+
+    def report(self) -> str:
+        """Get a one line description of the savings."""
+        return (
+            f"{self.runs} warm runs, startup {self.average_warm_startup_seconds * 1000:.1f}ms vs "
+            f"{self.cold_startup_seconds * 1000:.0f}ms cold, {self.saved_seconds:.2f}s saved"
+        )
+
+
+def _exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_child(request: Dict[str, Any]) -> None:
+    """Run a file in a freshly forked child, never returning."""
+    code = 1
+    try:
+        os.setsid()
+        resource.setrlimit(resource.RLIMIT_CPU, (request["cpu_seconds"], request["cpu_seconds"] + 1))
+        if request["memory_bytes"] is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (request["memory_bytes"], request["memory_bytes"]))
+        stdin = os.open(os.devnull, os.O_RDONLY)
+        stdout = os.open(request["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        stderr = os.open(request["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(stdin, 0)
+        os.dup2(stdout, 1)
+        os.dup2(stderr, 2)
+        if request["cwd"]:
+            os.chdir(request["cwd"])
+        filepath = os.path.abspath(request["filepath"])
+        sys.argv = [filepath]
+        sys.path[0] = os.path.dirname(filepath)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        runpy.run_path(filepath, run_name="__main__")
+        code = 0
+    except SystemExit as error:
+        if error.code is None:
+            code = 0
+        elif isinstance(error.code, int):
+            code = error.code
+        else:
+            print(error.code, file=sys.stderr)
+    except BaseException:  # pylint: disable=broad-except
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)  # pylint: disable=protected-access
+
+
+def _jsii_backed(module: str) -> bool:
+    return module.split(".", 1)[0] in JSII_PACKAGES
+
+
+def serve(modules: Sequence[str]) -> None:
+    """
+    Run the warm server: pre-import `modules`, then fork a child for every request read from stdin.
+
+    Requests and responses are json lines. Responses go to the original stdout, which is then pointed
+    at stderr so output of the preloaded modules can't corrupt the protocol. The server is single
+    threaded, so no other thread can hold a lock when it forks: it waits on stdin and on a SIGCHLD
+    wakeup pipe, and reaps children and enforces timeouts in the same loop.
+    """
+    responses = os.fdopen(os.dup(1), "w", buffering=1)
+    os.dup2(2, 1)
+
+    def respond(message: Dict[str, Any]) -> None:
+        responses.write(json.dumps(message) + "\n")
+
+    started_at = time.perf_counter()
+    preloaded, failed = [], []
+    for module in modules:
+        if _jsii_backed(module):
+            failed.append(module)
+            continue
+        try:
+            importlib.import_module(module)
+            preloaded.append(module)
+        except Exception:  # pylint: disable=broad-except
+            failed.append(module)
+    if "jsii" in sys.modules:
+        # a preload pulled in jsii, whose node kernel and pipes every child would share
+        respond({"ready": False, "error": "a preloaded module imports jsii, whose kernel can't be shared by forked runs"})
+        return
+    respond({"ready": True, "preloaded": preloaded, "failed": failed, "import_seconds": time.perf_counter() - started_at})
+
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_read, False)
+    os.set_blocking(wakeup_write, False)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    signal.set_wakeup_fd(wakeup_write)
+    # pid -> (request, started at, fork seconds, deadline, timed out)
+    running: Dict[int, List[Any]] = {}
+    buffered = b""
+    stdin_open = True
+    while stdin_open or running:
+        now = time.perf_counter()
+        # killed runs are only waiting to be reaped, which the wakeup pipe signals
+        timeout = min((run[3] for run in running.values() if not run[4]), default=now + 60) - now
+        readable, _, _ = select.select([0, wakeup_read] if stdin_open else [wakeup_read], [], [], max(0.0, timeout))
+        if wakeup_read in readable:
+            while True:
+                try:
+                    if not os.read(wakeup_read, 512):
+                        break
+                except BlockingIOError:
+                    break
+        if 0 in readable:
+            data = os.read(0, 65536)
+            stdin_open = bool(data)
+            buffered += data
+            *lines, buffered = buffered.split(b"\n")
+            for line in filter(None, lines):
+                request = json.loads(line)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                started_at = time.perf_counter()
+                pid = os.fork()
+                if pid == 0:
+                    signal.set_wakeup_fd(-1)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    os.close(wakeup_read)
+                    os.close(wakeup_write)
+                    _run_child(request)
+                fork_seconds = time.perf_counter() - started_at
+                running[pid] = [request, started_at, fork_seconds, started_at + request["timeout_seconds"], False]
+        now = time.perf_counter()
+        for pid, run in running.items():
+            if not run[4] and now >= run[3]:
+                run[4] = True
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        while running:
+            try:
+                pid, status, usage = os.wait4(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            request, started_at, fork_seconds, _, timed_out = running.pop(pid)
+            respond(
+                {
+                    "id": request["id"],
+                    "exit_code": _exit_code(status),
+                    "duration_seconds": time.perf_counter() - started_at,
+                    "fork_seconds": fork_seconds,
+                    "peak_rss_bytes": usage.ru_maxrss * 1024,
+                    "timed_out": timed_out,
+                }
+            )
+
+
+class WarmRunner:
+    """
+    Run generated files in children forked from a warm server process.
+
+    The server imports `preload_modules` once, so every run skips interpreter startup and those
+    imports. Each child gets its own session, resource limits and output files, just like a cold
+    run. Several runs can be in flight at once. jsii-backed packages like `aws_cdk` can't be
+    preloaded, as the children would share one jsii kernel, so each run still imports them itself.
+
+    Example
+    -------
+        with WarmRunner() as runner:
+            result = runner.run("temp_code_dest/app.py")
+            print(runner.stats().report())
+
+    """
+
+    def __init__(
+        self,
+        preload_modules: Sequence[str] = DEFAULT_PRELOAD_MODULES,
+        limits: RunLimits = RunLimits(),
+        python: str = sys.executable,
+        cwd: Optional[str] = None,
+    ) -> None:
+        jsii_backed = [module for module in preload_modules if _jsii_backed(module)]
+        if jsii_backed:
+            raise ValueError(f"jsii-backed modules can't be preloaded, forked runs would share one jsii kernel: {jsii_backed}")
+        self.preload_modules = list(preload_modules)
+        self.limits = limits
+        self.python = python
+        self.cwd = cwd
+        self.preloaded: List[str] = []
+        self.failed_preloads: List[str] = []
+        self._process: Optional[subprocess.Popen] = None
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._tmp_dir: Optional[tempfile.TemporaryDirectory] = None
+        self._runs = 0
+        self._fork_seconds = 0.0
+        self._cold_startup_seconds: Optional[float] = None
+
+    def start(self) -> "WarmRunner":
+        """Start the server and wait until the modules are imported."""
+        if self._process is not None:
+            return self
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [_PACKAGE_ROOT, os.environ.get("PYTHONPATH")]))}
+        self._tmp_dir = tempfile.TemporaryDirectory(prefix="warm-runner-")
+        self._process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [self.python, "-m", __name__, *self.preload_modules],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+            text=True,
+            bufsize=1,
+        )
+        ready = json.loads(self._process.stdout.readline() or "{}")
+        if not ready.get("ready"):
+            self.close()
+            raise RuntimeError(f"The warm runner server failed to start: {ready.get('error', 'no ready message')}")
+        self.preloaded, self.failed_preloads = ready["preloaded"], ready["failed"]
+        threading.Thread(target=self._read_responses, daemon=True).start()
+        return self
+
+    def _read_responses(self) -> None:
+        for line in self._process.stdout:
+            response = json.loads(line)
+            with self._lock:
+                future = self._pending.pop(response["id"], None)
+            if future is not None:
+                future.set_result(response)
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+        for future in pending:
+            future.set_exception(RuntimeError("The warm runner server exited."))
+
+    def submit(self, filepath: str, limits: Optional[RunLimits] = None) -> "Future[RunResult]":
+        """Start running a file, returning a future of its result."""
+        if not os.path.isfile(filepath):
+            raise ValueError("Not a valid file to run")
+        self.start()
+        limits = limits or self.limits
+        run_id = next(self._ids)
+        stdout_path = os.path.join(self._tmp_dir.name, f"{run_id}.out")
+        stderr_path = os.path.join(self._tmp_dir.name, f"{run_id}.err")
+        request = {
+            "id": run_id,
+            "filepath": os.path.abspath(filepath),
+            "cwd": self.cwd,
+            "stdout": stdout_path,
+            "stderr": stderr_path,
+            "timeout_seconds": limits.timeout_seconds,
+            "cpu_seconds": limits.cpu_seconds or max(1, int(limits.timeout_seconds + 0.999)),
+            "memory_bytes": limits.memory_bytes,
+        }
+        response_future: Future = Future()
+        result_future: "Future[RunResult]" = Future()
+
+        def finish(done: Future) -> None:
+            try:
+                response = done.result()
+                stdout, stdout_truncated = self._read_output(stdout_path, limits.max_output_bytes)
+                stderr, stderr_truncated = self._read_output(stderr_path, limits.max_output_bytes)
+            except BaseException as error:  # pylint: disable=broad-except
+                result_future.set_exception(error)
+                return
+            with self._lock:
+                self._runs += 1
+                self._fork_seconds += response["fork_seconds"]
+            result_future.set_result(
+                RunResult(
+                    filepath=filepath,
+                    exit_code=response["exit_code"],
+                    duration_seconds=response["duration_seconds"],
+                    peak_rss_bytes=response["peak_rss_bytes"],
+                    stdout=stdout,
+                    stderr=stderr,
+                    timed_out=response["timed_out"],
+                    truncated=stdout_truncated or stderr_truncated,
+                )
+            )
+
+        response_future.add_done_callback(finish)
+        with self._lock:
+            self._pending[run_id] = response_future
+            self._process.stdin.write(json.dumps(request) + "\n")
+            self._process.stdin.flush()
+        return result_future
+
+    @staticmethod
+    def _read_output(path: str, max_bytes: int) -> Tuple[str, bool]:
+        try:
+            with open(path, "rb") as output:
+                data = output.read(max_bytes + 1)
+        except FileNotFoundError:
+            return "", False
+        os.remove(path)
+        return data[:max_bytes].decode("utf-8", errors="replace"), len(data) > max_bytes
+
+    def run(self, filepath: str, limits: Optional[RunLimits] = None) -> RunResult:
+        """Run a file in a warm child, blocking until it exits or times out."""
+        return self.submit(filepath, limits).result()
+
+    async def arun(self, filepath: str, limits: Optional[RunLimits] = None) -> RunResult:
+        """Run a file in a warm child without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(filepath, limits))
+
+    def measure_cold_startup(self) -> float:
+        """Get (and remember) how long a cold interpreter takes to start and import the preloaded modules."""
+        if self._cold_startup_seconds is None:
+            imports = "; ".join(f"import {module}" for module in self.preloaded) or "pass"
+            started_at = time.perf_counter()
+            subprocess.run([self.python, "-c", imports], cwd=self.cwd, capture_output=True, check=False)
+            self._cold_startup_seconds = time.perf_counter() - started_at
+        return self._cold_startup_seconds
+
+    def stats(self) -> WarmRunStats:
+        """Get how much startup time the warm runs saved compared with cold runs."""
+        with self._lock:
+            runs, fork_seconds = self._runs, self._fork_seconds
+        return WarmRunStats(runs=runs, cold_startup_seconds=self.measure_cold_startup(), warm_startup_seconds=fork_seconds)
+
+    def close(self) -> None:
+        """Stop the server, running children keep their own sessions and finish on their own."""
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
+            self._tmp_dir = None
+
+    def __enter__(self) -> "WarmRunner":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1:])
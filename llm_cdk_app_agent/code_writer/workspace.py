@@ -0,0 +1,187 @@
+"""Keep the files of the code workspace in memory and write edits back in batches."""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from llm_cdk_app_agent.tracing import current_span, traced
+
+
+DEFAULT_BASE_PATH = "temp_code_dest/"
+
+# the mtime in nanoseconds and size of a file, None when it doesn't exist
+FileSignature = Optional[Tuple[int, int]]
+
+
+class WorkspaceConflictError(RuntimeError):
+    """Raise when a file with unflushed edits was changed on disk by someone else."""
+
+
+def file_signature(path: str) -> FileSignature:
+    """Get the mtime and size of a file, cheap enough to check on every access."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def atomic_write(path: str, content: str) -> None:
+    """Write a file through a temp file and a rename, so readers see the old or the new content, never a mix."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as tmp_file:
+            tmp_file.write(content)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Workspace:
+    """
+    Define an in-memory overlay of the files under a base path.
+
+    Files are loaded once as lists of lines, edits are applied to those buffers and only the files
+    that changed are written back by `flush`. A buffer set to None marks a file to delete on flush.
+
+    The mtime and size of every file are recorded when it's loaded and checked on each access, so a
+    file changed on disk by someone else is reloaded. If it has unflushed edits, the access (or the
+    flush) raises `WorkspaceConflictError` rather than overwriting the other change.
+    """
+
+    def __init__(self, base_path: str = DEFAULT_BASE_PATH) -> None:
+        self.base_path = base_path
+        self._buffers: Dict[str, Optional[List[str]]] = {}
+        self._signatures: Dict[str, FileSignature] = {}
+        self._dirty: set = set()
+        self._lock = threading.RLock()
+
+    def full_path(self, filepath: str) -> str:
+        """Get the on-disk path of a workspace file."""
+        return os.path.join(self.base_path, self.normalize(filepath))
+
+    @staticmethod
+    def normalize(filepath: str) -> str:
+        """Get the workspace-relative form of a path, rejecting paths that leave the workspace."""
+        relative = os.path.normpath(filepath.strip().lstrip("/"))
+        if relative == "." or relative.startswith(".."):
+            raise ValueError(f"{filepath} is not a file inside the workspace")
+        return relative
+
+    def _check_unchanged(self, relative: str) -> bool:
+        """Get whether a loaded file is unchanged on disk, raising if it changed under unflushed edits."""
+        if file_signature(os.path.join(self.base_path, relative)) == self._signatures[relative]:
+            return True
+        if relative in self._dirty:
+            raise WorkspaceConflictError(f"{relative} was changed on disk and has unflushed edits")
+        return False
+
+    def _load(self, relative: str) -> Optional[List[str]]:
+        if relative in self._buffers and self._check_unchanged(relative):
+            return self._buffers[relative]
+        path = os.path.join(self.base_path, relative)
+        # taken before reading, so a change made while reading is noticed on the next access
+        self._signatures[relative] = file_signature(path)
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self._buffers[relative] = file.readlines()
+        else:
+            self._buffers[relative] = None
+        return self._buffers[relative]
+
+    def _lines(self, filepath: str) -> List[str]:
+        relative = self.normalize(filepath)
+        lines = self._load(relative)
+        if lines is None:
+            raise FileNotFoundError(f"{filepath} does not exist in the workspace")
+        return lines
+
+    def exists(self, filepath: str) -> bool:
+        """Get whether a file exists, taking unflushed edits into account."""
+        with self._lock:
+            return self._load(self.normalize(filepath)) is not None
+
+    def read(self, filepath: str) -> str:
+        """Get the current content of a file."""
+        with self._lock:
+            return "".join(self._lines(filepath))
+
+    def lines(self, filepath: str) -> List[str]:
+        """Get a copy of the current lines of a file, each keeping its line ending."""
+        with self._lock:
+            return list(self._lines(filepath))
+
+    def write(self, filepath: str, content: str) -> None:
+        """Replace the content of a file, creating it if needed."""
+        relative = self.normalize(filepath)
+        with self._lock:
+            # the new content doesn't depend on the old one, so whatever is on disk now may be replaced
+            self._signatures[relative] = file_signature(os.path.join(self.base_path, relative))
+            self._buffers[relative] = content.splitlines(keepends=True)
+            self._dirty.add(relative)
+
+    def insert_lines(self, filepath: str, line_number: int, text: str) -> None:
+        """Insert text before the 1-based `line_number` of a file."""
+        relative = self.normalize(filepath)
+        with self._lock:
+            lines = self._lines(relative)
+            if lines and not lines[-1].endswith("\n") and line_number - 1 >= len(lines):
+                lines[-1] += "\n"
+            lines[line_number - 1 : line_number - 1] = (text + "\n").splitlines(keepends=True)
+            self._dirty.add(relative)
+
+    def delete_lines(self, filepath: str, start: int, end: int) -> None:
+        """Delete the lines with 0-based indexes from `start` to `end`, inclusive."""
+        relative = self.normalize(filepath)
+        with self._lock:
+            del self._lines(relative)[start : end + 1]
+            self._dirty.add(relative)
+
+    def delete(self, filepath: str) -> None:
+        """Delete a file."""
+        relative = self.normalize(filepath)
+        with self._lock:
+            self._lines(relative)
+            self._buffers[relative] = None
+            self._dirty.add(relative)
+
+    @property
+    def dirty_files(self) -> List[str]:
+        """Get the files with edits that haven't been flushed."""
+        with self._lock:
+            return sorted(self._dirty)
+
+    @traced("code_writer.flush")
+    def flush(self) -> List[str]:
+        """Write every changed file back to disk and remove deleted ones, returning the flushed paths."""
+        with self._lock:
+            # nothing is written if any file conflicts
+            for relative in self._dirty:
+                self._check_unchanged(relative)
+            flushed = []
+            for relative in sorted(self._dirty):
+                path = os.path.join(self.base_path, relative)
+                lines = self._buffers[relative]
+                if lines is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    atomic_write(path, "".join(lines))
+                self._signatures[relative] = file_signature(path)
+                flushed.append(relative)
+                self._dirty.discard(relative)
+            current_span().set_attribute("files", len(flushed))
+            return flushed
+
+    def discard(self) -> None:
+        """Drop every buffer and unflushed edit, so files are re-read from disk."""
+        with self._lock:
+            self._buffers.clear()
+            self._signatures.clear()
+            self._dirty.clear()
@@ -0,0 +1,134 @@
+"""Define the callback handlers that rate limit and trace every call a chat model makes."""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import BaseMessage, LLMResult
+
+from llm_cdk_app_agent.llms.rate_limit import CHARS_PER_TOKEN, RateLimiter, estimate_tokens
+from llm_cdk_app_agent.tracing import Span, get_tracer
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Wrap every call of a chat model in an "llm.call" span with the model name and tokens in and out.
+
+    The token counts come from the provider's reported usage, and are estimated from the text when
+    there is none, e.g. for streamed responses. While tracing is off the handler does nothing.
+    """
+
+    def __init__(self, llm_model_name: str) -> None:
+        self.llm_model_name = llm_model_name
+        self._spans: Dict[UUID, Span] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        """Start the span of the call, it includes any time spent waiting on the rate limiter."""
+        tracer = get_tracer()
+        if not tracer.enabled:
+            return
+        self._spans[run_id] = tracer.start_span(
+            "llm.call",
+            model=self.llm_model_name,
+            messages=sum(len(batch) for batch in messages),
+            tokens_in=estimate_tokens(messages),
+            tokens_estimated=True,
+        )
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        """End the span of the call with the tokens it used."""
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        usage: Optional[Dict[str, int]] = (response.llm_output or {}).get("token_usage")
+        if usage and usage.get("total_tokens"):
+            span.set_attributes(
+                tokens_in=usage.get("prompt_tokens"),
+                tokens_out=usage.get("completion_tokens"),
+                tokens_estimated=False,
+            )
+        else:
+            completion = sum(len(generation.text) for generations in response.generations for generation in generations)
+            span.set_attribute("tokens_out", completion // CHARS_PER_TOKEN)
+        span.end()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """End the span of a failed call."""
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        span.record_error(error)
+        span.end()
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """
+    Apply a rate limiter to every call a chat model makes.
+
+    The prompt tokens are estimated and acquired when the call starts, and corrected with the
+    provider's reported usage (or an estimate of the completion) when it ends. The same client serves
+    sync and async calls, so the start hook is picked per call: async calls, made from a running event
+    loop, wait on the loop with `async_acquire` while sync calls block their thread with `acquire`.
+    """
+
+    def __init__(self, limiter: RateLimiter) -> None:
+        self.limiter = limiter
+        self._estimates: Dict[UUID, int] = {}
+
+    @property
+    def on_chat_model_start(self) -> Callable[..., Union[None, Awaitable[None]]]:  # pylint: disable=invalid-overridden-method
+        """Get the start hook of the current call, langchain awaits it when it's a coroutine function."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return self._acquire
+        return self._async_acquire
+
+    def _estimate(self, messages: List[List[BaseMessage]], run_id: UUID) -> int:
+        estimate = estimate_tokens(messages)
+        self._estimates[run_id] = estimate
+        return estimate
+
+    def _acquire(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        """Block until the call fits the rate limits."""
+        self.limiter.acquire(self._estimate(messages, run_id))
+
+    async def _async_acquire(
+        self,
+        serialized: Dict[str, Any],
+        messages: List[List[BaseMessage]],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        """Wait on the event loop until the call fits the rate limits."""
+        await self.limiter.async_acquire(self._estimate(messages, run_id))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        """Correct the token bucket with the actual usage of the call."""
+        estimate = self._estimates.pop(run_id, 0)
+        usage: Optional[Dict[str, int]] = (response.llm_output or {}).get("token_usage")
+        if usage and usage.get("total_tokens"):
+            actual = usage["total_tokens"]
+        else:
+            completion = sum(len(generation.text) for generations in response.generations for generation in generations)
+            actual = estimate + completion // CHARS_PER_TOKEN
+        self.limiter.correct_tokens(estimate, actual)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        """Forget the estimate of a failed call, its tokens stay charged as the provider may have counted them."""
+        self._estimates.pop(run_id, None)
@@ -0,0 +1,164 @@
+"""Define token-bucket rate limiting for calls to the LLM providers."""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Deque, List
+
+if TYPE_CHECKING:
+    from langchain.schema import BaseMessage
+
+
+# a rough chars-per-token ratio used to estimate prompt tokens before a call is made
+CHARS_PER_TOKEN = 4
+# the longest an async waiter sleeps before re-checking, so it notices capacity freed by other callers
+_ASYNC_POLL_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    """Define the request and token limits of a model."""
+
+    requests_per_minute: float
+    tokens_per_minute: float
+    # how many seconds worth of the limit may be spent in a single burst
+    burst_seconds: float = 60.0
+
+
+class TokenBucket:
+    """Define a token bucket that refills continuously up to its capacity."""
+
+    def __init__(self, capacity: float, refill_per_second: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.clock = clock
+        self.available = capacity
+        self._updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.available = min(self.capacity, self.available + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Get how long until `amount` can be consumed, requests larger than the capacity wait for a full bucket."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        """Take `amount` from the bucket, which may go negative when usage is corrected after the fact."""
+        self._refill()
+        self.available -= amount
+
+
+@dataclass
+class RateLimitMetrics:
+    """Define the wait-time metrics of a rate limiter."""
+
+    requests: int = 0
+    waited_requests: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    queue_depth: int = 0
+
+    @property
+    def average_wait_seconds(self) -> float:
+        """Get the average wait per request."""
+        return self.total_wait_seconds / self.requests if self.requests else 0.0
+
+
+class RateLimiter:
+    """
+    Enforce request and token limits for a model, admitting callers in arrival order.
+
+    Every caller takes a ticket and may only proceed once it is at the head of the queue and both
+    buckets have room, so a burst of large requests can't starve earlier small ones. Sync callers
+    block on a condition variable, async callers sleep on the event loop.
+    """
+
+    def __init__(self, limits: RateLimits, clock: Callable[[], float] = time.monotonic) -> None:
+        self.limits = limits
+        burst = limits.burst_seconds / 60
+        self.requests = TokenBucket(max(1.0, limits.requests_per_minute * burst), limits.requests_per_minute / 60, clock)
+        self.tokens = TokenBucket(max(1.0, limits.tokens_per_minute * burst), limits.tokens_per_minute / 60, clock)
+        self.metrics = RateLimitMetrics()
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._tickets = itertools.count()
+        self._queue: Deque[int] = deque()
+
+    def _try_admit(self, ticket: int, tokens: float) -> float:
+        """Admit the ticket if possible, returning 0, or the seconds to wait before trying again."""
+        if self._queue[0] != ticket:
+            return _ASYNC_POLL_SECONDS
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait > 0:
+            return wait
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        self._queue.popleft()
+        self._condition.notify_all()
+        return 0.0
+
+    def _record(self, started_at: float, blocked: bool) -> float:
+        waited = self._clock() - started_at if blocked else 0.0
+        self.metrics.requests += 1
+        self.metrics.total_wait_seconds += waited
+        self.metrics.max_wait_seconds = max(self.metrics.max_wait_seconds, waited)
+        if blocked:
+            self.metrics.waited_requests += 1
+        self.metrics.queue_depth = len(self._queue)
+        return waited
+
+    def acquire(self, tokens: float) -> float:
+        """Block until a request of `tokens` tokens may be sent, returning the seconds waited."""
+        started_at = self._clock()
+        with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            self.metrics.queue_depth = len(self._queue)
+            blocked = False
+            while True:
+                wait = self._try_admit(ticket, tokens)
+                if wait == 0:
+                    return self._record(started_at, blocked)
+                blocked = True
+                self._condition.wait(timeout=wait)
+
+    async def async_acquire(self, tokens: float) -> float:
+        """Wait on the event loop until a request of `tokens` tokens may be sent, returning the seconds waited."""
+        started_at = self._clock()
+        with self._condition:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            self.metrics.queue_depth = len(self._queue)
+        blocked = False
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_admit(ticket, tokens)
+                    if wait == 0:
+                        return self._record(started_at, blocked)
+                blocked = True
+                await asyncio.sleep(min(wait, _ASYNC_POLL_SECONDS))
+        except asyncio.CancelledError:
+            with self._condition:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._condition.notify_all()
+            raise
+
+    def correct_tokens(self, estimated: float, actual: float) -> None:
+        """Charge (or refund) the difference between the estimated and actual tokens of a finished call."""
+        with self._condition:
+            self.tokens.consume(actual - estimated)
+
+
+def estimate_tokens(messages: List[List["BaseMessage"]]) -> int:
+    """Estimate the prompt tokens of a batch of chat messages without a tokenizer."""
+    return sum(len(message.content) for batch in messages for message in batch) // CHARS_PER_TOKEN + 1
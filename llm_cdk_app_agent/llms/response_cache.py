@@ -0,0 +1,267 @@
+"""Cache chat completions keyed on the model, its parameters and the chat history."""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Union
+from uuid import uuid4
+
+from llm_cdk_app_agent.llms.schemas import (
+    AIChat,
+    BaseChat,
+    ChatRole,
+    ChatSession,
+    FunctionCall,
+    ModelClientRegistry,
+    ModelName,
+    get_model,
+)
+
+if TYPE_CHECKING:
+    from langchain.chat_models.base import BaseChatModel
+
+
+DEFAULT_RESPONSE_CACHE_DIR = Path(".cache/llm_responses")
+# "read_write" serves and records responses, "replay" only serves recorded ones, "off" always calls the model
+RESPONSE_CACHE_MODE = os.environ.get("RESPONSE_CACHE_MODE", "read_write")
+RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR", str(DEFAULT_RESPONSE_CACHE_DIR))
+DEFAULT_LRU_SIZE = 1024
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+# parameters that don't change what the model answers, so they're left out of the cache key
+_NON_SEMANTIC_PARAMS = frozenset(["stream", "streaming", "request_timeout", "max_retries"])
+
+
+class CacheMode(str, Enum):
+    """Define how the response cache is used."""
+
+    READ_WRITE = "read_write"
+    # only serve cached responses and fail on a miss, for deterministic re-runs and benchmarks
+    REPLAY = "replay"
+    OFF = "off"
+
+
+class CacheMissError(KeyError):
+    """Raise when a response is missing from the cache in replay mode."""
+
+
+@dataclass
+class ResponseCacheStats:
+    """Define the counters of a response cache."""
+
+    hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+
+
+def _serialize_chat(chat: BaseChat) -> Dict[str, Any]:
+    """Get the parts of a chat that the model sees, leaving out ids and timestamps that differ between runs."""
+    serialized: Dict[str, Any] = {"role": chat.role.value, "content": chat.content}
+    name = getattr(chat, "name", None)
+    if name:
+        serialized["name"] = name
+    function_call = getattr(chat, "function_call", None)
+    if function_call:
+        serialized["function_call"] = {"name": function_call.name, "arguments": function_call.arguments}
+    return serialized
+
+
+def response_cache_key(llm_model_name: ModelName, params: Dict[str, Any], chats: Iterable[BaseChat]) -> str:
+    """Get a stable hash of the model name, its parameters and the chat history."""
+    payload = {
+        "model": ModelName(llm_model_name).value,
+        "params": {key: value for key, value in params.items() if key not in _NON_SEMANTIC_PARAMS},
+        "chats": [_serialize_chat(chat) for chat in chats],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Define a cache of chat completions with an in-memory LRU in front of an on-disk store.
+
+    Every response is stored as a small json file named after its key. Entries older than the TTL are
+    treated as misses and removed, either when they're read or by `evict_expired`.
+
+    Only exact matches of the whole history are served. There's no prefix cache: a response to a
+    prefix of the history doesn't answer the longer history, and reusing the computation of a shared
+    prompt prefix is done by the provider, which caches long prompt prefixes on its side.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_RESPONSE_CACHE_DIR,
+        mode: CacheMode = CacheMode.READ_WRITE,
+        lru_size: int = DEFAULT_LRU_SIZE,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+    ) -> None:
+        self.path = Path(path)
+        self.mode = CacheMode(mode)
+        self.lru_size = lru_size
+        self.ttl_seconds = ttl_seconds
+        self.stats = ResponseCacheStats()
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
+
+    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+        # replayed responses must stay available no matter how old the recording is
+        return self.mode != CacheMode.REPLAY and time.time() - entry["created_at"] > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached response, or None if it's missing or expired."""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                entry_path = self._entry_path(key)
+                try:
+                    with entry_path.open("r", encoding="utf-8") as entry_file:
+                        entry = json.load(entry_file)
+                except FileNotFoundError:
+                    return None
+            if self._is_expired(entry):
+                self._lru.pop(key, None)
+                self._entry_path(key).unlink(missing_ok=True)
+                return None
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+            return entry["response"]
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Store a response, writing it atomically so concurrent readers never see a partial file."""
+        entry = {"created_at": time.time(), "response": response}
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry_path.with_suffix(f".{uuid4().hex}.tmp")
+        with tmp_path.open("w", encoding="utf-8") as entry_file:
+            json.dump(entry, entry_file)
+        with self._lock:
+            os.replace(tmp_path, entry_path)
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def evict_expired(self) -> int:
+        """Remove every expired entry from disk, returning how many were removed."""
+        evicted = 0
+        cutoff = time.time() - self.ttl_seconds
+        for entry_path in self.path.glob("*/*.json"):
+            # checked under the lock, so an entry rewritten by a concurrent `put` is never removed
+            with self._lock:
+                try:
+                    expired = entry_path.stat().st_mtime < cutoff
+                except FileNotFoundError:
+                    continue
+                if expired:
+                    entry_path.unlink(missing_ok=True)
+                    self._lru.pop(entry_path.stem, None)
+                    evicted += 1
+        return evicted
+
+
+@lru_cache(maxsize=None)
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache, configured by RESPONSE_CACHE_MODE and RESPONSE_CACHE_DIR."""
+    return ResponseCache(RESPONSE_CACHE_DIR, mode=CacheMode(RESPONSE_CACHE_MODE))
+
+
+def _to_ai_chat(response: Dict[str, Any]) -> AIChat:
+    function_call = FunctionCall(**response["function_call"]) if response.get("function_call") else None
+    return AIChat(
+        content=response["content"],
+        role=ChatRole.AI,
+        render_chat=function_call is None,
+        id=uuid4(),
+        function_call=function_call,
+    )
+
+
+def cached_chat_completion(
+    model: "BaseChatModel",
+    llm_model_name: ModelName,
+    session: ChatSession,
+    cache: ResponseCache,
+    bypass: bool = False,
+    **params: Any,
+) -> AIChat:
+    """
+    Get the model's response to a chat session, served from the cache when possible.
+
+    Args
+    ----
+        model: The chat model to call on a miss.
+        llm_model_name: The name of the model, part of the cache key.
+        session: The chat session to respond to, its chats are part of the cache key.
+        cache: The response cache.
+        bypass: Whether or not to skip the cache for this call, e.g. for non-deterministic sampling.
+        params: Extra parameters passed to the model call, part of the cache key.
+
+    Returns
+    -------
+        The AI response. It is not appended to the session.
+
+    """
+    if bypass or cache.mode == CacheMode.OFF:
+        cache.stats.bypassed += 1
+        return _to_ai_chat(_call_model(model, session, params))
+    key = response_cache_key(llm_model_name, {**getattr(model, "_default_params", {}), **params}, session.chats)
+    response = cache.get(key)
+    if response is not None:
+        cache.stats.hits += 1
+        return _to_ai_chat(response)
+    cache.stats.misses += 1
+    if cache.mode == CacheMode.REPLAY:
+        raise CacheMissError(f"No cached response for {key} in replay mode.")
+    response = _call_model(model, session, params)
+    cache.put(key, response)
+    return _to_ai_chat(response)
+
+
+def _call_model(model: "BaseChatModel", session: ChatSession, params: Dict[str, Any]) -> Dict[str, Any]:
+    message = model.predict_messages(session.chats, **params)
+    function_call = message.additional_kwargs.get("function_call")
+    if function_call:
+        arguments = function_call.get("arguments") or "{}"
+        function_call = {"name": function_call["name"], "arguments": json.loads(arguments)}
+    return {"content": message.content, "function_call": function_call}
+
+
+def get_chat_completion(
+    llm_model_name: ModelName,
+    api_key: str,
+    session: ChatSession,
+    bypass: bool = False,
+    cache: Optional[ResponseCache] = None,
+    registry: Optional[ModelClientRegistry] = None,
+    **params: Any,
+) -> AIChat:
+    """
+    Get a model's response to a chat session, going through the response cache.
+
+    Args
+    ----
+        llm_model_name: The name of the LLM model to use.
+        api_key: The API key for the LLM model.
+        session: The chat session to respond to.
+        bypass: Whether or not to skip the cache for this call, e.g. for non-deterministic sampling.
+        cache: The response cache, defaults to the process-wide cache.
+        registry: The registry to get the model from, defaults to the process-wide registry.
+        params: Extra parameters passed to the model call, part of the cache key.
+
+    Returns
+    -------
+        The AI response. It is not appended to the session.
+
+    """
+    model = get_model(llm_model_name, api_key, registry=registry)
+    return cached_chat_completion(model, llm_model_name, session, cache or get_response_cache(), bypass=bypass, **params)
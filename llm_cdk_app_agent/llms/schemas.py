@@ -3,13 +3,14 @@
 # we are disabling no-self because we are still using pydantic v1
 # we are disabling duplicate-code because the api layer has very similar code
 # to the backend layer
+import json
+import threading
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional, Type, Union
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple, Type, Union
 from uuid import UUID, uuid4
 
-from langchain.chat_models import ChatOpenAI
-from langchain.chat_models.base import BaseChatModel
 from langchain.schema import (
     AIMessage,
     BaseMessage,
@@ -18,7 +19,14 @@ from langchain.schema import (
     SystemMessage,
 )
 from langchain.schema.messages import BaseMessageChunk
-from pydantic.v1 import BaseModel, Field, validator
+from pydantic.v1 import BaseModel, Field, PrivateAttr, validator
+
+from llm_cdk_app_agent.llms.rate_limit import RateLimiter, RateLimitMetrics, RateLimits
+from llm_cdk_app_agent.tracing import current_span, traced
+
+if TYPE_CHECKING:
+    from langchain.callbacks.base import BaseCallbackHandler
+    from langchain.chat_models.base import BaseChatModel
 
 
 # we need to continue using pydantic v1 for now
@@ -42,18 +50,155 @@ class ModelName(str, Enum):
     GPT_4 = "gpt-4"
 
 
-MODEL_NAME_TO_MODEL_CLASS: Dict[ModelName, Type[BaseChatModel]] = {
-    ModelName.GPT_TURBO: ChatOpenAI,
-    ModelName.GPT_TURBO_LARGE_CONTEXT: ChatOpenAI,
-    ModelName.GPT_4: ChatOpenAI,
+@lru_cache(maxsize=None)
+def get_model_classes() -> Dict[ModelName, Type["BaseChatModel"]]:
+    """Get the chat model class of every model, imported on first use as langchain's chat models are slow to import."""
+    from langchain.chat_models import ChatOpenAI  # pylint: disable=import-outside-toplevel
+
+    return {
+        ModelName.GPT_TURBO: ChatOpenAI,
+        ModelName.GPT_TURBO_LARGE_CONTEXT: ChatOpenAI,
+        ModelName.GPT_4: ChatOpenAI,
+    }
+
+
+MODEL_NAME_TO_CONTEXT_SIZE: Dict[ModelName, int] = {
+    ModelName.GPT_TURBO: 4096,
+    ModelName.GPT_TURBO_LARGE_CONTEXT: 16385,
+    ModelName.GPT_4: 8192,
+}
+# every message is wrapped in <|start|>{role/name}\n{content}<|end|>\n by the chat api
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+# every reply is primed with <|start|>assistant<|message|>
+REPLY_PRIMING_TOKENS = 3
+# the tokens left free for the model's response when windowing a chat session
+DEFAULT_RESPONSE_TOKEN_RESERVE = 512
+
+TokenEncoder = Callable[[str], Sequence[int]]
+
+
+@lru_cache(maxsize=None)
+def get_token_encoder(llm_model_name: ModelName) -> TokenEncoder:
+    """Get the tiktoken encoder of a model, loaded once per process."""
+    import tiktoken  # pylint: disable=import-outside-toplevel
+
+    return tiktoken.encoding_for_model(llm_model_name.value).encode
+
+
+# openai's published per-model limits, callers exceeding them are queued instead of getting 429s
+MODEL_NAME_TO_RATE_LIMITS: Dict[ModelName, RateLimits] = {
+    ModelName.GPT_TURBO: RateLimits(requests_per_minute=3500, tokens_per_minute=90_000),
+    ModelName.GPT_TURBO_LARGE_CONTEXT: RateLimits(requests_per_minute=3500, tokens_per_minute=180_000),
+    ModelName.GPT_4: RateLimits(requests_per_minute=500, tokens_per_minute=10_000),
 }
 
 
+def _create_model(
+    llm_model_name: ModelName,
+    api_key: str,
+    stream: bool,
+    callbacks: List["BaseCallbackHandler"],
+    api_base: Optional[str] = None,
+) -> "BaseChatModel":
+    from langchain.chat_models import ChatOpenAI  # pylint: disable=import-outside-toplevel
+
+    # disabling the invalid name linting error because the model name is not snake case
+    Model = get_model_classes().get(llm_model_name)  # pylint: disable=invalid-name
+    if not Model:
+        raise ValueError(f"Unsupported model name: {llm_model_name}")
+    if issubclass(Model, ChatOpenAI):
+        model = Model(
+            model=llm_model_name,
+            streaming=stream,
+            openai_api_key=api_key,
+            callbacks=callbacks,
+            **({"openai_api_base": api_base} if api_base else {}),
+        )
+    else:
+        raise NotImplementedError(f"Unsupported model: {Model}")
+    return model
+
+
+class ModelClientRegistry:
+    """
+    Define a registry of chat model clients that are built once and reused.
+
+    Clients are keyed by (model name, api key, stream), so repeated calls share a client and its
+    connection pool. Every client is rate limited by a token-bucket `RateLimiter` shared by all clients
+    of the same model and api key, which queues excess calls in arrival order, and traces its calls
+    in "llm.call" spans. Models missing from custom `rate_limits` get their published limits, and
+    models without any are not limited.
+    """
+
+    def __init__(
+        self,
+        rate_limits: Optional[Dict[ModelName, RateLimits]] = None,
+        api_base: Optional[str] = None,
+    ) -> None:
+        self.rate_limits = rate_limits or MODEL_NAME_TO_RATE_LIMITS
+        self.api_base = api_base
+        self._models: Dict[Tuple[ModelName, str, bool], "BaseChatModel"] = {}
+        self._limiters: Dict[Tuple[ModelName, str], RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, llm_model_name: ModelName, api_key: str) -> Optional[RateLimiter]:
+        """Get the rate limiter shared by the clients of a model and api key, None if the model has no limits."""
+        with self._lock:
+            limiter = self._limiters.get((llm_model_name, api_key))
+            if limiter is None:
+                limits = self.rate_limits.get(llm_model_name) or MODEL_NAME_TO_RATE_LIMITS.get(llm_model_name)
+                if limits is None:
+                    return None
+                limiter = RateLimiter(limits)
+                self._limiters[(llm_model_name, api_key)] = limiter
+            return limiter
+
+    @traced("llm.get_model", "llm_model_name", "stream")
+    def get_model(self, llm_model_name: ModelName, api_key: str, stream: bool = False) -> "BaseChatModel":
+        """Get the client of a model, building it on first use."""
+        key = (llm_model_name, api_key, stream)
+        model = self._models.get(key)
+        current_span().set_attribute("cached", model is not None)
+        if model is None:
+            # pylint: disable=import-outside-toplevel
+            from llm_cdk_app_agent.llms.callbacks import RateLimitCallbackHandler, TracingCallbackHandler
+
+            # the tracing handler runs first, so the span of a call includes its rate limit wait
+            callbacks: List["BaseCallbackHandler"] = [TracingCallbackHandler(llm_model_name.value)]
+            limiter = self.limiter(llm_model_name, api_key)
+            if limiter is not None:
+                callbacks.append(RateLimitCallbackHandler(limiter))
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = _create_model(llm_model_name, api_key, stream, callbacks=callbacks, api_base=self.api_base)
+                    self._models[key] = model
+        return model
+
+    def metrics(self) -> Dict[ModelName, RateLimitMetrics]:
+        """Get the wait-time metrics of every model, summed over api keys."""
+        metrics: Dict[ModelName, RateLimitMetrics] = {}
+        with self._lock:
+            for (llm_model_name, _), limiter in self._limiters.items():
+                total = metrics.setdefault(llm_model_name, RateLimitMetrics())
+                total.requests += limiter.metrics.requests
+                total.waited_requests += limiter.metrics.waited_requests
+                total.total_wait_seconds += limiter.metrics.total_wait_seconds
+                total.max_wait_seconds = max(total.max_wait_seconds, limiter.metrics.max_wait_seconds)
+                total.queue_depth += limiter.metrics.queue_depth
+        return metrics
+
+
+DEFAULT_MODEL_CLIENT_REGISTRY = ModelClientRegistry()
+
+
 def get_model(
     llm_model_name: ModelName,
     api_key: str,
     stream: bool = False,
-) -> BaseChatModel:
+    registry: Optional[ModelClientRegistry] = None,
+) -> "BaseChatModel":
     """
     Get an instance of a chat model.
 
@@ -62,25 +207,14 @@ def get_model(
         llm_model_name: The name of the LLM model to use.
         api_key: The API key for the LLM model.
         stream: Whether or not to stream the response.
+        registry: The registry to get the model from, defaults to the process-wide registry.
 
     Returns
     -------
-        An instance of the chat model.
+        A pooled, rate-limited instance of the chat model.
 
     """
-    # disabling the invalid name linting error because the model name is not snake case
-    Model = MODEL_NAME_TO_MODEL_CLASS.get(llm_model_name)  # pylint: disable=invalid-name
-    if not Model:
-        raise ValueError(f"Unsupported model name: {llm_model_name}")
-    if issubclass(Model, ChatOpenAI):
-        model = Model(
-            model=llm_model_name,
-            streaming=stream,
-            openai_api_key=api_key,
-        )
-    else:
-        raise NotImplementedError(f"Unsupported model: {Model}")
-    return model
+    return (registry or DEFAULT_MODEL_CLIENT_REGISTRY).get_model(llm_model_name, api_key, stream=stream)
 
 
 class ChatRole(str, Enum):
@@ -115,6 +249,31 @@ class BaseChat(BaseMessage):
         default="base_chat",
         description="The type of the chat message.",
     )
+    _token_count: Optional[int] = PrivateAttr(default=None)
+    _token_encoder: Optional[TokenEncoder] = PrivateAttr(default=None)
+
+    def _count_tokens(self, encoder: TokenEncoder) -> int:
+        """Count the tokens of the whole message, including the chat api overhead."""
+        tokens = TOKENS_PER_MESSAGE + len(encoder(self.content))
+        name = getattr(self, "name", None)
+        if name:
+            tokens += TOKENS_PER_NAME + len(encoder(name))
+        function_call = getattr(self, "function_call", None)
+        if function_call:
+            tokens += len(encoder(function_call.name)) + len(encoder(json.dumps(function_call.arguments)))
+        return tokens
+
+    def token_count(self, encoder: TokenEncoder) -> int:
+        """Get the number of tokens in the message, counted once per encoder and then cached."""
+        if self._token_count is None or self._token_encoder is not encoder:
+            self._token_count = self._count_tokens(encoder)
+            self._token_encoder = encoder
+        return self._token_count
+
+    def add_content_tokens(self, content: str) -> None:
+        """Update the cached token count for content appended to the message, only encoding the new content."""
+        if self._token_count is not None and self._token_encoder is not None:
+            self._token_count += len(self._token_encoder(content))
 
 
 class SystemChat(SystemMessage, BaseChat):
@@ -193,6 +352,59 @@ class AIChat(AIMessage, BaseChat):
         return role
 
 
+class AIChatStreamBuffer:
+    """
+    Accumulate a streamed AI response without touching pydantic per token.
+
+    Content and function call argument chunks are appended to plain lists and joined once, when the
+    stream is materialized into an `AIChat`, so accumulating a response is linear in its length.
+    """
+
+    def __init__(self, render_chat: bool = True) -> None:
+        self.render_chat = render_chat
+        self.content_parts: List[str] = []
+        self.function_name_parts: List[str] = []
+        self.function_argument_parts: List[str] = []
+
+    def append(self, message_chunk: BaseMessageChunk) -> None:
+        """Append a message chunk, including any partial function call it carries."""
+        if message_chunk.content:
+            self.content_parts.append(message_chunk.content)
+        function_call = message_chunk.additional_kwargs.get("function_call")
+        if function_call:
+            if function_call.get("name"):
+                self.function_name_parts.append(function_call["name"])
+            if function_call.get("arguments"):
+                self.function_argument_parts.append(function_call["arguments"])
+
+    @property
+    def content(self) -> str:
+        """Get the content streamed so far."""
+        return "".join(self.content_parts)
+
+    @property
+    def function_arguments(self) -> str:
+        """Get the raw function call arguments streamed so far."""
+        return "".join(self.function_argument_parts)
+
+    def to_chat(self) -> AIChat:
+        """Materialize the streamed response into a single AI chat."""
+        function_call = None
+        if self.function_name_parts:
+            arguments = self.function_arguments
+            function_call = FunctionCall(
+                name="".join(self.function_name_parts),
+                arguments=json.loads(arguments) if arguments else {},
+            )
+        return AIChat(
+            content=self.content,
+            role=ChatRole.AI,
+            render_chat=self.render_chat and function_call is None,
+            id=uuid4(),
+            function_call=function_call,
+        )
+
+
 class ChatSession(PydanticV1BaseModel):
     """Define the request model for the chat endpoint."""
 
@@ -208,6 +420,7 @@ class ChatSession(PydanticV1BaseModel):
         default=False,
         description="Whether or not to stream the response.",
     )
+    _stream_buffer: Optional[AIChatStreamBuffer] = PrivateAttr(default=None)
 
     @property
     def last_chat(self) -> Optional[Union[FunctionChat, AIChat, UserChat]]:
@@ -231,8 +444,34 @@ class ChatSession(PydanticV1BaseModel):
         self.chats.append(chat)
 
     def append_message_chunk(self, message_chunk: BaseMessageChunk):
-        """Append a message chunk to the chat session."""
+        """Append a message chunk to the open AI stream, or to the last chat if no stream is open."""
+        if self._stream_buffer is not None:
+            self._stream_buffer.append(message_chunk)
+            return
         self.chats[-1].content += message_chunk.content
+        self.chats[-1].add_content_tokens(message_chunk.content)
+
+    def start_ai_stream(self, render_chat: bool = True) -> AIChatStreamBuffer:
+        """Open a stream buffer that message chunks are appended to until `finish_ai_stream`."""
+        if self._stream_buffer is not None:
+            raise ValueError("An AI stream is already open.")
+        self._stream_buffer = AIChatStreamBuffer(render_chat=render_chat)
+        return self._stream_buffer
+
+    def finish_ai_stream(self) -> AIChat:
+        """Close the open stream buffer and append its content as a single AI chat, the buffer is closed even if that fails."""
+        if self._stream_buffer is None:
+            raise ValueError("No AI stream is open.")
+        try:
+            ai_chat = self._stream_buffer.to_chat()
+        finally:
+            self._stream_buffer = None
+        self.append_chat(ai_chat)
+        return ai_chat
+
+    def discard_ai_stream(self) -> None:
+        """Close the open stream buffer without appending anything, e.g. when the stream failed."""
+        self._stream_buffer = None
 
     def append_ai_function_call(self, function_call: FunctionCall) -> None:
         """Append a function call to the chat session."""
@@ -284,3 +523,67 @@ class ChatSession(PydanticV1BaseModel):
         """Remove the system prompt from the chat session."""
         if self.chats and isinstance(self.chats[0], SystemChat):
             self.chats.pop(0)
+
+    def token_count(self, llm_model_name: ModelName, encoder: Optional[TokenEncoder] = None) -> int:
+        """Get the number of prompt tokens the chat session uses for a model."""
+        encoder = encoder or get_token_encoder(llm_model_name)
+        return REPLY_PRIMING_TOKENS + sum(chat.token_count(encoder) for chat in self.chats)
+
+    def windowed_chats(
+        self,
+        llm_model_name: ModelName,
+        reserve_tokens: int = DEFAULT_RESPONSE_TOKEN_RESERVE,
+        keep_recent: int = 4,
+        function_summary_tokens: int = 64,
+        encoder: Optional[TokenEncoder] = None,
+    ) -> List[Union[SystemChat, FunctionChat, AIChat, UserChat]]:
+        """
+        Get the chat messages that fit in the context window of a model.
+
+        Args
+        ----
+            llm_model_name: The name of the LLM model the messages are sent to.
+            reserve_tokens: The number of tokens to leave free for the response.
+            keep_recent: The number of most recent messages whose function outputs are kept whole.
+            function_summary_tokens: The rough number of tokens older function outputs are truncated to.
+            encoder: The token encoder, defaults to the tiktoken encoder of the model.
+
+        Returns
+        -------
+            The system prompt followed by the most recent messages that fit, oldest first. Function
+            outputs older than `keep_recent` are truncated, and dropped if they still don't fit.
+
+        """
+        encoder = encoder or get_token_encoder(llm_model_name)
+        budget = MODEL_NAME_TO_CONTEXT_SIZE[llm_model_name] - reserve_tokens - REPLY_PRIMING_TOKENS
+        system_chats = [chat for chat in self.chats if isinstance(chat, SystemChat)]
+        budget -= sum(chat.token_count(encoder) for chat in system_chats)
+        kept: List[Union[SystemChat, FunctionChat, AIChat, UserChat]] = []
+        for age, chat in enumerate(reversed([chat for chat in self.chats if not isinstance(chat, SystemChat)])):
+            if isinstance(chat, FunctionChat) and age >= keep_recent:
+                chat = _truncate_function_chat(chat, function_summary_tokens, encoder)
+            tokens = chat.token_count(encoder)
+            if tokens > budget:
+                if isinstance(chat, FunctionChat) and age > 0:
+                    continue
+                break
+            kept.append(chat)
+            budget -= tokens
+        return system_chats + kept[::-1]
+
+
+def _truncate_function_chat(chat: FunctionChat, max_tokens: int, encoder: TokenEncoder) -> FunctionChat:
+    """Get a copy of a function chat with its output cut down to roughly `max_tokens` tokens."""
+    content_tokens = chat.token_count(encoder) - TOKENS_PER_MESSAGE
+    if content_tokens <= max_tokens:
+        return chat
+    # encoders can't decode, so the content is cut proportionally to the token budget
+    kept_characters = len(chat.content) * max_tokens // content_tokens
+    return FunctionChat(
+        name=chat.name,
+        content=f"{chat.content[:kept_characters]}\n... [{content_tokens - max_tokens} tokens of function output truncated]",
+        role=ChatRole.FUNCTION,
+        id=chat.id,
+        timestamp=chat.timestamp,
+        render_chat=False,
+    )
@@ -0,0 +1,124 @@
+"""Fan streamed chat responses out to consumers with backpressure."""
+import asyncio
+import sys
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain.schema.messages import BaseMessageChunk
+
+from llm_cdk_app_agent.llms.schemas import AIChat, ChatSession
+
+
+# how many tokens a consumer may fall behind before the stream waits for it
+DEFAULT_MAX_BUFFERED_TOKENS = 64
+# how long the stream waits on a consumer with a full buffer before dropping it, None waits forever
+DEFAULT_SUBSCRIBER_TIMEOUT_SECONDS = 30.0
+
+_END_OF_STREAM = object()
+
+
+class StreamClosedError(RuntimeError):
+    """Raise in a subscriber when the stream was cancelled, or dropped the subscriber for falling behind."""
+
+
+class StreamSubscription:
+    """Define a consumer's view of a stream, an async iterator over the tokens it hasn't read yet."""
+
+    def __init__(self, broadcaster: "ChatStreamBroadcaster", max_buffered_tokens: int) -> None:
+        self._broadcaster = broadcaster
+        self.queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_buffered_tokens)
+
+    def __aiter__(self) -> "StreamSubscription":
+        return self
+
+    async def __anext__(self) -> str:
+        item = await self.queue.get()
+        if item is _END_OF_STREAM:
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def _end(self, item: Any) -> None:
+        """Queue a final item without waiting, dropping the buffered tokens if there is no room for it."""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+        self.queue.put_nowait(item)
+
+    def close(self) -> None:
+        """Unsubscribe, so the stream no longer waits on this consumer."""
+        self._broadcaster.unsubscribe(self)
+
+
+class ChatStreamBroadcaster:
+    """
+    Stream an AI response into a chat session while fanning the tokens out to consumers.
+
+    Every subscriber gets its own bounded queue. The stream only advances once every queue has room,
+    so a slow consumer (e.g. a websocket) applies backpressure instead of buffering the whole response.
+    A consumer that stops reading should `close` its subscription; one that leaves its queue full for
+    `subscriber_timeout_seconds` is dropped with a `StreamClosedError`. Chunks are accumulated in the
+    session's stream buffer and appended as a single `AIChat` at the end. However the stream ends, even
+    when it is cancelled, the buffer is closed and every subscriber is told.
+
+    Example
+    -------
+        broadcaster = ChatStreamBroadcaster(session)
+        tokens = broadcaster.subscribe()
+        ai_chat, _ = await asyncio.gather(broadcaster.run(model.astream(messages)), send_tokens(tokens))
+
+    """
+
+    def __init__(
+        self,
+        session: ChatSession,
+        max_buffered_tokens: int = DEFAULT_MAX_BUFFERED_TOKENS,
+        render_chat: bool = True,
+        subscriber_timeout_seconds: Optional[float] = DEFAULT_SUBSCRIBER_TIMEOUT_SECONDS,
+    ) -> None:
+        self.session = session
+        self.max_buffered_tokens = max_buffered_tokens
+        self.render_chat = render_chat
+        self.subscriber_timeout_seconds = subscriber_timeout_seconds
+        self._subscriptions: List[StreamSubscription] = []
+
+    def subscribe(self) -> StreamSubscription:
+        """Get an async iterator over the streamed tokens, must be called before `run`."""
+        subscription = StreamSubscription(self, self.max_buffered_tokens)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StreamSubscription, item: Any = _END_OF_STREAM) -> None:
+        """Stop sending tokens to a subscriber, ending its iteration with `item`."""
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+            subscription._end(item)  # pylint: disable=protected-access
+
+    async def _publish(self, item: Any) -> None:
+        for subscription in list(self._subscriptions):
+            try:
+                await asyncio.wait_for(subscription.queue.put(item), self.subscriber_timeout_seconds)
+            except asyncio.TimeoutError:
+                self.unsubscribe(subscription, StreamClosedError("The subscriber fell behind and was dropped."))
+
+    async def run(self, message_chunks: AsyncIterator[BaseMessageChunk]) -> AIChat:
+        """Consume the chunk stream, publish its tokens and append the final AI chat to the session."""
+        self.session.start_ai_stream(render_chat=self.render_chat)
+        finished = False
+        try:
+            async for message_chunk in message_chunks:
+                self.session.append_message_chunk(message_chunk)
+                if message_chunk.content:
+                    await self._publish(message_chunk.content)
+            finished = True
+        finally:
+            if not finished:
+                self.session.discard_ai_stream()
+                error = sys.exc_info()[1]
+                if error is None or isinstance(error, asyncio.CancelledError):
+                    error = StreamClosedError("The stream was cancelled.")
+                # no waiting here, the task may be cancelled, so whatever is buffered is replaced
+                for subscription in list(self._subscriptions):
+                    self.unsubscribe(subscription, error)
+        await self._publish(_END_OF_STREAM)
+        return self.session.finish_ai_stream()
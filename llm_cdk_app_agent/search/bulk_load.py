@@ -0,0 +1,198 @@
+"""Embed and upsert a stream of chunks into the vector index in parallel batches."""
+import hashlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+
+from llm_cdk_app_agent.search.indexer.manifest import CHUNK_NUMBER_METADATA, FILE_KEY_METADATA
+
+
+# pinecone recommends upserts of at most 100 vectors
+DEFAULT_BATCH_SIZE = 100
+# the batches embedded and upserted at once in each namespace
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_RETRIES = 3
+# the first retry waits this long, each following retry waits twice as long
+DEFAULT_BACKOFF_SECONDS = 0.5
+
+Vector = Tuple[str, List[float], Dict[str, Any]]
+# a chunk to load: its id, text and metadata
+Chunk = Tuple[str, str, Dict[str, Any]]
+
+
+def document_id(document: Document) -> str:
+    """
+    Get a deterministic id for a chunk, so loading the same chunk twice overwrites rather than duplicates it.
+
+    Loads that the manifest should track go through `sync_files`, whose ids come from `manifest.chunk_id`.
+    """
+    metadata = document.metadata
+    source = metadata.get(FILE_KEY_METADATA) or metadata.get("source") or metadata.get("url") or ""
+    digest = hashlib.sha1(f"{source}:{metadata.get(CHUNK_NUMBER_METADATA, '')}:".encode("utf-8"))
+    digest.update(document.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class BulkLoadStats:
+    """Define the throughput of a bulk load."""
+
+    namespace: Optional[str] = None
+    documents: int = 0
+    vectors: int = 0
+    batches: int = 0
+    retries: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def seconds(self) -> float:
+        """Get the elapsed time of the load."""
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def vectors_per_second(self) -> float:
+        """Get the number of vectors upserted per second."""
+        return self.vectors / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        """Get a one line summary of the load."""
+        failed = f", {len(self.failed_ids)} failed" if self.failed_ids else ""
+        return (
+            f"{self.namespace or 'default'}: {self.vectors} vectors in {self.batches} batches, {self.seconds:.1f}s "
+            f"({self.vectors_per_second:.0f} vectors/s, {self.retries} retries{failed})"
+        )
+
+
+def _batches(chunks: Iterable[Chunk], batch_size: int) -> Iterator[List[Chunk]]:
+    batch: List[Chunk] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BulkLoader:
+    """
+    Load chunk streams into a `pinecone.Index` or `LocalVectorIndex` in batches, in parallel.
+
+    Each namespace keeps at most `max_concurrency` batches being embedded and upserted at once, and
+    at most twice that in memory, so a stream of any length loads with flat memory. Chunk ids are
+    derived from their source and text, so a failed batch can be retried, or a whole load re-run,
+    without duplicating vectors. A batch is embedded once and only its upsert is retried. Passed to
+    `sync_files` it is the upsert stage of incremental indexing, with ids the manifest records.
+
+    Example
+    -------
+        loader = BulkLoader(index, get_embeddings())
+        stats = loader.load(split_docs(), namespace="cdk-docs")
+        print(stats.summary())
+
+    """
+
+    def __init__(
+        self,
+        index: Any,
+        embeddings: Embeddings,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        retries: int = DEFAULT_RETRIES,
+        backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+        text_key: str = "text",
+        id_for: Callable[[Document], str] = document_id,
+        on_progress: Optional[Callable[[BulkLoadStats], None]] = None,
+    ) -> None:
+        self.index = index
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.text_key = text_key
+        self.id_for = id_for
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+
+    def _with_retries(self, stats: BulkLoadStats, call: Callable[[], Any]) -> Any:
+        for attempt in range(self.retries + 1):
+            try:
+                return call()
+            except Exception:  # pylint: disable=broad-except
+                if attempt == self.retries:
+                    raise
+                with self._lock:
+                    stats.retries += 1
+                time.sleep(self.backoff_seconds * (2 ** attempt))
+        return None
+
+    def _vectors(self, batch: List[Chunk], values: List[List[float]]) -> List[Vector]:
+        vectors = []
+        for (chunk_id, text, chunk_metadata), vector in zip(batch, values):
+            # pinecone rejects null metadata values
+            metadata = {key: value for key, value in chunk_metadata.items() if value is not None}
+            metadata[self.text_key] = text
+            vectors.append((chunk_id, list(vector), metadata))
+        return vectors
+
+    def _load_batch(self, batch: List[Chunk], namespace: Optional[str], stats: BulkLoadStats) -> None:
+        try:
+            values = self._with_retries(stats, lambda: self.embeddings.embed_documents([text for _, text, _ in batch]))
+            vectors = self._vectors(batch, values)
+            self._with_retries(stats, lambda: self.index.upsert(vectors=vectors, namespace=namespace))
+        except Exception:  # pylint: disable=broad-except
+            with self._lock:
+                stats.failed_ids.extend(chunk_id for chunk_id, _, _ in batch)
+            return
+        with self._lock:
+            stats.vectors += len(vectors)
+            stats.batches += 1
+        if self.on_progress is not None:
+            self.on_progress(stats)
+
+    def load(self, documents: Iterable[Document], namespace: Optional[str] = None) -> BulkLoadStats:
+        """
+        Embed and upsert a stream of chunks into a namespace.
+
+        Args
+        ----
+            documents: The chunks to load, e.g. `split_docs()`, consumed lazily.
+            namespace: The namespace to load into.
+
+        Returns
+        -------
+            The throughput of the load and the ids of chunks whose batch failed every retry.
+
+        """
+        return self.upsert(((self.id_for(document), document.page_content, document.metadata) for document in documents), namespace)
+
+    def upsert(self, chunks: Iterable[Chunk], namespace: Optional[str] = None) -> BulkLoadStats:
+        """Embed and upsert a stream of (id, text, metadata) chunks whose ids are already known, like `load`."""
+        stats = BulkLoadStats(namespace=namespace)
+        max_in_flight = self.max_concurrency * 2
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="bulk-load") as executor:
+            in_flight: Deque[Future] = deque()
+            for batch in _batches(chunks, self.batch_size):
+                stats.documents += len(batch)
+                in_flight.append(executor.submit(self._load_batch, batch, namespace, stats))
+                if len(in_flight) >= max_in_flight:
+                    in_flight.popleft().result()
+            while in_flight:
+                in_flight.popleft().result()
+        stats.finished_at = time.perf_counter()
+        return stats
+
+    def load_all(self, streams: Mapping[str, Iterable[Document]]) -> Dict[str, BulkLoadStats]:
+        """Load several namespaces at once, each with its own concurrency bound."""
+        with ThreadPoolExecutor(max_workers=max(1, len(streams)), thread_name_prefix="bulk-namespace") as executor:
+            futures = {namespace: executor.submit(self.load, documents, namespace) for namespace, documents in streams.items()}
+            return {namespace: future.result() for namespace, future in futures.items()}
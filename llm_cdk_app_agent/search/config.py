@@ -1,31 +1,54 @@
 import os
-import pinecone
-from aws_lambda_powertools.utilities import parameters
-from indexer.fetch_cdk import read_init, split_docs
-from indexer.fastapi_data import split_fastapi_docs
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import Pinecone
+from functools import lru_cache
 
-os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
-os.environ["OPENAI_API_KEY"] = str(parameters.get_secret("openai"))
-pinecone_secret = str(parameters.get_secret("pinecone"))
+from llm_cdk_app_agent.search.local_index import LocalIndexManager
+from llm_cdk_app_agent.secret_provider import get_secret
+
+# "pinecone" uses the hosted index, "local" uses the memory-mapped index under LOCAL_INDEX_DIR
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.environ.get("LOCAL_INDEX_DIR", ".cache/vector_indexes")
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", ".cache/embeddings/embeddings.bin")
+# records the chunk ids of every indexed file, so re-runs only touch changed files
+MANIFEST_PATH = os.environ.get("MANIFEST_PATH", ".cache/manifests/manifest.json")
+
+
+@lru_cache(maxsize=None)
+def _init_pinecone(api_key, env_key):
+    "Initializing the pinecone client once per api key and environment, importing it on first use as it's slow to import."
+    import pinecone  # pylint: disable=import-outside-toplevel
+
+    pinecone.init(api_key=api_key, environment=env_key)
+    return pinecone
 
 
 class PineconeManager:
     "Managing pinecone configurations!"
 
-    def __init__(self, api_key=pinecone_secret, env_key="us-east-1-aws", index_name="llm-cdk-agent"):
-        self.api_key = api_key
+    def __init__(self, api_key=None, env_key="us-east-1-aws", index_name="llm-cdk-agent"):
+        self._api_key = api_key
         self.env_key = env_key
         self.index_name = index_name
-        pinecone.init(api_key=self.api_key, environment=self.env_key)
+        self._index = None
+
+    @property
+    def api_key(self):
+        "Getting the pinecone api key, fetching the secret on first use."
+        if self._api_key is None:
+            self._api_key = get_secret("pinecone")
+        return self._api_key
+
+    def _init(self):
+        return _init_pinecone(self.api_key, self.env_key)
 
     def list_indexes(self):
         "Getting all indexes and returns as a list."
-        return pinecone.list_indexes()
+        return self._init().list_indexes()
 
     def create_or_get_index(self, dimension=1536, metric="cosine"):
         "Creation of our vector database index!"
+        if self._index is not None:
+            return self._index
+        pinecone = self._init()
         if self.index_name not in self.list_indexes():
             pinecone.create_index(
                 name=self.index_name,
@@ -40,15 +63,48 @@ class PineconeManager:
             vector_count = index_stats_response.total_vector_count
             print(f"total_vector_count is {vector_count}")
 
-        return pinecone.Index(self.index_name)
+        self._index = pinecone.Index(self.index_name)
+        return self._index
+
+
+@lru_cache(maxsize=None)
+def get_index_manager(backend=None, index_name="llm-cdk-agent"):
+    "Getting the index manager for the configured vector backend, built once and reused."
+    backend = backend or VECTOR_BACKEND
+    if backend == "pinecone":
+        return PineconeManager(index_name=index_name)
+    if backend == "local":
+        return LocalIndexManager(index_name=index_name, root_dir=LOCAL_INDEX_DIR)
+    raise ValueError(f"Unsupported vector backend: {backend}")
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(cache_path=None):
+    "Getting OpenAI embeddings behind the on-disk embedding cache, built once and reused."
+    # langchain's embeddings are slow to import, so they're only imported once embeddings are needed
+    # pylint: disable=import-outside-toplevel
+    from langchain.embeddings.openai import OpenAIEmbeddings
+
+    from llm_cdk_app_agent.search.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    embeddings = OpenAIEmbeddings(openai_api_key=get_secret("openai"))
+    return CachedEmbeddings(embeddings, model=embeddings.model, cache=EmbeddingCache(cache_path or EMBEDDING_CACHE_PATH))
 
 
 if __name__ == "__main__":
-    pico = PineconeManager()
+    from llm_cdk_app_agent.search.bulk_load import BulkLoader
+    from llm_cdk_app_agent.search.indexer.fetch_cdk import sync_cdk_docs
+    from llm_cdk_app_agent.search.indexer.manifest import IndexManifest
+
+    pico = get_index_manager()
     index = pico.create_or_get_index()
-    # test, _ = read_init()
-    # embeddings = OpenAIEmbeddings()
-    # vectorstore = Pinecone(index, embeddings.embed_query, "text")
-    # vectorstore.add_documents(split_fastapi_docs(), namespace="fastapi-docs")
-    # #pinecone.delete_index("llm-cdk-agent")
-    print("everything uploaded successfuly!")
+
+    embeddings = get_embeddings()
+    loader = BulkLoader(index, embeddings)
+    try:
+        stats = sync_cdk_docs(index, embeddings, IndexManifest(MANIFEST_PATH), loader=loader)
+    except RuntimeError as error:
+        print(f"{error}, re-run to retry the remaining files")
+    else:
+        print(f"{stats.indexed_files} files indexed, {stats.skipped_files} unchanged, {stats.upserted_chunks} chunks upserted")
+        print("everything uploaded successfuly!")
@@ -0,0 +1,204 @@
+"""Cache embeddings on disk and batch the misses sent to the embedding provider."""
+import fcntl
+import hashlib
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+
+DEFAULT_CACHE_PATH = Path(".cache/embeddings/embeddings.bin")
+DEFAULT_LRU_SIZE = 10_000
+# openai accepts up to 2048 inputs per request, smaller batches keep retries cheap
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_CONCURRENCY = 4
+
+# every record is a sha256 key, the vector dimension, then the float32 vector
+_KEY_SIZE = 32
+_HEADER = struct.Struct(f"<{_KEY_SIZE}sI")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize chunk text so whitespace-only differences share a cache entry."""
+    return " ".join(text.split())
+
+
+def cache_key(model: str, text: str) -> bytes:
+    """Get the cache key of a chunk embedded by a model."""
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+@dataclass
+class CacheStats:
+    """Define the hit and miss counters of an embedding cache."""
+
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Get the fraction of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class EmbeddingCache:
+    """
+    Define a persistent embedding cache with an in-memory LRU in front of it.
+
+    Entries are appended to a single binary file as fixed headers followed by raw float32 vectors,
+    so the file is compact and can be shared between processes: only the offsets are loaded at open,
+    and vectors are read from disk on an LRU miss.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_CACHE_PATH, lru_size: int = DEFAULT_LRU_SIZE) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(exist_ok=True)
+        self.lru_size = lru_size
+        self.stats = CacheStats()
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        # key -> (offset of the vector, dimension)
+        self._offsets: Dict[bytes, Tuple[int, int]] = {}
+        self._scanned_to = 0
+        self._lock = threading.Lock()
+        self._scan()
+
+    def _scan(self) -> None:
+        """Index the records appended since the last scan, including those written by other processes."""
+        size = self.path.stat().st_size
+        if size == self._scanned_to:
+            return
+        with open(self.path, "rb") as cache_file:
+            cache_file.seek(self._scanned_to)
+            offset = self._scanned_to
+            while offset + _HEADER.size <= size:
+                key, dimension = _HEADER.unpack(cache_file.read(_HEADER.size))
+                vector_offset = offset + _HEADER.size
+                end = vector_offset + dimension * 4
+                if end > size:
+                    # a record still being written by another process, pick it up on the next scan
+                    break
+                self._offsets[key] = (vector_offset, dimension)
+                cache_file.seek(end)
+                offset = end
+        self._scanned_to = offset
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, key: bytes) -> Optional[List[float]]:
+        """Get a cached vector, counting the lookup as a hit or a miss."""
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            else:
+                if key not in self._offsets:
+                    self._scan()
+                location = self._offsets.get(key)
+                if location is not None:
+                    vector = np.fromfile(self.path, dtype=np.float32, count=location[1], offset=location[0])
+                    self._remember(key, vector)
+            if vector is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            return vector.tolist()
+
+    def put_many(self, entries: Dict[bytes, List[float]]) -> None:
+        """Append vectors to the cache file under an exclusive lock."""
+        if not entries:
+            return
+        records = []
+        vectors = {}
+        for key, values in entries.items():
+            vector = np.asarray(values, dtype=np.float32)
+            vectors[key] = vector
+            records.append(_HEADER.pack(key, len(vector)) + vector.tobytes())
+        with self._lock, open(self.path, "ab") as cache_file:
+            fcntl.flock(cache_file, fcntl.LOCK_EX)
+            try:
+                self._scan()
+                start = cache_file.seek(0, os.SEEK_END)
+                cache_file.write(b"".join(records))
+                cache_file.flush()
+            finally:
+                fcntl.flock(cache_file, fcntl.LOCK_UN)
+            offset = start
+            for (key, vector), record in zip(vectors.items(), records):
+                self._offsets[key] = (offset + _HEADER.size, len(vector))
+                offset += len(record)
+                self._remember(key, vector)
+            self._scanned_to = offset
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap an embeddings provider with an `EmbeddingCache`.
+
+    Identical chunks (after whitespace normalization) are only ever embedded once per model. Misses
+    are de-duplicated, grouped into batches of at most `batch_size` texts and sent to the provider
+    from a thread pool of `max_concurrency` workers.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model: str,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+
+    @property
+    def stats(self) -> CacheStats:
+        """Get the hit and miss counters of the underlying cache."""
+        return self.cache.stats
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, only sending cache misses to the provider."""
+        keys = [cache_key(self.model, text) for text in texts]
+        found: Dict[bytes, List[float]] = {}
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            vector = self.cache.get(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+        if missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[start : start + self.batch_size] for start in range(0, len(missing_keys), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = executor.map(lambda batch: self.embeddings.embed_documents([missing[key] for key in batch]), batches)
+                for batch, vectors in zip(batches, results):
+                    embedded = dict(zip(batch, vectors))
+                    self.cache.put_many(embedded)
+                    # return the float32 values that were cached, so hits and misses are identical
+                    found.update((key, np.asarray(vector, dtype=np.float32).tolist()) for key, vector in embedded.items())
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query through the cache."""
+        return self.embed_documents([text])[0]
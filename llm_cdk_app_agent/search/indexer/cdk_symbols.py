@@ -0,0 +1,438 @@
+"""Index the constructs of the aws_cdk package by parsing their sources with `ast`."""
+import ast
+import os
+import pickle
+import re
+import textwrap
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from llm_cdk_app_agent.search.indexer.cdk_wheel import WheelMember, WheelSource, download_wheel
+
+
+SYMBOL_INDEX_VERSION = 1
+SYMBOL_INDEX_DIR = Path(".cache/cdk_symbols")
+# prefixes up to this length are answered straight from the prefix table, longer ones bisect inside its range
+PREFIX_TABLE_LENGTH = 6
+# the longest chunk a symbol is rendered into, longer ones are split at line boundaries
+MAX_CHUNK_CHARS = 2000
+# jsii qualifies imported types with hashed module aliases, e.g. `_constructs_77d1e7e8.Construct`
+_HASHED_ALIAS = re.compile(r"\b_\w+_[0-9a-f]{8}\.")
+# the python package of each jsii assembly
+JSII_PACKAGES = {"aws-cdk-lib": "aws_cdk", "constructs": "constructs"}
+_PARAM_FIELD = re.compile(r"^:param (\w+):\s*(.*)$")
+
+
+@dataclass
+class Member:
+    """Define a parameter, method or property of a construct."""
+
+    name: str
+    signature: str = ""
+    doc: str = ""
+
+
+@dataclass
+class ConstructSymbol:
+    """Define a class of the aws_cdk package, with its props, methods, properties and examples."""
+
+    module: str
+    name: str
+    bases: List[str] = field(default_factory=list)
+    doc: str = ""
+    props: List[Member] = field(default_factory=list)
+    methods: List[Member] = field(default_factory=list)
+    properties: List[Member] = field(default_factory=list)
+    examples: List[str] = field(default_factory=list)
+    lineno: int = 0
+
+    @property
+    def qualified_name(self) -> str:
+        """Get the name of the construct within its module, e.g. `aws_cdk.aws_lambda.Function`."""
+        return f"{self.module}.{self.name}" if self.module else self.name
+
+    @property
+    def short_name(self) -> str:
+        """Get the name the docs use for the construct, e.g. `aws_lambda.Function`."""
+        return self.qualified_name[len("aws_cdk.") :] if self.qualified_name.startswith("aws_cdk.") else self.qualified_name
+
+    def chunks(self, max_chars: int = MAX_CHUNK_CHARS) -> List[Tuple[str, str]]:
+        """Get the (section, text) chunks the construct is embedded as: an overview, its methods and its examples."""
+        header = f"class {self.short_name}" + (f"({', '.join(self.bases)})" if self.bases else "")
+        overview = [header, self.doc] if self.doc else [header]
+        if self.props:
+            overview.append("Props:")
+            overview.extend(f"- {prop.name}{f' ({prop.signature})' if prop.signature else ''}: {prop.doc}" for prop in self.props)
+        if self.properties:
+            overview.append("Properties:")
+            overview.extend(f"- {prop.name}{f' ({prop.signature})' if prop.signature else ''}: {_summary(prop.doc)}" for prop in self.properties)
+        # a bare header says nothing the method chunks don't, e.g. for the functions of a module
+        chunks = [] if len(overview) == 1 and self.methods else [("overview", text) for text in _split_lines(overview, max_chars)]
+        for method in self.methods:
+            lines = [f"{self.short_name}.{method.signature}", method.doc] if method.doc else [f"{self.short_name}.{method.signature}"]
+            chunks.extend((f"method:{method.name}", text) for text in _split_lines(lines, max_chars))
+        for example in self.examples:
+            chunks.extend(("example", text) for text in _split_lines([f"Example of {self.short_name}:", example], max_chars))
+        return chunks
+
+
+def _split_lines(lines: List[str], max_chars: int) -> List[str]:
+    """Join lines into texts of at most `max_chars`, repeating the first line as a header on every text."""
+    text = "\n".join(lines)
+    if len(text) <= max_chars:
+        return [text]
+    header, texts, current = lines[0], [], [lines[0]]
+    size = len(header)
+    for line in "\n".join(lines[1:]).split("\n"):
+        line = line[: max_chars - len(header) - 1]
+        if size + len(line) + 1 > max_chars and len(current) > 1:
+            texts.append("\n".join(current))
+            current, size = [header], len(header)
+        current.append(line)
+        size += len(line) + 1
+    texts.append("\n".join(current))
+    return texts
+
+
+def _summary(doc: str) -> str:
+    return doc.split("\n\n", 1)[0].replace("\n", " ")
+
+
+def _clean_annotation(text: str) -> str:
+    return _HASHED_ALIAS.sub("", text).replace("builtins.", "").replace("typing.", "")
+
+
+class _SourceLines:
+    """
+    Slice the source of nodes out of a module.
+
+    `ast.get_source_segment` splits the whole source on every call, which is quadratic over the
+    thousands of annotations of a CDK module, so the lines are split once here instead.
+    """
+
+    def __init__(self, source: str) -> None:
+        self.lines = source.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+
+    def segment(self, node: Optional[ast.AST]) -> str:
+        """Get the source of a node with jsii's aliases stripped, or "" for no node."""
+        if node is None or getattr(node, "end_lineno", None) is None:
+            return ""
+        first, last = node.lineno - 1, node.end_lineno - 1  # type: ignore[attr-defined]
+        # column offsets count utf-8 bytes
+        if first == last:
+            text = self.lines[first].encode("utf-8")[node.col_offset : node.end_col_offset].decode("utf-8")  # type: ignore[attr-defined]
+        else:
+            text = "\n".join(
+                [self.lines[first].encode("utf-8")[node.col_offset :].decode("utf-8")]
+                + self.lines[first + 1 : last]
+                + [self.lines[last].encode("utf-8")[: node.end_col_offset].decode("utf-8")]  # type: ignore[attr-defined]
+            )
+        return _clean_annotation(text)
+
+
+def _parse_docstring(docstring: str) -> Tuple[str, Dict[str, str], List[str]]:
+    """Split a jsii docstring into its description, `:param` docs and `Example::` blocks."""
+    description: List[str] = []
+    params: Dict[str, List[str]] = {}
+    examples: List[str] = []
+    lines = docstring.split("\n")
+    current: Optional[List[str]] = None
+    in_fields = False
+    position = 0
+    while position < len(lines):
+        line = lines[position]
+        stripped = line.strip()
+        if stripped.endswith("::"):
+            block = []
+            position += 1
+            while position < len(lines) and (not lines[position].strip() or lines[position].startswith((" ", "\t"))):
+                block.append(lines[position])
+                position += 1
+            example = textwrap.dedent("\n".join(block)).strip("\n")
+            if example:
+                examples.append(example)
+            current = None
+            continue
+        match = _PARAM_FIELD.match(stripped)
+        if match:
+            in_fields = True
+            current = params.setdefault(match.group(1), [])
+            if match.group(2) and match.group(2) != "-":
+                current.append(match.group(2))
+        elif stripped.startswith(":"):
+            in_fields = True
+            current = None
+        elif current is not None and stripped:
+            current.append(stripped)
+        elif not in_fields:
+            description.append(line)
+        position += 1
+    return (
+        "\n".join(description).strip(),
+        {name: " ".join(parts) for name, parts in params.items()},
+        examples,
+    )
+
+
+def _is_property(node: ast.FunctionDef) -> bool:
+    for decorator in node.decorator_list:
+        name = decorator.attr if isinstance(decorator, ast.Attribute) else getattr(decorator, "id", "")
+        if name == "property":
+            return True
+    return False
+
+
+def _signature(source: _SourceLines, node: ast.FunctionDef, skip: int = 1) -> str:
+    """Get `name(arg: type, *, kwarg: type = default) -> returns` without the first `skip` positional args."""
+    segment = source.segment
+
+    def render(arg: ast.arg, default: Optional[ast.AST]) -> str:
+        text = arg.arg + (f": {segment(arg.annotation)}" if arg.annotation is not None else "")
+        return text + (f" = {segment(default)}" if default is not None else "")
+
+    args = node.args
+    positional = args.posonlyargs + args.args
+    defaults: List[Optional[ast.AST]] = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    parts = [render(arg, default) for arg, default in list(zip(positional, defaults))[skip:]]
+    if args.vararg is not None:
+        parts.append(f"*{args.vararg.arg}")
+    elif args.kwonlyargs:
+        parts.append("*")
+    parts.extend(render(arg, default) for arg, default in zip(args.kwonlyargs, args.kw_defaults))
+    if args.kwarg is not None:
+        parts.append(f"**{args.kwarg.arg}")
+    returns = f" -> {segment(node.returns)}" if node.returns is not None else ""
+    return f"{node.name}({', '.join(parts)}){returns}"
+
+
+def _jsii_module(node: ast.ClassDef) -> str:
+    """Get the module of a class from its `jsii_type`, e.g. `aws_cdk.aws_lambda` for "aws-cdk-lib.aws_lambda.Function"."""
+    # classes take it as a class keyword, structs, enums and interfaces from their jsii decorator
+    decorator_keywords = [keyword for decorator in node.decorator_list if isinstance(decorator, ast.Call) for keyword in decorator.keywords]
+    for keyword in node.keywords + decorator_keywords:
+        if keyword.arg == "jsii_type" and isinstance(keyword.value, ast.Constant) and isinstance(keyword.value.value, str):
+            parts = keyword.value.value.split(".")
+            return ".".join([JSII_PACKAGES.get(parts[0], parts[0].replace("-", "_"))] + parts[1:-1])
+    return ""
+
+
+def _parse_class(source: _SourceLines, module: str, node: ast.ClassDef, prefix: str = "") -> Iterator[ConstructSymbol]:
+    module = module or _jsii_module(node)
+    doc, _, examples = _parse_docstring(ast.get_docstring(node) or "")
+    symbol = ConstructSymbol(
+        module=module,
+        name=prefix + node.name,
+        bases=[source.segment(base) for base in node.bases],
+        doc=doc,
+        examples=examples,
+        lineno=node.lineno,
+    )
+    nested = []
+    for child in node.body:
+        if isinstance(child, ast.ClassDef) and not child.name.startswith("_"):
+            nested.append(child)
+        if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        child_doc, param_docs, child_examples = _parse_docstring(ast.get_docstring(child) or "")
+        if child.name == "__init__":
+            symbol.props = [
+                Member(arg.arg, source.segment(arg.annotation), param_docs.get(arg.arg, ""))
+                for arg in child.args.kwonlyargs
+            ]
+            symbol.examples.extend(child_examples)
+        elif child.name.startswith("_"):
+            continue
+        elif _is_property(child):
+            returns = source.segment(child.returns)
+            symbol.properties.append(Member(child.name, returns, child_doc))
+        else:
+            is_static = any(getattr(decorator, "id", "") == "staticmethod" or getattr(decorator, "attr", "") == "staticmethod" for decorator in child.decorator_list)
+            symbol.methods.append(Member(child.name, _signature(source, child, skip=0 if is_static else 1), child_doc))
+    yield symbol
+    for child in nested:
+        yield from _parse_class(source, module, child, prefix=f"{symbol.name}.")
+
+
+def parse_module(source: str, module: str = "") -> List[ConstructSymbol]:
+    """
+    Get the public classes and functions of a module's source.
+
+    Every public class becomes a symbol with the keyword-only `__init__` arguments as its props, its
+    public methods with their signatures, its properties and the `Example::` blocks of its
+    docstrings. Public module-level functions are gathered into a symbol named after the module.
+    Without a module name, classes take theirs from their `jsii_type`.
+    """
+    tree = ast.parse(source)
+    lines = _SourceLines(source)
+    symbols: List[ConstructSymbol] = []
+    parent, _, name = module.rpartition(".")
+    functions = ConstructSymbol(module=parent, name=name or "functions")
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and not node.name.startswith("_"):
+            symbols.extend(_parse_class(lines, module, node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            doc, _, examples = _parse_docstring(ast.get_docstring(node) or "")
+            functions.methods.append(Member(node.name, _signature(lines, node, skip=0), doc))
+            functions.examples.extend(examples)
+    if functions.methods:
+        symbols.append(functions)
+    return symbols
+
+
+def module_name(key: str) -> str:
+    """Get the dotted module of a source path, e.g. `aws_cdk.aws_lambda` for `aws_cdk/aws_lambda/__init__.py`."""
+    parts = key.replace("\\", "/")[: -len(".py")].split("/")
+    return ".".join(parts[:-1] if parts[-1] == "__init__" else parts)
+
+
+def symbol_chunks(source: str, module: str = "", max_chars: int = MAX_CHUNK_CHARS) -> List[Tuple[str, str, str]]:
+    """Get the (symbol, section, text) chunks of a module, one per construct overview, method and example."""
+    return [
+        (symbol.qualified_name, section, text)
+        for symbol in parse_module(source, module)
+        for section, text in symbol.chunks(max_chars)
+    ]
+
+
+def _parse_source(root: str, key: str) -> List[ConstructSymbol]:
+    """Parse a single module, run inside the worker processes."""
+    if Path(root).is_file():
+        source = WheelMember(root, key).read_text(errors="ignore")
+    else:
+        with open(Path(root) / key, "r", encoding="utf-8", errors="ignore") as module_file:
+            source = module_file.read()
+    try:
+        return parse_module(source, module_name(key))
+    except SyntaxError:
+        return []
+
+
+class SymbolIndex:
+    """
+    Define a table of the constructs of the aws_cdk package, with constant time exact and prefix lookup.
+
+    Every symbol is reachable by its qualified (`aws_cdk.aws_lambda.Function`), short
+    (`aws_lambda.Function`) and bare (`Function`) name, case-insensitively. Exact names are a dict
+    lookup. The keys are also kept sorted, with a table from every prefix of up to
+    `PREFIX_TABLE_LENGTH` characters to its range of keys, so a prefix lookup is a dict lookup plus
+    a bisect inside a small range.
+
+    Example
+    -------
+        index = SymbolIndex.load_or_build(download_wheel())
+        print(index.get("aws_lambda.Function").props)
+
+    """
+
+    def __init__(self, symbols: Iterable[ConstructSymbol] = ()) -> None:
+        self.symbols: List[ConstructSymbol] = list(symbols)
+        self._by_key: Dict[str, List[int]] = {}
+        for position, symbol in enumerate(self.symbols):
+            for key in {symbol.qualified_name.lower(), symbol.short_name.lower(), symbol.name.lower()}:
+                self._by_key.setdefault(key, []).append(position)
+        self._keys = sorted(self._by_key)
+        self._prefix_ranges: Dict[str, Tuple[int, int]] = {}
+        for position, key in enumerate(self._keys):
+            for length in range(1, min(len(key), PREFIX_TABLE_LENGTH) + 1):
+                start, _ = self._prefix_ranges.get(key[:length], (position, position))
+                self._prefix_ranges[key[:length]] = (start, position + 1)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def lookup(self, name: str) -> List[ConstructSymbol]:
+        """Get every symbol with exactly this name, e.g. both `Function`s for "Function"."""
+        return [self.symbols[position] for position in self._by_key.get(name.lower(), [])]
+
+    def get(self, name: str) -> Optional[ConstructSymbol]:
+        """Get the symbol with this name, the first one if the name is ambiguous."""
+        positions = self._by_key.get(name.lower())
+        return self.symbols[positions[0]] if positions else None
+
+    def prefix(self, prefix: str, limit: int = 20) -> List[ConstructSymbol]:
+        """Get up to `limit` symbols with a name starting with `prefix`, in name order."""
+        prefix = prefix.lower()
+        start, end = self._prefix_ranges.get(prefix[:PREFIX_TABLE_LENGTH], (0, 0))
+        if len(prefix) > PREFIX_TABLE_LENGTH:
+            start = bisect_left(self._keys, prefix, start, end)
+        seen, symbols = set(), []
+        for key in self._keys[start:end]:
+            if not key.startswith(prefix):
+                break
+            for position in self._by_key[key]:
+                if position not in seen:
+                    seen.add(position)
+                    symbols.append(self.symbols[position])
+                    if len(symbols) >= limit:
+                        return symbols
+        return symbols
+
+    def modules(self) -> Dict[str, List[ConstructSymbol]]:
+        """Get the symbols grouped by module."""
+        by_module: Dict[str, List[ConstructSymbol]] = {}
+        for symbol in self.symbols:
+            by_module.setdefault(symbol.module, []).append(symbol)
+        return by_module
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the index, lookup tables included, so loading it is a single unpickle."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with tmp_path.open("wb") as index_file:
+            pickle.dump({"version": SYMBOL_INDEX_VERSION, "state": self.__dict__}, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> Optional["SymbolIndex"]:
+        """Read an index written by `save`, or None if it's missing or outdated."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        with path.open("rb") as index_file:
+            data = pickle.load(index_file)
+        if data.get("version") != SYMBOL_INDEX_VERSION:
+            return None
+        index = cls.__new__(cls)
+        index.__dict__.update(data["state"])
+        return index
+
+    @classmethod
+    def build(cls, root: Union[str, Path], package: str = "aws_cdk", max_workers: Optional[int] = None) -> "SymbolIndex":
+        """Parse every module of a package, from a wheel or the folder it was extracted into, across a process pool."""
+        root = Path(root)
+        if root.is_file():
+            keys = WheelSource(root).modules(package)
+        else:
+            keys = [str(path.relative_to(root)) for path in sorted((root / package).glob("**/*.py"))]
+        max_workers = max_workers or os.cpu_count() or 1
+        symbols: List[ConstructSymbol] = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            in_flight: Deque[Future] = deque()
+            for key in keys:
+                in_flight.append(executor.submit(_parse_source, str(root), key))
+                if len(in_flight) >= max_workers * 2:
+                    symbols.extend(in_flight.popleft().result())
+            while in_flight:
+                symbols.extend(in_flight.popleft().result())
+        return cls(symbols)
+
+    @classmethod
+    def load_or_build(cls, wheel: Union[str, Path], index_dir: Union[str, Path] = SYMBOL_INDEX_DIR) -> "SymbolIndex":
+        """Get the index of a wheel, built once per version and loaded from disk afterwards."""
+        path = Path(index_dir) / f"{WheelSource(wheel).version}.pkl"
+        index = cls.load(path)
+        if index is None:
+            index = cls.build(wheel)
+            index.save(path)
+        return index
+
+
+if __name__ == "__main__":
+    symbol_index = SymbolIndex.load_or_build(download_wheel())
+    function = symbol_index.get("aws_lambda.Function")
+    print(f"{len(symbol_index)} symbols, aws_lambda.Function props: {[prop.name for prop in function.props] if function else None}")
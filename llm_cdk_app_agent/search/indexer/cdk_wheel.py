@@ -0,0 +1,237 @@
+"""Resolve, cache and read the aws-cdk-lib wheel without extracting it."""
+import hashlib
+import json
+import os
+import re
+import zipfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.error import URLError
+from urllib.request import urlopen
+from uuid import uuid4
+
+
+CDK_PACKAGE = "aws-cdk-lib"
+CDK_DIST_NAME = "aws_cdk_lib"
+PYPI_URL = "https://pypi.org/pypi"
+WHEEL_CACHE_DIR = Path(".cache/wheels")
+DEFAULT_TIMEOUT_SECONDS = 60.0
+_DOWNLOAD_BLOCK_SIZE = 1 << 20
+
+
+@dataclass
+class WheelRelease:
+    """Define a wheel published on PyPI."""
+
+    version: str
+    filename: str
+    url: str
+    sha256: Optional[str] = None
+
+
+def _version_key(version: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in re.findall(r"\d+", version))
+
+
+def resolve_wheel(
+    version: Optional[str] = None,
+    package: str = CDK_PACKAGE,
+    index_url: str = PYPI_URL,
+    timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+) -> WheelRelease:
+    """Get the pure-python wheel of a release from the PyPI JSON API, the latest release if no version is given."""
+    url = f"{index_url}/{package}/{version}/json" if version else f"{index_url}/{package}/json"
+    with urlopen(url, timeout=timeout_seconds) as response:
+        release = json.load(response)
+    for file in release["urls"]:
+        if file["packagetype"] == "bdist_wheel" and file["filename"].endswith("-none-any.whl"):
+            return WheelRelease(
+                version=release["info"]["version"],
+                filename=file["filename"],
+                url=file["url"],
+                sha256=file.get("digests", {}).get("sha256"),
+            )
+    raise FileNotFoundError(f"No pure-python wheel published for {package} {release['info']['version']}")
+
+
+def cached_wheel(version: str, cache_dir: Union[str, Path] = WHEEL_CACHE_DIR) -> Optional[Path]:
+    """Get the cached wheel of a version, if it was downloaded before."""
+    wheels = sorted((Path(cache_dir) / version).glob("*.whl"))
+    return wheels[0] if wheels else None
+
+
+def latest_cached_wheel(cache_dir: Union[str, Path] = WHEEL_CACHE_DIR) -> Optional[Path]:
+    """Get the cached wheel of the highest version."""
+    cache_dir = Path(cache_dir)
+    versions = sorted((path.name for path in cache_dir.iterdir() if path.is_dir()), key=_version_key) if cache_dir.exists() else []
+    for version in reversed(versions):
+        wheel = cached_wheel(version, cache_dir)
+        if wheel is not None:
+            return wheel
+    return None
+
+
+def download_wheel(
+    version: Optional[str] = None,
+    cache_dir: Union[str, Path] = WHEEL_CACHE_DIR,
+    package: str = CDK_PACKAGE,
+    index_url: str = PYPI_URL,
+    timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+) -> Path:
+    """
+    Get the path of a cached wheel, downloading it first if this version isn't cached yet.
+
+    Wheels are cached per version under `<cache_dir>/<version>/`, so a pinned version never touches
+    the network once cached. The latest version is looked up on PyPI, falling back to the newest
+    cached wheel when PyPI can't be reached. Downloads are streamed to disk, checked against the
+    published sha256 and moved into place atomically.
+
+    Args
+    ----
+        version: The version to get, the latest release by default.
+        cache_dir: The folder wheels are cached in.
+        package: The PyPI package name.
+        index_url: The base url of the PyPI JSON API.
+        timeout_seconds: The timeout of each request.
+
+    Returns
+    -------
+        The path of the wheel.
+
+    """
+    if version is not None:
+        wheel = cached_wheel(version, cache_dir)
+        if wheel is not None:
+            return wheel
+    try:
+        release = resolve_wheel(version, package, index_url, timeout_seconds)
+    except URLError:
+        wheel = latest_cached_wheel(cache_dir) if version is None else None
+        if wheel is None:
+            raise
+        print(f"PyPI unreachable, using cached {wheel.name}")
+        return wheel
+    wheel = cached_wheel(release.version, cache_dir)
+    if wheel is not None:
+        return wheel
+
+    path = Path(cache_dir) / release.version / release.filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    try:
+        with urlopen(release.url, timeout=timeout_seconds) as response, tmp_path.open("wb") as wheel_file:
+            for block in iter(lambda: response.read(_DOWNLOAD_BLOCK_SIZE), b""):
+                digest.update(block)
+                wheel_file.write(block)
+        if release.sha256 and digest.hexdigest() != release.sha256:
+            raise ValueError(f"sha256 mismatch for {release.filename}")
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    print(f"downloaded {release.filename}")
+    return path
+
+
+@lru_cache(maxsize=8)
+def _open_archive_in_process(path: str, pid: int) -> zipfile.ZipFile:  # pylint: disable=unused-argument
+    return zipfile.ZipFile(path)
+
+
+def _open_archive(path: str) -> zipfile.ZipFile:
+    """
+    Open a wheel once per process, so its central directory is only parsed once.
+
+    The cache is keyed on the pid, as a forked pool worker must not read through the file handle it
+    inherited: the offset is shared with the parent and its siblings, so their reads would interleave.
+    """
+    return _open_archive_in_process(path, os.getpid())
+
+
+class WheelMember:
+    """
+    Define a file inside a wheel, readable like a `Path`.
+
+    `open` streams the decompressed member, so hashing or reading it never extracts the wheel.
+    """
+
+    def __init__(self, wheel_path: Union[str, Path], name: str) -> None:
+        self.wheel_path = str(wheel_path)
+        self.name = name
+
+    def open(self, mode: str = "rb") -> IO[bytes]:
+        """Open the member for streaming reads."""
+        if mode != "rb":
+            raise ValueError(f"Wheel members can only be opened with mode 'rb', not {mode!r}")
+        return _open_archive(self.wheel_path).open(self.name)
+
+    def read_bytes(self) -> bytes:
+        """Read the whole member."""
+        return _open_archive(self.wheel_path).read(self.name)
+
+    def read_text(self, encoding: str = "utf-8", errors: str = "strict") -> str:
+        """Read the whole member as text."""
+        return self.read_bytes().decode(encoding, errors)
+
+    def __repr__(self) -> str:
+        return f"WheelMember({self.wheel_path!r}, {self.name!r})"
+
+
+class WheelSource:
+    """
+    Define the python sources of a wheel, read straight out of the archive on demand.
+
+    Example
+    -------
+        source = WheelSource(download_wheel())
+        text = source.read_text("aws_cdk/aws_lambda/__init__.py")
+
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+
+    @property
+    def archive(self) -> zipfile.ZipFile:
+        """Get the open archive."""
+        return _open_archive(str(self.path))
+
+    @property
+    def version(self) -> str:
+        """Get the version of the wheel from its dist-info folder."""
+        for name in self.archive.namelist():
+            folder = name.split("/", 1)[0]
+            if folder.endswith(".dist-info"):
+                return folder[: -len(".dist-info")].split("-", 1)[1]
+        raise FileNotFoundError(f"No dist-info folder in {self.path}")
+
+    def modules(self, package: str = "aws_cdk", suffix: str = ".py") -> List[str]:
+        """Get the sorted member names of every module of a package."""
+        prefix = package.replace(".", "/") + "/"
+        return sorted(name for name in self.archive.namelist() if name.startswith(prefix) and name.endswith(suffix))
+
+    def member(self, name: str) -> WheelMember:
+        """Get a member of the wheel."""
+        return WheelMember(self.path, name)
+
+    def open(self, name: str) -> IO[bytes]:
+        """Open a member for streaming reads."""
+        return self.member(name).open()
+
+    def read_text(self, name: str) -> str:
+        """Read a member as text."""
+        return self.member(name).read_text(errors="ignore")
+
+    def iter_lines(self, name: str) -> Iterator[str]:
+        """Lazily yield the lines of a member, decompressing as it goes."""
+        with self.open(name) as member:
+            for line in member:
+                yield line.decode("utf-8", "ignore")
+
+    def files(self, package: str = "aws_cdk") -> Iterator[Tuple[str, WheelMember, Dict[str, Any]]]:
+        """Yield the (key, member, metadata) of every module of a package, as `sync_files` expects."""
+        for name in self.modules(package):
+            yield name, self.member(name), {"module": ".".join(name.split("/")[:-1]), "source": name}
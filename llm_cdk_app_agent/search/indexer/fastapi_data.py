@@ -3,9 +3,15 @@ import os
 import json
 import shutil
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional
 
 from git import Repo
+from langchain.schema.embeddings import Embeddings
+
+from llm_cdk_app_agent.search.indexer.manifest import IndexManifest, SyncStats, hash_file, sync_files
+
+if TYPE_CHECKING:
+    from llm_cdk_app_agent.search.bulk_load import BulkLoader
 
 
 DEFAULT_EXTENSIONS = [
@@ -15,10 +21,16 @@ DEFAULT_EXTENSIONS = [
 DEFAULT_INCLUDE_FILES = [
     "Dockerfile",
 ]
+ROOT_URL = "https://github.com/"
 urls = ["https://github.com/tiangolo/fastapi/tree/master/docs",
         "https://github.com/tiangolo/fastapi/tree/master/docs_src"]
 
 
+def github_repo_name(url: str) -> str:
+    """Get the name a github url is cached and recorded under."""
+    return url.split("/")[-1]
+
+
 def iter_github_documents(
     url: str,
     repo_cache_dir: Path,
@@ -32,7 +44,7 @@ def iter_github_documents(
     include_files = frozenset(include_files or DEFAULT_INCLUDE_FILES)
     exclude_files = frozenset(exclude_files or [])
     exclude_patterns = exclude_patterns or []
-    repo_name = url.split("/")[-1]
+    repo_name = github_repo_name(url)
 
     repo_dir = repo_cache_dir / repo_name
     if (repo_cache_dir / repo_name).exists():
@@ -75,14 +87,23 @@ def create_dataset(
     urls: list[str],
     output_dir: Path,
     repo_cache_dir: Path,
+    manifest: Optional[IndexManifest] = None,
     **kwargs,
 ):
+    manifest = manifest or IndexManifest(output_dir / "manifest.json")
     for url in urls:
         print("processing url:", url)
-        for file, repo_name, repo_filepath, github_url in iter_github_documents(
+        seen = set()
+        # taken from the url, so a repo that yields no files still has its stale files removed
+        repo_name = github_repo_name(url)
+        for file, _, repo_filepath, github_url in iter_github_documents(
                 url, repo_cache_dir, **kwargs,
             ):
             file_name = get_file_name(repo_filepath)
+            seen.add(file_name)
+            content_hash = hash_file(file)
+            if manifest.file_hash(repo_name, file_name) == content_hash:
+                continue
             out_path = output_dir / repo_name / file_name
             out_path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -99,10 +120,64 @@ def create_dataset(
             }
             with metadata_file.open("w") as f:
                 json.dump(metadata, f)
+            manifest.record_file(repo_name, file_name, content_hash)
+
+        manifest.set_git_sha(repo_name, Repo(repo_cache_dir / repo_name).head.commit.hexsha)
+        # files that disappeared upstream are removed from the dataset
+        for file_name in [f for f in manifest.files(repo_name) if f not in seen]:
+            print(f"removing file: {file_name}")
+            (output_dir / repo_name / file_name).unlink(missing_ok=True)
+            (output_dir / "metadata" / repo_name / file_name).with_suffix(".metadata.json").unlink(missing_ok=True)
+            manifest.remove_file(repo_name, file_name)
+        manifest.save()
 
     print(f"created dataset at: {output_dir}")
 
 
+def sync_github_docs(
+    urls: List[str],
+    repo_cache_dir: Path,
+    index: Any,
+    embeddings: Embeddings,
+    manifest: IndexManifest,
+    split_text: Callable[[str], List[str]],
+    namespace: str = "fastapi-docs",
+    lexical_index: Optional[Any] = None,
+    loader: Optional["BulkLoader"] = None,
+    **kwargs,
+) -> SyncStats:
+    """
+    Incrementally index github docs into a namespace of the vector index.
+
+    Repos whose git sha matches the manifest are skipped entirely; otherwise only files whose
+    content hash changed are re-chunked and re-embedded.
+    """
+    stats = SyncStats()
+    for url in urls:
+        documents = list(iter_github_documents(url, repo_cache_dir, **kwargs))
+        # a repo without files is still synced, so the chunks of its removed files are deleted
+        repo_name = github_repo_name(url)
+        git_sha = Repo(repo_cache_dir / repo_name).head.commit.hexsha
+        if manifest.git_sha(repo_name) == git_sha:
+            print(f"{repo_name} already indexed at {git_sha}, skipping")
+            continue
+        repo_stats = sync_files(
+            manifest,
+            repo_name,
+            git_sha,
+            ((str(repo_filepath), file, {"github_url": github_url}) for file, _, repo_filepath, github_url in documents),
+            split_text,
+            index,
+            embeddings,
+            namespace=namespace,
+            lexical_index=lexical_index,
+            loader=loader,
+        )
+        for name, value in vars(repo_stats).items():
+            setattr(stats, name, getattr(stats, name) + value)
+    return stats
+
+
 
 if __name__ == "__main__":
     from argparse import ArgumentParser
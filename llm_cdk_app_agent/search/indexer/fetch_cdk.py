@@ -1,61 +1,241 @@
-import subprocess
 import os
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import DirectoryLoader, TextLoader, PythonLoader
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterator, List, Optional, Tuple
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
 from langchain.text_splitter import (
     RecursiveCharacterTextSplitter,
     Language,
 )
 
+from llm_cdk_app_agent.search.indexer import cdk_wheel
+from llm_cdk_app_agent.search.indexer.cdk_symbols import module_name, symbol_chunks
+from llm_cdk_app_agent.search.indexer.cdk_wheel import WheelMember, WheelSource
+from llm_cdk_app_agent.search.indexer.manifest import (
+    CHUNK_NUMBER_METADATA,
+    FILE_KEY_METADATA,
+    IndexManifest,
+    SyncStats,
+    sync_files,
+)
 
-# Function that downloads wheel files
-def download_wheel():
-    # Check if directory .cache/wheels exists
-    if not os.path.exists(".cache/wheels"):
-        os.makedirs(".cache/wheels")
+if TYPE_CHECKING:
+    from llm_cdk_app_agent.search.bulk_load import BulkLoader
 
-    if not os.path.exists(".cache/py_folders"):
-        os.makedirs(".cache/py_folders")
 
-    """Function that downloads wheel files and unzips it."""
-    # Download wheel file
-    # python -m pip download --only-binary :all: --dest . --no-cache aws-cdk-lib
-    subprocess.run(
-        ["python", "-m", "pip", "download", "--only-binary", ":all:", "--dest", ".cache/wheels", "--no-cache", "aws-cdk-lib"]
-    )
+CDK_REPO_NAME = cdk_wheel.CDK_DIST_NAME
+# the aws-cdk-lib version to index, the latest release if unset
+CDK_VERSION = os.environ.get("CDK_VERSION") or None
+
+
+def download_wheel(version: Optional[str] = CDK_VERSION) -> Path:
+    """Get the cached aws-cdk-lib wheel, downloading it only if this version isn't cached yet."""
+    return cdk_wheel.download_wheel(version)
+
 
-    # Unzip wheel file
-    # unzip aws_cdk_lib-1.130.0-py3-none-any.whl
-    subprocess.run(["unzip", ".cache/wheels/aws_cdk_lib-2.104.0-py3-none-any.whl", "-d", ".cache/py_folders"])
+def _resolve_root(root: Optional[Path]) -> Path:
+    """Get the wheel or extracted folder to read from, the cached wheel by default."""
+    return Path(root) if root is not None else download_wheel()
 
 
 # Read in aws_lambda and aws_s3 __init__.py files
-def read_init():
-    """Read in aws_lambda and aws_s3 __init__.py files."""
-    # Read in aws_lambda __init__.py file
-    with open(".cache/py_folders/aws_cdk/aws_lambda/__init__.py", "r") as f:
-        aws_lambda_init = f.read()
+def read_init(root: Optional[Path] = None) -> Tuple[str, str]:
+    """Read in aws_lambda and aws_s3 __init__.py files straight from the wheel."""
+    source = WheelSource(_resolve_root(root))
+    return (
+        source.read_text("aws_cdk/aws_lambda/__init__.py"),
+        source.read_text("aws_cdk/aws_s3/__init__.py"),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_python_splitter() -> RecursiveCharacterTextSplitter:
+    """Get the splitter used for CDK sources that can't be parsed into symbols, built once per process."""
+    return RecursiveCharacterTextSplitter.from_language(
+        language=Language.PYTHON, chunk_size=200, chunk_overlap=20)
+
+
+@dataclass
+class ChunkingStats:
+    """Define the throughput of a chunking run."""
+
+    files: int = 0
+    chunks: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def seconds(self) -> float:
+        """Get the elapsed time of the run."""
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def files_per_second(self) -> float:
+        """Get the number of files split per second."""
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Get the number of chunks produced per second."""
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+
+def _split_file(path: str, root: str) -> List[Document]:
+    """Load and split a single python file, run inside the worker processes."""
+    if Path(root).is_file():
+        relative_path = Path(path)
+        text = WheelMember(root, path).read_text(errors="ignore")
+    else:
+        relative_path = Path(path).relative_to(root)
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    metadata = {"source": str(relative_path), "module": ".".join(relative_path.parent.parts)}
+    # the file key and chunk number keep identical chunk texts of a module apart
+    return [
+        Document(
+            page_content=chunk,
+            metadata={
+                **metadata,
+                **chunk_metadata,
+                FILE_KEY_METADATA: str(relative_path),
+                CHUNK_NUMBER_METADATA: number,
+            },
+        )
+        for number, (chunk, chunk_metadata) in enumerate(split_cdk_source(text, str(relative_path)))
+    ]
+
+
+def split_cdk_source(text: str, file_key: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Split the CDK module at `file_key` into one chunk per construct overview, method and example, with its symbol and section."""
+    try:
+        chunks = symbol_chunks(text, module_name(file_key))
+    except SyntaxError:
+        return [(chunk, {}) for chunk in get_python_splitter().split_text(text)]
+    return [(chunk, {"symbol": symbol, "section": section}) for symbol, section, chunk in chunks]
 
-    # Read in aws_s3 __init__.py file
-    with open(".cache/py_folders/aws_cdk/aws_s3/__init__.py", "r") as f:
-        aws_s3_init = f.read()
 
-    return aws_lambda_init, aws_s3_init
+def _source_paths(root: Path, package: str) -> List[str]:
+    if root.is_file():
+        return WheelSource(root).modules(package)
+    return [str(path) for path in sorted((root / package).glob("**/*.py"))]
+
+
+def _collect(future: Future, stats: ChunkingStats) -> List[Document]:
+    chunks = future.result()
+    stats.files += 1
+    stats.chunks += len(chunks)
+    return chunks
+
+
+def iter_cdk_chunks(
+    root: Optional[Path] = None,
+    package: str = "aws_cdk",
+    max_workers: Optional[int] = None,
+    stats: Optional[ChunkingStats] = None,
+) -> Iterator[Document]:
+    """
+    Lazily split every python file of the aws_cdk package into symbol chunks.
+
+    Files are read straight out of the wheel, each worker opening the archive once and decompressing
+    only the members it is given, and split in a process pool. Only a bounded number of files are in flight at
+    once and their chunks are yielded as soon as each file is done, in file order, so memory stays
+    flat no matter how large the package is.
+
+    Args
+    ----
+        root: The wheel, or a folder it was extracted into, the cached wheel by default.
+        package: The package folder to split below the root.
+        max_workers: The number of worker processes, defaults to the cpu count.
+        stats: Updated with the files and chunks processed, to report throughput.
+
+    Yields
+    ------
+        The chunks of every file.
+
+    """
+    stats = stats if stats is not None else ChunkingStats()
+    root = _resolve_root(root)
+    paths = _source_paths(root, package)
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_workers * 2
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight: Deque[Future] = deque()
+        for path in paths:
+            in_flight.append(executor.submit(_split_file, path, str(root)))
+            if len(in_flight) >= max_in_flight:
+                yield from _collect(in_flight.popleft(), stats)
+        while in_flight:
+            yield from _collect(in_flight.popleft(), stats)
+    stats.finished_at = time.perf_counter()
 
 
 # Recursively split docs text
-def split_docs(doc: tuple):
-    """Recursively split text."""
-    loader = DirectoryLoader(".cache/py_folders/aws_cdk/aws_lambda", glob="**/*.py", use_multithreading=True, loader_cls=PythonLoader)
-    docs = loader.load()
-    python_splitter = RecursiveCharacterTextSplitter.from_language(
-    language=Language.PYTHON, chunk_size=200, chunk_overlap=20)
-    splitted_docs = python_splitter.split_documents(docs)
-    
-    return splitted_docs
+def split_docs(root: Optional[Path] = None, stats: Optional[ChunkingStats] = None) -> Iterator[Document]:
+    """Recursively split the full aws_cdk package into chunks."""
+    return iter_cdk_chunks(root, stats=stats)
 
-if __name__ == "__main__":
-    download_wheel()
-    test, _ = read_init()
 
-    print(len(split_docs(test)))
+def cdk_version(root: Optional[Path] = None) -> str:
+    """Get the version of the aws-cdk-lib wheel, or of the folder it was extracted into, from its dist-info folder."""
+    root = _resolve_root(root)
+    if root.is_file():
+        return WheelSource(root).version
+    dist_infos = sorted(root.glob(f"{CDK_REPO_NAME}-*.dist-info"))
+    if not dist_infos:
+        raise FileNotFoundError(f"No extracted {CDK_REPO_NAME} wheel found in {root}")
+    return dist_infos[-1].name[len(CDK_REPO_NAME) + 1 : -len(".dist-info")]
+
+
+def iter_cdk_files(root: Optional[Path] = None) -> Iterator[Tuple[str, Any, Dict[str, Any]]]:
+    """Yield the (key, path, metadata) of every python file in the aws_cdk package, reading members of the wheel lazily."""
+    root = _resolve_root(root)
+    if root.is_file():
+        yield from WheelSource(root).files("aws_cdk")
+        return
+    for path in sorted((root / "aws_cdk").glob("**/*.py")):
+        key = str(path.relative_to(root))
+        yield key, path, {"module": ".".join(path.relative_to(root).parent.parts), "source": key}
+
+
+def sync_cdk_docs(
+    index: Any,
+    embeddings: Embeddings,
+    manifest: IndexManifest,
+    namespace: str = "cdk-docs",
+    root: Optional[Path] = None,
+    lexical_index: Optional[Any] = None,
+    loader: Optional["BulkLoader"] = None,
+) -> SyncStats:
+    """Incrementally index the aws_cdk package of the wheel, re-embedding only changed modules in parallel batches."""
+    root = _resolve_root(root)
+    version = cdk_version(root)
+    if manifest.git_sha(CDK_REPO_NAME) == version:
+        print(f"{CDK_REPO_NAME} already indexed at {version}, skipping")
+        return SyncStats()
+    return sync_files(
+        manifest,
+        CDK_REPO_NAME,
+        version,
+        iter_cdk_files(root),
+        None,
+        index,
+        embeddings,
+        namespace=namespace,
+        lexical_index=lexical_index,
+        loader=loader,
+        split_file=split_cdk_source,
+    )
+
+
+if __name__ == "__main__":
+    wheel = download_wheel()
+    stats = ChunkingStats()
+    for _ in split_docs(wheel, stats=stats):
+        pass
+    print(f"{stats.files} files, {stats.chunks} chunks in {stats.seconds:.1f}s "
+          f"({stats.files_per_second:.1f} files/s, {stats.chunks_per_second:.0f} chunks/s)")
@@ -1,41 +1,258 @@
-from urls import URLS
-import requests
+import asyncio
+import hashlib
+import json
 import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from uuid import uuid4
 
+import aiohttp
+from langchain.schema import Document
 
-def fetch_urls(URLS):
-    if not os.path.exists(".cache"):
-        os.makedirs(".cache")
+from llm_cdk_app_agent.search.indexer.html_sections import iter_section_documents
+from llm_cdk_app_agent.search.indexer.urls import URLS
 
-    for url in URLS:
-        print(url)
-        # Get our output
-        output = requests.get(url).text
 
-        # Split the url name
-        url_name = url.split(".")
-        url_name = f"{url_name[-3]}_{url_name[-2]}"
-        with open(f".cache/{url_name}.html", "w") as f:
-            f.write(output)
+DEFAULT_HTTP_CACHE_DIR = Path(".cache/http")
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 30.0
+DEFAULT_RETRIES = 3
+# the first retry waits this long, each following retry waits twice as long plus jitter
+DEFAULT_BACKOFF_SECONDS = 0.5
+# statuses worth retrying, everything else is returned as an error right away
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# the longest a Retry-After header may make a retry wait, so one server can't stall a sync
+MAX_RETRY_AFTER_SECONDS = 60.0
 
 
-def load_html():
-    """Load html from cache."""
-    docs = []
-    for file in os.listdir(".cache"):
-        with open(f".cache/{file}", "r") as f:
-            docs.append(f.read())
-    return docs
+@dataclass
+class FetchResult:
+    """Define the outcome of fetching a url."""
 
+    url: str
+    # "fetched" for a new or changed page, "not_modified" for a 304, "error" if every attempt failed
+    status: str
+    content_hash: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
 
-def split_docs(docs):
-    """Split docs into sections."""
-    pass
+
+class HttpCache:
+    """
+    Define a content-addressed cache of fetched pages with their validators.
+
+    Page bodies are stored once per sha256 under `objects/`, so identical pages share a file and
+    urls can never collide. `index.json` maps every url to its content hash, ETag and Last-Modified,
+    which are sent back as conditional request headers.
+    """
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_HTTP_CACHE_DIR) -> None:
+        self.root = Path(root)
+        self.index_path = self.root / "index.json"
+        self._index: Dict[str, Dict[str, Any]] = {}
+        if self.index_path.exists():
+            with self.index_path.open("r", encoding="utf-8") as index_file:
+                self._index = json.load(index_file)
+
+    def object_path(self, content_hash: str) -> Path:
+        """Get the path a page body is stored at."""
+        return self.root / "objects" / content_hash[:2] / f"{content_hash}.html"
+
+    def entry(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get the cached entry of a url."""
+        return self._index.get(url)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Get the headers that let the server answer 304 if the cached page is still current."""
+        entry = self._index.get(url)
+        if entry is None or not self.object_path(entry["content_hash"]).exists():
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str]) -> str:
+        """Store a page body and its validators, returning its content hash."""
+        content_hash = hashlib.sha256(body).hexdigest()
+        path = self.object_path(content_hash)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{uuid4().hex}.tmp")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+        self._index[url] = {
+            "content_hash": content_hash,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }
+        return content_hash
+
+    def touch(self, url: str) -> Optional[str]:
+        """Record that a cached page was confirmed current, returning its content hash, or None if it isn't cached."""
+        entry = self._index.get(url)
+        if entry is None or not self.object_path(entry["content_hash"]).exists():
+            return None
+        entry["fetched_at"] = time.time()
+        return entry["content_hash"]
+
+    def save(self) -> None:
+        """Write the index atomically."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as index_file:
+            json.dump(self._index, index_file)
+        os.replace(tmp_path, self.index_path)
+
+    def iter_pages(self) -> Iterator[Tuple[str, Path]]:
+        """Yield the url and body path of every cached page."""
+        for url, entry in self._index.items():
+            path = self.object_path(entry["content_hash"])
+            if path.exists():
+                yield url, path
+
+
+def _parse_retry_after(retry_after: Optional[str]) -> Optional[float]:
+    """Get the seconds a Retry-After header asks to wait, given either as seconds or as an HTTP date."""
+    if not retry_after:
+        return None
+    retry_after = retry_after.strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_delay(attempt: int, backoff_seconds: float, retry_after: Optional[str]) -> float:
+    delay = _parse_retry_after(retry_after)
+    if delay is not None:
+        return min(delay, MAX_RETRY_AFTER_SECONDS)
+    return backoff_seconds * (2 ** (attempt - 1)) * (1 + random.random() / 2)
+
+
+async def _fetch_one(
+    session: aiohttp.ClientSession,
+    semaphore: asyncio.Semaphore,
+    cache: HttpCache,
+    url: str,
+    retries: int,
+    backoff_seconds: float,
+) -> FetchResult:
+    result = FetchResult(url=url, status="error")
+    conditional = True
+    for attempt in range(1, retries + 2):
+        result.attempts = attempt
+        retry_after = None
+        try:
+            async with semaphore:
+                headers = cache.conditional_headers(url) if conditional else {}
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        content_hash = cache.touch(url)
+                        if content_hash is not None:
+                            result.status, result.content_hash, result.error = "not_modified", content_hash, None
+                            return result
+                        # nothing to fall back on, e.g. the cached copy went away, so ask for the whole page
+                        result.error = "HTTP 304 without a cached copy"
+                        conditional = False
+                    elif response.status == 200:
+                        body = await response.read()
+                        content_hash = cache.store(
+                            url, body, response.headers.get("ETag"), response.headers.get("Last-Modified")
+                        )
+                        result.status, result.content_hash, result.error = "fetched", content_hash, None
+                        return result
+                    else:
+                        result.error = f"HTTP {response.status}"
+                        if response.status not in RETRY_STATUSES:
+                            return result
+                        retry_after = response.headers.get("Retry-After")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            result.error = f"{type(error).__name__}: {error}"
+        if attempt <= retries:
+            await asyncio.sleep(_retry_delay(attempt, backoff_seconds, retry_after))
+    return result
+
+
+async def fetch_all(
+    urls: Sequence[str],
+    cache: HttpCache,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+    retries: int = DEFAULT_RETRIES,
+    backoff_seconds: float = DEFAULT_BACKOFF_SECONDS,
+) -> List[FetchResult]:
+    """
+    Fetch urls concurrently into the cache with conditional requests.
+
+    One pooled client session is shared by every request and at most `max_concurrency` requests are
+    in flight. Pages the cache already holds are requested with If-None-Match / If-Modified-Since, so
+    an unchanged page costs a 304 instead of a download. Connection errors, timeouts, 429s and 5xxs
+    are retried with exponential backoff, honouring Retry-After up to `MAX_RETRY_AFTER_SECONDS`.
+
+    Args
+    ----
+        urls: The urls to fetch.
+        cache: The cache pages and validators are stored in, its index is saved when done.
+        max_concurrency: The maximum number of requests in flight.
+        timeout_seconds: The total timeout of a single request.
+        retries: How many times a failed request is retried.
+        backoff_seconds: The wait before the first retry.
+
+    Returns
+    -------
+        The result of every url, in order.
+
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            return list(
+                await asyncio.gather(
+                    *(_fetch_one(session, semaphore, cache, url, retries, backoff_seconds) for url in urls)
+                )
+            )
+    finally:
+        cache.save()
+
+
+def fetch_urls(URLS, cache_dir: Union[str, Path] = DEFAULT_HTTP_CACHE_DIR, **kwargs) -> List[FetchResult]:
+    """Fetch urls into the http cache, only downloading pages that changed since the last run."""
+    results = asyncio.run(fetch_all(URLS, HttpCache(cache_dir), **kwargs))
+    for result in results:
+        print(f"{result.status:>12} {result.url}" + (f" ({result.error})" if result.error else ""))
+    return results
+
+
+def load_html(cache_dir: Union[str, Path] = DEFAULT_HTTP_CACHE_DIR) -> Iterator[Tuple[str, str]]:
+    """Lazily load the url and html of every cached page."""
+    for url, path in HttpCache(cache_dir).iter_pages():
+        yield url, path.read_text(encoding="utf-8", errors="replace")
+
+
+def split_docs(cache_dir: Union[str, Path] = DEFAULT_HTTP_CACHE_DIR, max_workers: Optional[int] = None, **kwargs) -> Iterator[Document]:
+    """Lazily split the cached reference pages into construct, property, method and example sections."""
+    return iter_section_documents(HttpCache(cache_dir).iter_pages(), max_workers=max_workers, **kwargs)
 
 
 if __name__ == "__main__":
-    # fetch_urls(URLS)
+    fetch_urls(URLS)
 
-    # Load html from cache
-    docs = load_html()
-    print(docs)
+    # Split the cached pages into sections
+    count = sum(1 for _ in split_docs())
+    print(f"{count} section chunks")
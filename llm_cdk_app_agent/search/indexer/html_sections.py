@@ -0,0 +1,260 @@
+"""Turn scraped CDK API reference pages into sections, streaming each page through an HTML parser."""
+import os
+import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from llm_cdk_app_agent.search.indexer.manifest import CHUNK_NUMBER_METADATA, FILE_KEY_METADATA
+
+
+# how much of a page is read and fed to the parser at a time
+READ_SIZE = 64 * 1024
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 100
+# elements that hold site chrome rather than reference content
+SKIP_TAGS = frozenset(["script", "style", "nav", "header", "footer", "aside", "noscript", "svg", "button"])
+BLOCK_TAGS = frozenset(["p", "div", "li", "br", "ul", "ol", "table", "section", "article", "dt", "dd", "blockquote"])
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4}
+# the section kind of the members listed under each top-level heading
+GROUP_KINDS = {
+    "initializer": "construct",
+    "construct props": "property",
+    "properties": "property",
+    "methods": "method",
+    "static methods": "method",
+    "example": "example",
+    "examples": "example",
+}
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+@dataclass
+class Section:
+    """Define a section of a reference page, e.g. a property or a method of a construct."""
+
+    kind: str
+    title: str
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def page_metadata(url: str) -> Dict[str, str]:
+    """Get the package, module and construct of a reference page from its url, e.g. `aws-cdk-lib.aws_lambda.Alias.html`."""
+    name = url.rstrip("/").rsplit("/", 1)[-1]
+    name = name[: -len(".html")] if name.endswith(".html") else name
+    metadata = {"url": url}
+    parts = name.split(".")
+    if len(parts) >= 2:
+        metadata["package"] = parts[0]
+        module = parts[1]
+        if module.endswith("-readme"):
+            module = module[: -len("-readme")]
+            metadata["construct"] = "README"
+        metadata["module"] = module
+    if len(parts) >= 3:
+        metadata["construct"] = parts[2]
+    return metadata
+
+
+def _clean(text: str) -> str:
+    lines = [_WHITESPACE.sub(" ", line).strip() for line in text.split("\n")]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+
+
+class ReferencePageParser(HTMLParser):
+    """
+    Parse a reference page fed in pieces, emitting each section as soon as the next heading closes it.
+
+    The h1 names the construct, h2s open a group (Initializer, Properties, Methods, ...) and h3/h4s
+    open one member of that group. Code blocks under an example heading, or right after text ending
+    in "Example", become sections of their own, other code blocks stay part of the surrounding text.
+    Table rows are kept as "cell | cell" lines. Only the open section is held in memory.
+    """
+
+    def __init__(self, url: str) -> None:
+        super().__init__(convert_charrefs=True)
+        self.base_metadata = page_metadata(url)
+        self.construct = self.base_metadata.get("construct", "")
+        self.sections: List[Section] = []
+        self._skip_depth = 0
+        self._heading: Optional[Tuple[int, List[str], Optional[str]]] = None
+        self._pre: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+        self._row: Optional[List[str]] = None
+        self._group = ""
+        self._kind = "construct"
+        self._title = self.construct
+        self._anchor: Optional[str] = None
+        self._text: List[str] = []
+
+    def _emit(self, kind: str, title: str, text: str, anchor: Optional[str]) -> None:
+        text = _clean(text) if kind != "example" else text.strip("\n")
+        if not text:
+            return
+        metadata = {**self.base_metadata, "kind": kind, "section": title}
+        if self._group:
+            metadata["group"] = self._group
+        if anchor:
+            metadata["anchor"] = anchor
+        self.sections.append(Section(kind=kind, title=title, text=text, metadata=metadata))
+
+    def _close_section(self) -> None:
+        self._emit(self._kind, self._title, "".join(self._text), self._anchor)
+        self._text = []
+
+    def _write(self, text: str) -> None:
+        if self._cell is not None:
+            self._cell.append(text)
+        else:
+            self._text.append(text)
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        if tag in HEADING_TAGS and self._pre is None:
+            self._close_section()
+            self._heading = (HEADING_TAGS[tag], [], dict(attrs).get("id"))
+        elif tag == "pre":
+            self._pre = []
+        elif tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+        elif tag in BLOCK_TAGS and self._pre is None:
+            self._write("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if self._skip_depth:
+            return
+        if tag in HEADING_TAGS and self._heading is not None:
+            self._open_heading()
+        elif tag == "pre" and self._pre is not None:
+            self._close_pre()
+        elif tag in ("td", "th") and self._cell is not None:
+            self._row.append(_clean("".join(self._cell)).replace("\n", " "))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if any(self._row):
+                self._text.append("\n" + " | ".join(self._row) + "\n")
+            self._row = None
+        elif tag in BLOCK_TAGS and self._pre is None:
+            self._write("\n")
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_depth:
+            return
+        if self._heading is not None:
+            self._heading[1].append(data)
+        elif self._pre is not None:
+            self._pre.append(data)
+        else:
+            self._write(data)
+
+    def _open_heading(self) -> None:
+        level, parts, anchor = self._heading
+        self._heading = None
+        title = _clean("".join(parts)).replace("\n", " ")
+        if level == 1:
+            self.construct = self.base_metadata.get("construct") or title
+            self._group, self._kind, self._title = "", "construct", title
+        elif level == 2:
+            self._group = title
+            self._kind = GROUP_KINDS.get(title.lower(), "other")
+            self._title = f"{self.construct} {title}".strip()
+        else:
+            self._kind = GROUP_KINDS.get(self._group.lower(), "other")
+            self._title = f"{self.construct}.{title}" if self.construct else title
+        self._anchor = anchor
+
+    def _close_pre(self) -> None:
+        code = "".join(self._pre)
+        self._pre = None
+        preceding = _clean("".join(self._text[-4:]))
+        if self._kind == "example" or preceding.lower().rstrip(":").endswith("example"):
+            self._emit("example", self._title, code, self._anchor)
+        else:
+            self._text.append("\n" + code + "\n")
+
+    def close(self) -> None:
+        super().close()
+        self._close_section()
+
+    def drain(self) -> List[Section]:
+        """Get the sections closed so far and forget them."""
+        sections, self.sections = self.sections, []
+        return sections
+
+
+def iter_page_sections(url: str, path: Path) -> Iterator[Section]:
+    """Yield the sections of a cached page, reading it in pieces."""
+    parser = ReferencePageParser(url)
+    with open(path, "r", encoding="utf-8", errors="replace") as page:
+        for data in iter(lambda: page.read(READ_SIZE), ""):
+            parser.feed(data)
+            yield from parser.drain()
+    parser.close()
+    yield from parser.drain()
+
+
+def _page_documents(url: str, path: str, chunk_size: int, chunk_overlap: int) -> List[Document]:
+    """Parse a page into chunked documents, run inside the worker processes."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    documents = []
+    for position, section in enumerate(iter_page_sections(url, Path(path))):
+        # chunks of one section share a file key, so the reranker can merge neighbours back together
+        file_key = f"{url}#{section.metadata.get('anchor') or position}"
+        for number, text in enumerate(splitter.split_text(section.text)):
+            # every chunk starts with its section title, so it still says what it documents when retrieved alone
+            metadata = {**section.metadata, FILE_KEY_METADATA: file_key, CHUNK_NUMBER_METADATA: number}
+            documents.append(Document(page_content=f"{section.title}\n{text}", metadata=metadata))
+    return documents
+
+
+def iter_section_documents(
+    pages: Iterable[Tuple[str, Path]],
+    max_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> Iterator[Document]:
+    """
+    Lazily parse cached reference pages into section chunks across a process pool.
+
+    Only a bounded number of pages are in flight at once and their chunks are yielded in page order
+    as soon as each page is done, so memory stays flat no matter how many pages are cached.
+
+    Args
+    ----
+        pages: The (url, path) of every cached page, e.g. `HttpCache.iter_pages()`.
+        max_workers: The number of worker processes, defaults to the cpu count.
+        chunk_size: The maximum characters of a chunk, long sections are split.
+        chunk_overlap: The characters shared by consecutive chunks of a section.
+
+    Yields
+    ------
+        A document per chunk, with the url, module, construct, kind and section in its metadata.
+
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_workers * 2
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight: Deque[Future] = deque()
+        for url, path in pages:
+            in_flight.append(executor.submit(_page_documents, url, str(path), chunk_size, chunk_overlap))
+            if len(in_flight) >= max_in_flight:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
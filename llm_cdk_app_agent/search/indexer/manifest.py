@@ -0,0 +1,224 @@
+"""Track what has been indexed so re-indexing only touches changed files."""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain.schema.embeddings import Embeddings
+
+if TYPE_CHECKING:
+    from llm_cdk_app_agent.search.bulk_load import BulkLoader
+
+
+MANIFEST_VERSION = 1
+# how many re-indexed files to process between manifest checkpoints
+CHECKPOINT_EVERY = 50
+_HASH_BLOCK_SIZE = 1 << 20
+# metadata keys recording where in its file a chunk came from
+FILE_KEY_METADATA = "file_key"
+CHUNK_NUMBER_METADATA = "chunk_number"
+
+# splits the text of a file, given its key, into (chunk, metadata) pairs
+FileSplitter = Callable[[str, str], List[Tuple[str, Dict[str, Any]]]]
+
+
+def hash_file(path: Path) -> str:
+    """Get the sha256 of a file's content, reading it in blocks from anything with a `Path`-like `open`."""
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for block in iter(lambda: file.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(repo_name: str, file_key: str, content_hash: str, chunk_number: int) -> str:
+    """Get a deterministic id for a chunk, so re-upserting the same chunk is idempotent."""
+    return hashlib.sha1(f"{repo_name}:{file_key}:{content_hash}:{chunk_number}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class SyncStats:
+    """Define the work done by a `sync_files` run."""
+
+    skipped_files: int = 0
+    indexed_files: int = 0
+    deleted_files: int = 0
+    upserted_chunks: int = 0
+    deleted_chunks: int = 0
+
+
+class IndexManifest:
+    """
+    Define a persistent manifest of indexed files.
+
+    The manifest is keyed by repo name and records the git sha (or package version) it was built
+    from, plus the content hash and chunk ids of every file. Comparing fresh hashes against it tells
+    the indexers which files to skip, which to re-chunk and which to remove.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._data: Dict[str, Any] = {"version": MANIFEST_VERSION, "repos": {}}
+        if self.path.exists():
+            with self.path.open("r", encoding="utf-8") as manifest_file:
+                data = json.load(manifest_file)
+            if data.get("version") == MANIFEST_VERSION:
+                self._data = data
+
+    def save(self) -> None:
+        """Write the manifest atomically, so an interrupted run never leaves it half-written."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp_path.open("w", encoding="utf-8") as manifest_file:
+            json.dump(self._data, manifest_file)
+        os.replace(tmp_path, self.path)
+
+    def _repo(self, repo_name: str) -> Dict[str, Any]:
+        return self._data["repos"].setdefault(repo_name, {"git_sha": None, "files": {}})
+
+    def git_sha(self, repo_name: str) -> Optional[str]:
+        """Get the git sha the repo was last indexed at."""
+        return self._repo(repo_name)["git_sha"]
+
+    def set_git_sha(self, repo_name: str, git_sha: str) -> None:
+        """Record the git sha the repo is indexed at."""
+        self._repo(repo_name)["git_sha"] = git_sha
+
+    def files(self, repo_name: str) -> Dict[str, Dict[str, Any]]:
+        """Get the recorded files of a repo, keyed by repo-relative path."""
+        return self._repo(repo_name)["files"]
+
+    def file_hash(self, repo_name: str, file_key: str) -> Optional[str]:
+        """Get the recorded content hash of a file."""
+        entry = self.files(repo_name).get(file_key)
+        return entry["hash"] if entry else None
+
+    def chunk_ids(self, repo_name: str, file_key: str) -> List[str]:
+        """Get the ids of the chunks indexed for a file."""
+        entry = self.files(repo_name).get(file_key)
+        return list(entry["chunk_ids"]) if entry else []
+
+    def record_file(self, repo_name: str, file_key: str, content_hash: str, chunk_ids: Optional[List[str]] = None) -> None:
+        """Record the content hash and chunk ids of a file."""
+        self.files(repo_name)[file_key] = {"hash": content_hash, "chunk_ids": chunk_ids or []}
+
+    def remove_file(self, repo_name: str, file_key: str) -> List[str]:
+        """Forget a file, returning the ids of its chunks."""
+        entry = self.files(repo_name).pop(file_key, None)
+        return list(entry["chunk_ids"]) if entry else []
+
+
+def _checkpoint(manifest: IndexManifest, lexical_index: Optional[Any]) -> None:
+    # the lexical index is saved first, so the manifest never records chunks it doesn't have
+    if lexical_index is not None and getattr(lexical_index, "path", None) is not None:
+        lexical_index.save()
+    manifest.save()
+
+
+def sync_files(
+    manifest: IndexManifest,
+    repo_name: str,
+    git_sha: str,
+    files: Iterable[Tuple[str, Path, Dict[str, Any]]],
+    split_text: Optional[Callable[[str], List[str]]],
+    index: Any,
+    embeddings: Embeddings,
+    namespace: Optional[str] = None,
+    text_key: str = "text",
+    lexical_index: Optional[Any] = None,
+    loader: Optional["BulkLoader"] = None,
+    split_file: Optional[FileSplitter] = None,
+) -> SyncStats:
+    """
+    Bring a namespace of the vector index in line with a set of files.
+
+    Unchanged files are skipped without being read past their hash, changed files have their old
+    chunks deleted and only their new chunks embedded, and files that disappeared have their chunks
+    deleted. The manifest is checkpointed every `CHECKPOINT_EVERY` re-indexed files, so an interrupted
+    run resumes close to where it stopped.
+
+    Args
+    ----
+        manifest: The manifest recording what is already indexed.
+        repo_name: The name the files are recorded under in the manifest.
+        git_sha: The git sha (or package version) the files come from.
+        files: The (repo-relative key, path, metadata) of every file that should be indexed, the path can
+            be anything with `open("rb")` and `read_text`, e.g. a `WheelMember`.
+        split_text: The function splitting a file's text into chunks, None when `split_file` is given.
+        index: A `pinecone.Index` or `LocalVectorIndex`.
+        embeddings: The embeddings used to embed new chunks.
+        namespace: The namespace of the index to sync.
+        text_key: The metadata key the chunk text is stored under, as the langchain vectorstore expects.
+        lexical_index: A `BM25Index` kept in step with the vector index, so hybrid search sees the same chunks,
+            saved at every manifest checkpoint when it has a path, e.g. from `BM25Index.load(path)`.
+        loader: The `BulkLoader` embedding and upserting the chunks of each file in parallel batches with
+            retries, one over `index` and `embeddings` by default.
+        split_file: Used instead of `split_text` for splitters that need the file key, e.g. to name
+            the module of a source file, its per-chunk metadata is stored with each chunk.
+
+    Returns
+    -------
+        The number of files and chunks touched.
+
+    """
+    # bulk_load imports the metadata keys of this module
+    from llm_cdk_app_agent.search.bulk_load import BulkLoader  # pylint: disable=import-outside-toplevel
+
+    if (split_text is None) == (split_file is None):
+        raise ValueError("Pass exactly one of split_text and split_file")
+    loader = loader or BulkLoader(index, embeddings, text_key=text_key)
+    stats = SyncStats()
+    seen = set()
+    for file_key, path, metadata in files:
+        seen.add(file_key)
+        content_hash = hash_file(path)
+        if manifest.file_hash(repo_name, file_key) == content_hash:
+            stats.skipped_files += 1
+            continue
+        old_ids = manifest.chunk_ids(repo_name, file_key)
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        if split_file is not None:
+            pieces = split_file(text, file_key)
+        else:
+            pieces = [(chunk, {}) for chunk in split_text(text)]  # type: ignore[misc]
+        chunks = [chunk for chunk, _ in pieces]
+        ids = [chunk_id(repo_name, file_key, content_hash, number) for number in range(len(chunks))]
+        # the file key and chunk number let retrieval merge neighbouring chunks back together
+        chunk_metadata = [
+            {**metadata, **piece_metadata, FILE_KEY_METADATA: file_key, CHUNK_NUMBER_METADATA: number}
+            for number, (_, piece_metadata) in enumerate(pieces)
+        ]
+        if chunks:
+            loaded = loader.upsert(zip(ids, chunks, chunk_metadata), namespace=namespace)
+            if loaded.failed_ids:
+                # the file stays unrecorded, so the next run retries it under the same ids
+                _checkpoint(manifest, lexical_index)
+                raise RuntimeError(f"{len(loaded.failed_ids)} chunks of {file_key} failed to upsert")
+            if lexical_index is not None:
+                lexical_index.upsert(zip(ids, chunks, chunk_metadata), namespace=namespace)
+        # new chunks are written before the old ones are removed, so queries never see a gap
+        new_ids = set(ids)
+        stale_ids = [vector_id for vector_id in old_ids if vector_id not in new_ids]
+        if stale_ids:
+            index.delete(ids=stale_ids, namespace=namespace)
+            if lexical_index is not None:
+                lexical_index.delete(stale_ids, namespace=namespace)
+        manifest.record_file(repo_name, file_key, content_hash, ids)
+        stats.indexed_files += 1
+        if stats.indexed_files % CHECKPOINT_EVERY == 0:
+            _checkpoint(manifest, lexical_index)
+        stats.upserted_chunks += len(ids)
+        stats.deleted_chunks += len(stale_ids)
+    for file_key in [file_key for file_key in manifest.files(repo_name) if file_key not in seen]:
+        stale_ids = manifest.remove_file(repo_name, file_key)
+        if stale_ids:
+            index.delete(ids=stale_ids, namespace=namespace)
+            if lexical_index is not None:
+                lexical_index.delete(stale_ids, namespace=namespace)
+        stats.deleted_files += 1
+        stats.deleted_chunks += len(stale_ids)
+    manifest.set_git_sha(repo_name, git_sha)
+    _checkpoint(manifest, lexical_index)
+    return stats
@@ -0,0 +1,649 @@
+"""Define a local, memory-mapped vector index with the same surface as pinecone."""
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+DEFAULT_LOCAL_INDEX_DIR = Path(".cache/vector_indexes")
+DEFAULT_NAMESPACE = ""
+SUPPORTED_METRICS = ("cosine", "dotproduct")
+# the memory-mapped vector file grows by doubling, starting from this many rows
+INITIAL_CAPACITY = 1024
+# vectors with a norm below this are treated as zero vectors when normalizing
+_EPSILON = 1e-12
+# bumped when the on-disk layout changes, older namespaces are migrated when opened
+LOCAL_INDEX_VERSION = 2
+_TOMBSTONE_ITEMSIZE = np.dtype(np.int64).itemsize
+
+Vector = Union[Tuple[str, Sequence[float]], Tuple[str, Sequence[float], Dict[str, Any]], Dict[str, Any]]
+
+
+@dataclass
+class ScoredVector:
+    """Define a single match returned from a query."""
+
+    id: str
+    score: float
+    values: List[float] = field(default_factory=list)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class QueryResponse:
+    """Define the response of a query, mirroring `pinecone.QueryResponse`."""
+
+    matches: List[ScoredVector]
+    namespace: str = DEFAULT_NAMESPACE
+
+
+@dataclass
+class NamespaceSummary:
+    """Define the stats of a single namespace."""
+
+    vector_count: int
+
+
+@dataclass
+class DescribeIndexStatsResponse:
+    """Define the response of `describe_index_stats`, mirroring pinecone."""
+
+    dimension: int
+    total_vector_count: int
+    namespaces: Dict[str, NamespaceSummary]
+
+
+def matches_filter(metadata: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """
+    Check whether metadata satisfies a pinecone-style metadata filter.
+
+    Supports plain equality (`{"module": "aws_lambda"}`) as well as the `$eq`, `$ne`, `$in` and `$nin`
+    operators and `$and`/`$or` combinations.
+    """
+    if not metadata_filter:
+        return True
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+            if operator not in ("$eq", "$ne", "$in", "$nin"):
+                raise ValueError(f"Unsupported filter operator: {operator}")
+    return True
+
+
+def _parse_vector(vector: Vector) -> Tuple[str, Sequence[float], Dict[str, Any]]:
+    """Normalize the tuple and dict forms accepted by `pinecone.Index.upsert`."""
+    if isinstance(vector, dict):
+        return vector["id"], vector["values"], vector.get("metadata") or {}
+    if len(vector) == 2:
+        vector_id, values = vector  # type: ignore[misc]
+        return vector_id, values, {}
+    vector_id, values, metadata = vector  # type: ignore[misc]
+    return vector_id, values, metadata or {}
+
+
+class _NamespaceStore:
+    """
+    Store the vectors of a single namespace.
+
+    Vectors live in a raw float32 file that is memory-mapped, so every process that opens the same
+    index directory shares the same pages through the OS page cache. The id and metadata of every row
+    are appended to a jsonl log and deleted rows to a tombstone file, so a write costs O(batch). A small
+    json state file records how much of both is committed, and other processes only read the new tail.
+    `compact` and `delete(delete_all=True)` start a new generation of the log files.
+    """
+
+    def __init__(self, path: Path, dimension: int, metric: str) -> None:
+        self.path = path
+        self.dimension = dimension
+        self.metric = metric
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._state_path = path / "state.json"
+        self._vectors_path = path / "vectors.f32"
+        self._ivf_path = path / "ivf.npz"
+        # the committed state this handle has read up to
+        self._state: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._ivf: Optional[Dict[str, np.ndarray]] = None
+        self._ivf_mtime: Optional[int] = None
+        self.generation = 0
+        self.count = 0
+        self.capacity = 0
+        self.rows_bytes = 0
+        self.tombstone_count = 0
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.id_to_row: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.refresh()
+
+    def _rows_path(self, generation: int) -> Path:
+        return self.path / f"rows.{generation}.jsonl"
+
+    def _tombstones_path(self, generation: int) -> Path:
+        return self.path / f"tombstones.{generation}.i64"
+
+    @contextmanager
+    def _flock(self) -> Iterator[None]:
+        with open(self.path / ".lock", "a+", encoding="utf-8") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Hold an exclusive, cross-process lock on the namespace while writing."""
+        with self._flock():
+            self.refresh()
+            yield
+
+    def refresh(self) -> None:
+        """Read the rows and tombstones other processes committed since the last refresh."""
+        try:
+            with self._state_path.open("r", encoding="utf-8") as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return
+        if state == self._state:
+            return
+        if state.get("version") != LOCAL_INDEX_VERSION:
+            self._migrate()
+            return
+        try:
+            self._read_tail(state)
+        except FileNotFoundError:
+            # a compaction replaced the generation while it was being read, so read the new one
+            with self._state_path.open("r", encoding="utf-8") as state_file:
+                if json.load(state_file)["generation"] == state["generation"]:
+                    raise
+            self.refresh()
+
+    def _reset(self, generation: int) -> None:
+        self.generation = generation
+        self.count = self.rows_bytes = self.tombstone_count = 0
+        self.ids, self.metadata, self.id_to_row = [], [], {}
+        self.alive = np.zeros(0, dtype=bool)
+
+    def _read_tail(self, state: Dict[str, int]) -> None:
+        if state["generation"] != self.generation:
+            self._reset(state["generation"])
+        if state["rows_bytes"] > self.rows_bytes:
+            with self._rows_path(self.generation).open("rb") as rows_file:
+                rows_file.seek(self.rows_bytes)
+                tail = rows_file.read(state["rows_bytes"] - self.rows_bytes)
+            self._append_rows([tuple(json.loads(line)) for line in tail.splitlines()])
+        if state["tombstones"] > self.tombstone_count:
+            tombstones = np.fromfile(
+                self._tombstones_path(self.generation),
+                dtype=np.int64,
+                count=state["tombstones"] - self.tombstone_count,
+                offset=self.tombstone_count * _TOMBSTONE_ITEMSIZE,
+            )
+            for row in tombstones:
+                self._tombstone_row(int(row))
+        self.rows_bytes = state["rows_bytes"]
+        self.tombstone_count = state["tombstones"]
+        self._state = state
+        if state["capacity"] != self.capacity or self._vectors is None:
+            self.capacity = state["capacity"]
+            self._open_vectors()
+
+    def _migrate(self) -> None:
+        """Rewrite a state file that held every id and metadata into the append-only logs."""
+        with self._flock():
+            # another process may have migrated it while this one waited for the lock
+            with self._state_path.open("r", encoding="utf-8") as state_file:
+                state = json.load(state_file)
+            if state.get("version") != LOCAL_INDEX_VERSION:
+                self.capacity = state["capacity"]
+                self._open_vectors()
+                self._write_generation(self.generation + 1, list(zip(state["ids"], state["metadata"])))
+                return
+        self.refresh()
+
+    def _append_rows(self, rows: List[Tuple[Optional[str], Optional[Dict[str, Any]]]]) -> None:
+        start = len(self.ids)
+        for offset, (vector_id, metadata) in enumerate(rows):
+            self.ids.append(vector_id)
+            self.metadata.append(metadata)
+            if vector_id is not None:
+                self.id_to_row[vector_id] = start + offset
+        self.count = len(self.ids)
+        self.alive = np.concatenate([self.alive, np.array([vector_id is not None for vector_id, _ in rows], dtype=bool)])
+
+    def _tombstone_row(self, row: int) -> None:
+        vector_id = self.ids[row]
+        # the id may already point at the row that replaced this one
+        if vector_id is not None and self.id_to_row.get(vector_id) == row:
+            del self.id_to_row[vector_id]
+        self.ids[row] = None
+        self.metadata[row] = None
+        self.alive[row] = False
+
+    def _tombstone(self, vector_id: str) -> Optional[int]:
+        row = self.id_to_row.get(vector_id)
+        if row is not None:
+            self._tombstone_row(row)
+        return row
+
+    def _open_vectors(self) -> None:
+        if self.capacity == 0:
+            self._vectors = None
+            return
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+
+    def _commit(self, rows: List[Tuple[str, Dict[str, Any]]], tombstones: List[int]) -> None:
+        """Append rows and tombstones to the logs, then publish them with the small state file."""
+        if rows:
+            lines = b"".join(json.dumps([vector_id, metadata]).encode("utf-8") + b"\n" for vector_id, metadata in rows)
+            with self._rows_path(self.generation).open("ab") as rows_file:
+                rows_file.write(lines)
+            self.rows_bytes += len(lines)
+        if tombstones:
+            with self._tombstones_path(self.generation).open("ab") as tombstones_file:
+                np.asarray(tombstones, dtype=np.int64).tofile(tombstones_file)
+            self.tombstone_count += len(tombstones)
+        self._write_state()
+
+    def _write_generation(self, generation: int, rows: List[Tuple[Optional[str], Optional[Dict[str, Any]]]]) -> None:
+        """Start a new generation of the logs holding `rows`, removing the previous one once it's published."""
+        previous = self.generation
+        self._reset(generation)
+        self._rows_path(generation).write_bytes(b"")
+        self._tombstones_path(generation).write_bytes(b"")
+        self._append_rows(rows)
+        self._commit([(vector_id, metadata) for vector_id, metadata in rows], [])  # type: ignore[misc]
+        self._rows_path(previous).unlink(missing_ok=True)
+        self._tombstones_path(previous).unlink(missing_ok=True)
+
+    def _write_state(self) -> None:
+        state = {
+            "version": LOCAL_INDEX_VERSION,
+            "generation": self.generation,
+            "count": self.count,
+            "capacity": self.capacity,
+            "rows_bytes": self.rows_bytes,
+            "tombstones": self.tombstone_count,
+        }
+        tmp_path = self._state_path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as state_file:
+            json.dump(state, state_file)
+        os.replace(tmp_path, self._state_path)
+        self._state = state
+
+    def _ensure_capacity(self, required: int) -> None:
+        if required <= self.capacity:
+            return
+        capacity = max(self.capacity, INITIAL_CAPACITY)
+        while capacity < required:
+            capacity *= 2
+        if self._vectors is not None:
+            self._vectors.flush()
+        # growing the file in place keeps existing rows where they are
+        with open(self._vectors_path, "ab") as vectors_file:
+            vectors_file.truncate(capacity * self.dimension * np.dtype(np.float32).itemsize)
+        self.capacity = capacity
+        self._open_vectors()
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Get the used rows of the memory-mapped vector file."""
+        if self._vectors is None:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return self._vectors[: self.count]
+
+    @property
+    def vector_count(self) -> int:
+        """Get the number of live vectors in the namespace."""
+        return len(self.id_to_row)
+
+    def upsert(self, vectors: Sequence[Vector]) -> int:
+        """Write vectors, replacing existing vectors with the same id, the last copy of an id in the batch wins."""
+        # keyed by id, so a duplicate inside the batch never lands as a second live row
+        by_id = {vector_id: (vector_id, values, metadata) for vector_id, values, metadata in map(_parse_vector, vectors)}
+        parsed = list(by_id.values())
+        if not parsed:
+            return 0
+        values = np.asarray([values for _, values, _ in parsed], dtype=np.float32)
+        if values.ndim != 2 or values.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got shape {values.shape}")
+        if self.metric == "cosine":
+            norms = np.linalg.norm(values, axis=1, keepdims=True)
+            values = values / np.maximum(norms, _EPSILON)
+        with self.lock():
+            # replaced vectors are tombstoned and appended so an existing IVF build never points at stale data
+            replaced = [self._tombstone(vector_id) for vector_id, _, _ in parsed]
+            start = self.count
+            self._ensure_capacity(start + len(parsed))
+            assert self._vectors is not None
+            self._vectors[start : start + len(parsed)] = values
+            self._vectors.flush()
+            rows = [(vector_id, metadata) for vector_id, _, metadata in parsed]
+            self._append_rows(rows)  # type: ignore[arg-type]
+            self._commit(rows, [row for row in replaced if row is not None])
+        return len(parsed)
+
+    def delete(self, ids: Optional[Sequence[str]] = None, delete_all: bool = False) -> None:
+        """Delete vectors by id, or every vector in the namespace."""
+        with self.lock():
+            if delete_all:
+                self._write_generation(self.generation + 1, [])
+                if self._ivf_path.exists():
+                    self._ivf_path.unlink()
+            else:
+                deleted = [self._tombstone(vector_id) for vector_id in ids or []]
+                self._commit([], [row for row in deleted if row is not None])
+
+    def compact(self) -> None:
+        """Rewrite the namespace without tombstoned rows."""
+        with self.lock():
+            rows = np.flatnonzero(self.alive[: self.count])
+            live_vectors = np.array(self.vectors[rows])
+            live_rows = [(self.ids[row], self.metadata[row]) for row in rows]
+            if self._vectors is not None:
+                self._vectors[: len(rows)] = live_vectors
+                self._vectors.flush()
+            if self._ivf_path.exists():
+                self._ivf_path.unlink()
+            self._write_generation(self.generation + 1, live_rows)
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0) -> int:
+        """
+        Cluster the live vectors with k-means to enable approximate (IVF) queries.
+
+        Args
+        ----
+            n_lists: The number of inverted lists, defaults to roughly sqrt(n).
+            iterations: The number of k-means iterations.
+            seed: The seed used to pick the initial centroids.
+
+        Returns
+        -------
+            The number of inverted lists that were built.
+
+        """
+        with self.lock():
+            rows = np.flatnonzero(self.alive[: self.count])
+            if len(rows) == 0:
+                return 0
+            data = np.asarray(self.vectors[rows])
+            n_lists = min(n_lists or max(1, int(np.sqrt(len(rows)))), len(rows))
+            rng = np.random.default_rng(seed)
+            centroids = data[rng.choice(len(rows), size=n_lists, replace=False)].copy()
+            assignments = np.zeros(len(rows), dtype=np.int64)
+            for _ in range(iterations):
+                assignments = np.argmax(data @ centroids.T, axis=1)
+                for list_id in range(n_lists):
+                    members = data[assignments == list_id]
+                    if len(members):
+                        centroids[list_id] = members.mean(axis=0)
+                if self.metric == "cosine":
+                    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), _EPSILON)
+            order = np.argsort(assignments, kind="stable")
+            offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+            np.savez(
+                self._ivf_path,
+                centroids=centroids,
+                rows=rows[order],
+                offsets=offsets,
+                built_count=np.array(self.count),
+            )
+        return n_lists
+
+    def _load_ivf(self) -> Optional[Dict[str, np.ndarray]]:
+        if not self._ivf_path.exists():
+            self._ivf = None
+            return None
+        mtime = self._ivf_path.stat().st_mtime_ns
+        if mtime != self._ivf_mtime:
+            with np.load(self._ivf_path) as ivf:
+                self._ivf = {key: ivf[key] for key in ivf.files}
+            self._ivf_mtime = mtime
+        return self._ivf
+
+    def candidate_rows(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Get the rows to score for an approximate query, falling back to every row."""
+        ivf = self._load_ivf()
+        if ivf is None:
+            return np.arange(self.count)
+        centroid_scores = ivf["centroids"] @ query
+        probe = np.argsort(-centroid_scores)[:n_probe]
+        offsets = ivf["offsets"]
+        rows = [ivf["rows"][offsets[list_id] : offsets[list_id + 1]] for list_id in probe]
+        # rows appended after the build are not clustered yet, so they are always scanned
+        rows.append(np.arange(int(ivf["built_count"]), self.count))
+        return np.concatenate(rows)
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        approximate: bool = False,
+        n_probe: int = 8,
+    ) -> List[Tuple[int, float]]:
+        """Get the (row, score) pairs of the best matching vectors."""
+        self.refresh()
+        if self.count == 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        if self.metric == "cosine":
+            query = query / max(float(np.linalg.norm(query)), _EPSILON)
+        rows = self.candidate_rows(query, n_probe) if approximate else np.arange(self.count)
+        mask = self.alive[rows]
+        if metadata_filter:
+            mask &= np.fromiter(
+                (self.metadata[row] is not None and matches_filter(self.metadata[row], metadata_filter) for row in rows),
+                dtype=bool,
+                count=len(rows),
+            )
+        rows = rows[mask]
+        if len(rows) == 0:
+            return []
+        if not approximate and len(rows) == self.count:
+            # every row survived, in row order, so the whole matrix is scored without a gather
+            scores = self.vectors @ query
+        else:
+            scores = self.vectors[rows] @ query
+        top_k = min(top_k, len(rows))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[position]), float(scores[position])) for position in best]
+
+
+class LocalVectorIndex:
+    """
+    Define a local vector index that mirrors the `pinecone.Index` api.
+
+    Vectors are stored in numpy memory-mapped files, one directory per namespace, so several agent
+    processes can share one index without a network round trip. Queries run an exact, vectorized
+    cosine (or dot product) search by default; call `build_ivf` and pass `approximate=True` to
+    `query` to only scan the closest inverted lists instead.
+    """
+
+    def __init__(self, path: Path, dimension: int, metric: str = "cosine") -> None:
+        if metric not in SUPPORTED_METRICS:
+            raise ValueError(f"Unsupported metric: {metric}")
+        self.path = Path(path)
+        self.dimension = dimension
+        self.metric = metric
+        self._namespaces: Dict[str, _NamespaceStore] = {}
+
+    def _namespace(self, namespace: Optional[str]) -> _NamespaceStore:
+        namespace = namespace or DEFAULT_NAMESPACE
+        store = self._namespaces.get(namespace)
+        if store is None:
+            # the default namespace is stored under a fixed name so it is a valid directory
+            directory = namespace or "__default__"
+            store = _NamespaceStore(self.path / "namespaces" / directory, self.dimension, self.metric)
+            self._namespaces[namespace] = store
+        return store
+
+    def _namespace_names(self) -> List[str]:
+        namespaces_dir = self.path / "namespaces"
+        if not namespaces_dir.exists():
+            return []
+        return ["" if child.name == "__default__" else child.name for child in namespaces_dir.iterdir() if child.is_dir()]
+
+    def upsert(self, vectors: Sequence[Vector], namespace: Optional[str] = None, **kwargs: Any) -> Dict[str, int]:
+        """Write vectors into a namespace, overwriting vectors with the same id."""
+        return {"upserted_count": self._namespace(namespace).upsert(vectors)}
+
+    def query(
+        self,
+        vector: Optional[Sequence[float]] = None,
+        id: Optional[str] = None,  # pylint: disable=redefined-builtin
+        top_k: int = 10,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,  # pylint: disable=redefined-builtin
+        include_values: bool = False,
+        include_metadata: bool = False,
+        approximate: bool = False,
+        n_probe: int = 8,
+        **kwargs: Any,
+    ) -> QueryResponse:
+        """
+        Search a namespace for the vectors most similar to the query vector.
+
+        Args
+        ----
+            vector: The query vector.
+            id: The id of a stored vector to use as the query vector instead.
+            top_k: The number of matches to return.
+            namespace: The namespace to search.
+            filter: A pinecone-style metadata filter.
+            include_values: Whether or not to return the vector values.
+            include_metadata: Whether or not to return the vector metadata.
+            approximate: Whether or not to only scan the closest IVF lists.
+            n_probe: The number of IVF lists to scan for approximate queries.
+
+        Returns
+        -------
+            The matches ordered from most to least similar.
+
+        """
+        store = self._namespace(namespace)
+        store.refresh()
+        if vector is None:
+            if id is None or id not in store.id_to_row:
+                raise ValueError("Either a query vector or the id of a stored vector is required.")
+            vector = store.vectors[store.id_to_row[id]]
+        matches = []
+        for row, score in store.query(vector, top_k, filter, approximate=approximate, n_probe=n_probe):
+            matches.append(
+                ScoredVector(
+                    id=store.ids[row],  # type: ignore[arg-type]
+                    score=score,
+                    values=store.vectors[row].tolist() if include_values else [],
+                    metadata=dict(store.metadata[row] or {}) if include_metadata else {},
+                )
+            )
+        return QueryResponse(matches=matches, namespace=namespace or DEFAULT_NAMESPACE)
+
+    def fetch(self, ids: Sequence[str], namespace: Optional[str] = None) -> Dict[str, ScoredVector]:
+        """Get stored vectors by id."""
+        store = self._namespace(namespace)
+        store.refresh()
+        fetched = {}
+        for vector_id in ids:
+            row = store.id_to_row.get(vector_id)
+            if row is not None:
+                fetched[vector_id] = ScoredVector(
+                    id=vector_id,
+                    score=1.0,
+                    values=store.vectors[row].tolist(),
+                    metadata=dict(store.metadata[row] or {}),
+                )
+        return fetched
+
+    def delete(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        delete_all: bool = False,
+        namespace: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """Delete vectors by id, or every vector in a namespace."""
+        self._namespace(namespace).delete(ids=ids, delete_all=delete_all)
+        return {}
+
+    def describe_index_stats(self, **kwargs: Any) -> DescribeIndexStatsResponse:
+        """Get the number of vectors in each namespace."""
+        namespaces = {}
+        for name in self._namespace_names():
+            store = self._namespace(name)
+            store.refresh()
+            namespaces[name] = NamespaceSummary(vector_count=store.vector_count)
+        return DescribeIndexStatsResponse(
+            dimension=self.dimension,
+            total_vector_count=sum(summary.vector_count for summary in namespaces.values()),
+            namespaces=namespaces,
+        )
+
+    def build_ivf(self, namespace: Optional[str] = None, n_lists: Optional[int] = None, iterations: int = 10) -> int:
+        """Build the inverted lists used by approximate queries for a namespace."""
+        return self._namespace(namespace).build_ivf(n_lists=n_lists, iterations=iterations)
+
+    def compact(self, namespace: Optional[str] = None) -> None:
+        """Reclaim the space of deleted and overwritten vectors in a namespace."""
+        self._namespace(namespace).compact()
+
+
+class LocalIndexManager:
+    "Managing local vector index configurations, mirroring `PineconeManager`."
+
+    def __init__(self, index_name="llm-cdk-agent", root_dir: Union[str, Path] = DEFAULT_LOCAL_INDEX_DIR):
+        self.index_name = index_name
+        self.root_dir = Path(root_dir)
+
+    def list_indexes(self) -> List[str]:
+        "Getting all indexes and returns as a list."
+        if not self.root_dir.exists():
+            return []
+        return sorted(child.name for child in self.root_dir.iterdir() if (child / "index.json").exists())
+
+    def create_or_get_index(self, dimension=1536, metric="cosine") -> LocalVectorIndex:
+        "Creation of our vector database index!"
+        index_path = self.root_dir / self.index_name
+        config_path = index_path / "index.json"
+        if self.index_name not in self.list_indexes():
+            index_path.mkdir(parents=True, exist_ok=True)
+            with config_path.open("w", encoding="utf-8") as config_file:
+                json.dump({"dimension": dimension, "metric": metric}, config_file)
+            print(f"created a new index {self.index_name}")
+            return LocalVectorIndex(index_path, dimension=dimension, metric=metric)
+        print(f"{self.index_name} index existed. Skip creating.")
+        with config_path.open("r", encoding="utf-8") as config_file:
+            config = json.load(config_file)
+        index = LocalVectorIndex(index_path, dimension=config["dimension"], metric=config["metric"])
+        print(f"total_vector_count is {index.describe_index_stats().total_vector_count}")
+        return index
+
+    def delete_index(self) -> None:
+        "Delete the index and all of its namespaces."
+        shutil.rmtree(self.root_dir / self.index_name, ignore_errors=True)
@@ -0,0 +1,254 @@
+"""Define a local BM25 inverted index over the chunks the indexers produce."""
+import math
+import pickle
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from llm_cdk_app_agent.search.local_index import DEFAULT_NAMESPACE, matches_filter
+
+
+# the standard BM25 saturation and length normalization parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+INDEX_VERSION = 1
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+# splits camelCase and snake_case identifiers into their words, e.g. EventSourceMapping
+_SUBWORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+LexicalItem = Tuple[str, str, Dict[str, Any]]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms, keeping whole identifiers next to their words.
+
+    `EventSourceMapping` becomes `eventsourcemapping`, `event`, `source` and `mapping`, so an exact
+    identifier match scores far above chunks that only share its words.
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        lowered = word.lower()
+        terms.append(lowered)
+        parts = _SUBWORD.findall(word)
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts)
+    return terms
+
+
+@dataclass
+class LexicalMatch:
+    """Define a single BM25 match."""
+
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class BM25Index:
+    """
+    Define an in-memory BM25 index with namespaces and pinecone-style metadata filters.
+
+    Postings are kept per term as {doc: term frequency} so chunks can be added and removed as the
+    indexers sync, and each term is compiled to numpy arrays the first time a query needs it. A query
+    then scores every matching doc with a few vector ops into a dense score array, so search time
+    depends on the postings of the query terms rather than the corpus size. An index with a `path`,
+    e.g. one from `load`, is saved there by `save()`, which is how `sync_files` checkpoints it.
+    """
+
+    def __init__(
+        self, k1: float = BM25_K1, b: float = BM25_B, text_key: str = "text", path: Optional[Union[str, Path]] = None
+    ) -> None:
+        self.path = Path(path) if path is not None else None
+        self.k1 = k1
+        self.b = b
+        self.text_key = text_key
+        self._doc_ids: List[Optional[Tuple[str, str]]] = []
+        self._doc_metadata: List[Optional[Dict[str, Any]]] = []
+        self._doc_namespaces: List[int] = []
+        self._doc_lengths: List[int] = []
+        self._keys: Dict[Tuple[str, str], int] = {}
+        self._namespaces: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._compiled: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._total_length = 0
+        self._live_docs = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._live_docs
+
+    def _namespace_code(self, namespace: Optional[str]) -> int:
+        namespace = namespace or DEFAULT_NAMESPACE
+        if namespace not in self._namespaces:
+            self._namespaces[namespace] = len(self._namespaces)
+        return self._namespaces[namespace]
+
+    def upsert(self, items: Iterable[LexicalItem], namespace: Optional[str] = None) -> int:
+        """
+        Index (id, text, metadata) items, replacing items with the same id in the namespace.
+
+        The metadata is returned with every match, with the text stored under `text_key` as in the
+        vector index.
+        """
+        count = 0
+        with self._lock:
+            code = self._namespace_code(namespace)
+            for item_id, text, metadata in items:
+                key = (namespace or DEFAULT_NAMESPACE, item_id)
+                if key in self._keys:
+                    self._remove(self._keys[key])
+                terms = Counter(tokenize(text))
+                doc = len(self._doc_ids)
+                self._keys[key] = doc
+                self._doc_ids.append(key)
+                self._doc_metadata.append({**metadata, self.text_key: text})
+                self._doc_namespaces.append(code)
+                length = sum(terms.values())
+                self._doc_lengths.append(length)
+                self._total_length += length
+                self._live_docs += 1
+                for term, frequency in terms.items():
+                    self._postings.setdefault(term, {})[doc] = frequency
+                    self._compiled.pop(term, None)
+                count += 1
+            self._arrays = None
+        return count
+
+    def _remove(self, doc: int) -> None:
+        metadata = self._doc_metadata[doc]
+        key = self._doc_ids[doc]
+        for term in set(tokenize(metadata[self.text_key])):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc, None)
+                if not postings:
+                    del self._postings[term]
+                self._compiled.pop(term, None)
+        self._total_length -= self._doc_lengths[doc]
+        self._live_docs -= 1
+        self._doc_ids[doc] = None
+        self._doc_metadata[doc] = None
+        del self._keys[key]
+
+    def delete(self, ids: Sequence[str], namespace: Optional[str] = None) -> int:
+        """Remove items from a namespace, returning how many were found."""
+        removed = 0
+        with self._lock:
+            for item_id in ids:
+                doc = self._keys.get((namespace or DEFAULT_NAMESPACE, item_id))
+                if doc is not None:
+                    self._remove(doc)
+                    removed += 1
+            self._arrays = None
+        return removed
+
+    def _doc_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._arrays is None:
+            self._arrays = (
+                np.asarray(self._doc_lengths, dtype=np.float32),
+                np.asarray(self._doc_namespaces, dtype=np.int32),
+                np.zeros(len(self._doc_ids), dtype=np.float32),
+            )
+        return self._arrays
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            docs = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            frequencies = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            compiled = self._compiled[term] = (docs, frequencies)
+        return compiled
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,  # pylint: disable=redefined-builtin
+    ) -> List[LexicalMatch]:
+        """
+        Get the items that best match the query terms.
+
+        Args
+        ----
+            query: The query text.
+            top_k: The number of matches to return.
+            namespace: Only search this namespace, all namespaces are searched when None.
+            filter: A pinecone-style metadata filter, e.g. {"module": "aws_cdk.aws_lambda"}.
+
+        Returns
+        -------
+            The matches ordered from best to worst.
+
+        """
+        with self._lock:
+            if not self._live_docs:
+                return []
+            lengths, namespaces, scores = self._doc_arrays()
+            scores.fill(0.0)
+            average_length = self._total_length / self._live_docs
+            touched = []
+            for term in set(tokenize(query)):
+                postings = self._term_postings(term)
+                if postings is None:
+                    continue
+                docs, frequencies = postings
+                idf = math.log(1 + (self._live_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                norms = self.k1 * (1 - self.b + self.b * lengths[docs] / average_length)
+                scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + norms)
+                touched.append(docs)
+            if not touched:
+                return []
+            candidates = np.unique(np.concatenate(touched))
+            if namespace is not None:
+                code = self._namespaces.get(namespace)
+                if code is None:
+                    return []
+                candidates = candidates[namespaces[candidates] == code]
+            candidate_scores = scores[candidates]
+            order = candidates[np.argsort(-candidate_scores, kind="stable")]
+            matches = []
+            for doc in order:
+                metadata = self._doc_metadata[doc]
+                if filter and not matches_filter(metadata, filter):
+                    continue
+                matches.append(LexicalMatch(id=self._doc_ids[doc][1], score=float(scores[doc]), metadata=dict(metadata)))
+                if len(matches) == top_k:
+                    break
+            return matches
+
+    def save(self, path: Optional[Union[str, Path]] = None) -> None:
+        """Write the index to disk atomically, at the index's own path by default."""
+        if path is None and self.path is None:
+            raise ValueError("The index has no path to be saved to.")
+        path = Path(path) if path is not None else self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with self._lock:
+            state = {key: value for key, value in self.__dict__.items() if key not in ("path", "_lock", "_compiled", "_arrays")}
+            with tmp_path.open("wb") as index_file:
+                pickle.dump({"version": INDEX_VERSION, "state": state}, index_file, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "BM25Index":
+        """Read an index written by `save`, or return an empty one if it's missing or outdated, saved back to `path`."""
+        path = Path(path)
+        index = cls(path=path)
+        if not path.exists():
+            return index
+        with path.open("rb") as index_file:
+            data = pickle.load(index_file)
+        if data.get("version") == INDEX_VERSION:
+            index.__dict__.update(data["state"])
+        return index
@@ -0,0 +1,182 @@
+"""Fuse BM25 and vector search results with reciprocal rank fusion."""
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+
+from llm_cdk_app_agent.search.local_index import DEFAULT_NAMESPACE
+from llm_cdk_app_agent.search.retrieval.bm25 import BM25Index
+from llm_cdk_app_agent.tracing import current_span, traced
+
+
+# the rank constant of reciprocal rank fusion, 60 is the value from the original paper
+RRF_K = 60
+# how many candidates each retriever contributes before fusion
+DEFAULT_CANDIDATES = 50
+
+
+@dataclass
+class RetrievedChunk:
+    """Define a chunk returned by hybrid retrieval."""
+
+    id: str
+    score: float
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    # the 1-based rank of the chunk in each retriever, None if that retriever didn't return it
+    lexical_rank: Optional[int] = None
+    vector_rank: Optional[int] = None
+    # the embedding of the chunk, when the vector index returned it
+    values: Optional[List[float]] = None
+
+    def to_document(self) -> Document:
+        """Get the chunk as a langchain document."""
+        return Document(page_content=self.text, metadata={**self.metadata, "id": self.id, "score": self.score})
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = RRF_K, weights: Optional[Sequence[float]] = None
+) -> List[Tuple[str, float]]:
+    """
+    Merge several rankings into one, scoring each id by the sum of weight / (k + rank).
+
+    Args
+    ----
+        rankings: Lists of ids, each ordered from best to worst.
+        k: The rank constant, larger values flatten the advantage of the top ranks.
+        weights: A weight per ranking, all 1 by default.
+
+    Returns
+    -------
+        The (id, fused score) pairs ordered from best to worst.
+
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever:
+    """
+    Retrieve chunks with BM25 and vector search, fused with reciprocal rank fusion.
+
+    BM25 finds exact CDK identifiers like `EventSourceMapping` that embeddings blur, vector search
+    finds paraphrases, and fusing ranks rather than scores avoids calibrating the two against each
+    other. The lexical search runs on a worker thread while the query is being embedded, `close` the
+    retriever or use it as a context manager to stop that thread.
+
+    Example
+    -------
+        with HybridRetriever(BM25Index.load(path), index, get_embeddings()) as retriever:
+            chunks = retriever.search("lambda function url with auth", namespace="cdk-docs")
+
+    """
+
+    def __init__(
+        self,
+        lexical_index: BM25Index,
+        vector_index: Any,
+        embeddings: Embeddings,
+        text_key: str = "text",
+        candidates: int = DEFAULT_CANDIDATES,
+        rrf_k: int = RRF_K,
+        lexical_weight: float = 1.0,
+        vector_weight: float = 1.0,
+    ) -> None:
+        self.lexical_index = lexical_index
+        self.vector_index = vector_index
+        self.embeddings = embeddings
+        self.text_key = text_key
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.lexical_weight = lexical_weight
+        self.vector_weight = vector_weight
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lexical")
+
+    def _vector_search(
+        self, query: str, namespace: Optional[str], metadata_filter: Optional[Dict[str, Any]], include_values: bool
+    ) -> List[Any]:
+        vector = self.embeddings.embed_query(query)
+        response = self.vector_index.query(
+            vector=vector,
+            top_k=self.candidates,
+            namespace=namespace,
+            filter=metadata_filter,
+            include_metadata=True,
+            include_values=include_values,
+        )
+        return list(response.matches)
+
+    @traced("retrieval.search", "namespace", "top_k")
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        namespace: Optional[str] = None,
+        filter: Optional[Dict[str, Any]] = None,  # pylint: disable=redefined-builtin
+        include_values: bool = False,
+    ) -> List[RetrievedChunk]:
+        """
+        Get the chunks that best match a query.
+
+        Args
+        ----
+            query: The query text.
+            top_k: The number of chunks to return.
+            namespace: The namespace to search on both indexes, e.g. "cdk-docs", the default namespace when None.
+            filter: A pinecone-style metadata filter, e.g. {"github_url": {"$in": [...]}} or {"module": "aws_cdk.aws_s3"}.
+            include_values: Whether or not to return the chunk embeddings, e.g. for MMR reranking.
+
+        Returns
+        -------
+            The fused chunks ordered from best to worst.
+
+        """
+        # BM25 searches every namespace for None, the vector index only the default one
+        namespace = namespace or DEFAULT_NAMESPACE
+        lexical_future = self._executor.submit(self.lexical_index.search, query, self.candidates, namespace, filter)
+        vector_matches = self._vector_search(query, namespace, filter, include_values)
+        lexical_matches = lexical_future.result()
+
+        chunks: Dict[str, RetrievedChunk] = {}
+        for rank, match in enumerate(lexical_matches, start=1):
+            metadata = dict(match.metadata)
+            text = metadata.pop(self.text_key, "")
+            chunks[match.id] = RetrievedChunk(id=match.id, score=0.0, text=text, metadata=metadata, lexical_rank=rank)
+        for rank, match in enumerate(vector_matches, start=1):
+            chunk = chunks.get(match.id)
+            if chunk is None:
+                metadata = dict(match.metadata or {})
+                text = metadata.pop(self.text_key, "")
+                chunk = chunks[match.id] = RetrievedChunk(id=match.id, score=0.0, text=text, metadata=metadata)
+            chunk.vector_rank = rank
+            if include_values and match.values:
+                chunk.values = list(match.values)
+
+        fused = reciprocal_rank_fusion(
+            [[match.id for match in lexical_matches], [match.id for match in vector_matches]],
+            k=self.rrf_k,
+            weights=[self.lexical_weight, self.vector_weight],
+        )
+        results = []
+        for chunk_id, score in fused[:top_k]:
+            chunk = chunks[chunk_id]
+            chunk.score = score
+            results.append(chunk)
+        current_span().set_attributes(lexical_matches=len(lexical_matches), vector_matches=len(vector_matches), chunks=len(results))
+        return results
+
+    def close(self) -> None:
+        """Wait for a running lexical search and stop the worker thread."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "HybridRetriever":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
@@ -0,0 +1,191 @@
+"""Diversify retrieved chunks with MMR, merge neighbouring chunks and pack them into a token budget."""
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+from llm_cdk_app_agent.search.indexer.manifest import CHUNK_NUMBER_METADATA, FILE_KEY_METADATA
+from llm_cdk_app_agent.search.retrieval.hybrid import RetrievedChunk
+from llm_cdk_app_agent.tracing import current_span, traced
+
+
+# 0 picks purely for diversity, 1 purely for relevance
+DEFAULT_MMR_LAMBDA = 0.5
+# a rough chars-per-token ratio, used when no tokenizer is passed
+CHARS_PER_TOKEN = 4
+# shorter common affixes are likely coincidence rather than the splitter's overlap
+MIN_OVERLAP_CHARS = 8
+_EPSILON = 1e-12
+
+TokenCounter = Callable[[str], int]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, _EPSILON)
+
+
+def mmr_select(
+    query_vector: Sequence[float],
+    candidate_vectors: np.ndarray,
+    k: int,
+    lambda_mult: float = DEFAULT_MMR_LAMBDA,
+) -> List[int]:
+    """
+    Pick `k` candidates by maximal marginal relevance.
+
+    The query and pairwise cosine similarities are computed with two matrix products up front. Each
+    step then only updates every candidate's similarity to its closest picked candidate with a
+    vectorized maximum, so selection is O(k * n) after the O(n^2 * d) similarity matrix.
+
+    Args
+    ----
+        query_vector: The query embedding.
+        candidate_vectors: The candidate embeddings, one per row.
+        k: The number of candidates to pick.
+        lambda_mult: The trade-off between relevance to the query and diversity.
+
+    Returns
+    -------
+        The row indexes of the picked candidates, in the order they were picked.
+
+    """
+    vectors = _normalize(np.asarray(candidate_vectors, dtype=np.float32))
+    if not len(vectors) or k <= 0:
+        return []
+    query = _normalize(np.asarray(query_vector, dtype=np.float32))
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    redundancy = np.full(len(vectors), -np.inf, dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    picked: List[int] = []
+    for _ in range(min(k, len(vectors))):
+        # nothing is redundant before the first pick, so it is the most relevant candidate
+        penalty = np.where(np.isneginf(redundancy), 0.0, redundancy)
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * penalty, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Join two neighbouring chunks, dropping the text the splitter repeated at the start of the second."""
+    for size in range(min(len(first), len(second)), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    separator = "" if first.endswith("\n") or not first else "\n"
+    return first + separator + second
+
+
+def merge_adjacent(chunks: Sequence[RetrievedChunk]) -> List[RetrievedChunk]:
+    """
+    Merge chunks that sit next to each other in the same file into one chunk.
+
+    Chunks are grouped by the file key and chunk number recorded by the indexers, chunks without them
+    are kept as they are. A merged chunk keeps the best score and takes the place of its best ranked part.
+    """
+    by_file: Dict[str, List[Tuple[int, int, RetrievedChunk]]] = {}
+    for position, chunk in enumerate(chunks):
+        file_key = chunk.metadata.get(FILE_KEY_METADATA)
+        number = chunk.metadata.get(CHUNK_NUMBER_METADATA)
+        if file_key is not None and number is not None:
+            by_file.setdefault(file_key, []).append((int(number), position, chunk))
+
+    merged_at: Dict[int, RetrievedChunk] = {}
+    absorbed = set()
+    for parts in by_file.values():
+        parts.sort(key=lambda part: part[0])
+        run = [parts[0]]
+        for part in parts[1:] + [None]:
+            if part is not None and part[0] == run[-1][0] + 1:
+                run.append(part)
+                continue
+            if len(run) > 1:
+                text = run[0][2].text
+                for _, _, chunk in run[1:]:
+                    text = _join_overlapping(text, chunk.text)
+                first_position = min(position for _, position, _ in run)
+                best = max((chunk for _, _, chunk in run), key=lambda chunk: chunk.score)
+                merged_at[first_position] = replace(
+                    best,
+                    id="+".join(chunk.id for _, _, chunk in run),
+                    text=text,
+                    metadata={**run[0][2].metadata, "merged_chunks": len(run)},
+                    values=None,
+                )
+                absorbed.update(position for _, position, _ in run)
+            run = [part] if part is not None else run
+    return [
+        merged_at[position] if position in merged_at else chunk
+        for position, chunk in enumerate(chunks)
+        if position in merged_at or position not in absorbed
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the tokens of a text without a tokenizer."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def pack_to_budget(
+    chunks: Sequence[RetrievedChunk], max_tokens: int, count_tokens: TokenCounter = estimate_tokens
+) -> List[RetrievedChunk]:
+    """Keep chunks in rank order while they fit the token budget, skipping ones too large for what's left."""
+    packed = []
+    remaining = max_tokens
+    for chunk in chunks:
+        tokens = count_tokens(chunk.text)
+        if tokens <= remaining:
+            packed.append(chunk)
+            remaining -= tokens
+    return packed
+
+
+@traced("retrieval.rerank", "max_tokens")
+def rerank(
+    query: str,
+    chunks: Sequence[RetrievedChunk],
+    embeddings: Embeddings,
+    max_tokens: int,
+    k: Optional[int] = None,
+    lambda_mult: float = DEFAULT_MMR_LAMBDA,
+    count_tokens: TokenCounter = estimate_tokens,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[RetrievedChunk]:
+    """
+    Turn a pool of retrieved chunks into a diverse, non-redundant context that fits a token budget.
+
+    Args
+    ----
+        query: The query the chunks were retrieved for.
+        chunks: The candidate pool, e.g. from `HybridRetriever.search(..., include_values=True)`.
+        embeddings: Used to embed the query and any chunk without values, e.g. lexical-only matches.
+        max_tokens: The token budget of the packed context.
+        k: How many chunks MMR picks before merging, the whole pool by default.
+        lambda_mult: The MMR trade-off between relevance and diversity.
+        count_tokens: Counts the tokens of a text, e.g. `lambda text: len(get_token_encoder(model)(text))`.
+        query_vector: The query embedding, if the caller already has it.
+
+    Returns
+    -------
+        The picked chunks, with neighbours merged, in MMR order and within the budget.
+
+    """
+    if not chunks:
+        return []
+    missing = [index for index, chunk in enumerate(chunks) if not chunk.values]
+    if missing:
+        fresh = embeddings.embed_documents([chunks[index].text for index in missing])
+        fresh_by_index = dict(zip(missing, fresh))
+        vectors = np.asarray([fresh_by_index.get(index) or chunk.values for index, chunk in enumerate(chunks)], dtype=np.float32)
+    else:
+        vectors = np.asarray([chunk.values for chunk in chunks], dtype=np.float32)
+    if query_vector is None:
+        query_vector = embeddings.embed_query(query)
+    picked = [chunks[index] for index in mmr_select(query_vector, vectors, k or len(chunks), lambda_mult)]
+    packed = pack_to_budget(merge_adjacent(picked), max_tokens, count_tokens)
+    current_span().set_attributes(candidates=len(chunks), embedded=len(missing), picked=len(picked), chunks=len(packed))
+    return packed
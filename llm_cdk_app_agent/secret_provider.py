@@ -0,0 +1,122 @@
+"""Fetch secrets lazily, with an in-process TTL cache and swappable providers."""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Protocol, Tuple
+
+
+DEFAULT_AWS_REGION = "us-east-1"
+# how long a fetched secret is reused before it is fetched again
+DEFAULT_SECRET_TTL_SECONDS = 15 * 60
+# "aws" fetches from secrets manager, "local" reads LOCAL_SECRET_<NAME> environment variables
+SECRET_PROVIDER_ENV_VAR = "SECRET_PROVIDER"
+LOCAL_SECRET_ENV_PREFIX = "LOCAL_SECRET_"
+
+
+class SecretProvider(Protocol):
+    """Define the interface of a secret provider."""
+
+    def get_secret(self, name: str) -> str:
+        """Get the value of a secret."""
+
+
+class AwsSecretProvider:
+    """Fetch secrets from AWS secrets manager, importing the AWS client on first use."""
+
+    def __init__(self, region: str = DEFAULT_AWS_REGION) -> None:
+        self.region = region
+        self._client: Optional[Any] = None
+
+    def get_secret(self, name: str) -> str:
+        """Get the value of a secret from secrets manager."""
+        if self._client is None:
+            # importing powertools pulls in boto3, which is slow, so it's deferred until a secret is needed
+            import boto3  # pylint: disable=import-outside-toplevel
+            from aws_lambda_powertools.utilities import parameters  # pylint: disable=import-outside-toplevel
+
+            self._client = parameters.SecretsProvider(boto3_session=boto3.session.Session(region_name=self.region))
+        return str(self._client.get(name))
+
+
+class LocalSecretProvider:
+    """
+    Serve secrets from memory or the environment, as a stand-in for AWS in tests and offline runs.
+
+    A secret named `openai` is looked up in the `secrets` passed in, then in the
+    `LOCAL_SECRET_OPENAI` environment variable.
+    """
+
+    def __init__(self, secrets: Optional[Dict[str, str]] = None) -> None:
+        self.secrets = dict(secrets or {})
+
+    def get_secret(self, name: str) -> str:
+        """Get the value of a secret."""
+        if name in self.secrets:
+            return self.secrets[name]
+        env_var = LOCAL_SECRET_ENV_PREFIX + name.upper().replace("-", "_")
+        if env_var in os.environ:
+            return os.environ[env_var]
+        raise KeyError(f"Secret {name} is not set, set the {env_var} environment variable.")
+
+
+class CachedSecretProvider:
+    """Wrap a secret provider so each secret is fetched at most once per TTL."""
+
+    def __init__(self, provider: SecretProvider, ttl_seconds: float = DEFAULT_SECRET_TTL_SECONDS) -> None:
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self._cache: Dict[str, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def get_secret(self, name: str) -> str:
+        """Get the value of a secret, fetching it if it's missing or expired."""
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl_seconds:
+                return cached[1]
+            value = self.provider.get_secret(name)
+            self._cache[name] = (time.monotonic(), value)
+            return value
+
+    def clear(self) -> None:
+        """Forget every cached secret."""
+        with self._lock:
+            self._cache.clear()
+
+
+_provider: Optional[CachedSecretProvider] = None
+_provider_lock = threading.Lock()
+
+
+def _default_provider() -> SecretProvider:
+    if os.environ.get(SECRET_PROVIDER_ENV_VAR, "aws") == "local":
+        return LocalSecretProvider()
+    return AwsSecretProvider(region=os.environ.get("AWS_DEFAULT_REGION", DEFAULT_AWS_REGION))
+
+
+def set_secret_provider(provider: SecretProvider, ttl_seconds: float = DEFAULT_SECRET_TTL_SECONDS) -> None:
+    """Replace the provider used by `get_secret`, dropping any cached secrets."""
+    global _provider  # pylint: disable=global-statement
+    with _provider_lock:
+        _provider = CachedSecretProvider(provider, ttl_seconds=ttl_seconds)
+
+
+def get_secret(name: str) -> str:
+    """
+    Get the value of a secret, fetching it on first use.
+
+    Args
+    ----
+        name: The name of the secret.
+
+    Returns
+    -------
+        The secret value, served from the in-process cache until the TTL expires.
+
+    """
+    global _provider  # pylint: disable=global-statement
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = CachedSecretProvider(_default_provider())
+    return _provider.get_secret(name)
@@ -0,0 +1,409 @@
+"""
+Define timed spans around the agent loop, exported to a JSONL file or an OpenTelemetry tracer.
+
+Tracing is off unless exporters are configured, either with `configure` or the AGENT_TRACING
+environment variable. While it is off every span is a shared no-op object, so instrumented code pays
+a function call and an attribute check per span.
+
+Example
+-------
+    configure(JsonlExporter(".cache/traces/spans.jsonl"))
+    with span("retrieval.search", namespace="cdk-docs") as current:
+        chunks = retriever.search(query)
+        current.set_attribute("chunks", len(chunks))
+
+"""
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional, Sequence, TypeVar, Union
+
+
+# "jsonl" writes spans to AGENT_TRACE_PATH, "otel" hands them to the global OpenTelemetry tracer provider
+TRACING_BACKEND = os.environ.get("AGENT_TRACING", "")
+TRACE_PATH = os.environ.get("AGENT_TRACE_PATH", ".cache/traces/spans.jsonl")
+OTEL_INSTRUMENTATION_NAME = "llm_cdk_app_agent"
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+Func = TypeVar("Func", bound=Callable[..., Any])
+AttributeValue = Union[str, int, float, bool, None]
+
+
+class Span:
+    """
+    Define a timed operation, with attributes like the model name, token counts or exit code.
+
+    A span used as a context manager becomes the parent of the spans opened inside it, and records
+    any exception that escapes it. Spans started with `Tracer.start_span` must be ended explicitly.
+    """
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_time_ns",
+        "end_time_ns",
+        "attributes",
+        "status",
+        "error",
+        "_start_counter_ns",
+        "_token",
+    )
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.error: Optional[str] = None
+        self.end_time_ns: Optional[int] = None
+        self._token: Any = None
+        # wall clock for exporting, monotonic clock for the duration
+        self.start_time_ns = time.time_ns()
+        self._start_counter_ns = time.perf_counter_ns()
+
+    @property
+    def duration_seconds(self) -> float:
+        """Get the duration of the span, so far if it hasn't ended."""
+        end = self.end_time_ns if self.end_time_ns is not None else self.start_time_ns + time.perf_counter_ns() - self._start_counter_ns
+        return (end - self.start_time_ns) / 1e9
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        """Set an attribute of the span."""
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: AttributeValue) -> None:
+        """Set several attributes of the span."""
+        self.attributes.update(attributes)
+
+    def record_error(self, error: BaseException) -> None:
+        """Mark the span as failed by an exception."""
+        self.status = STATUS_ERROR
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        """End the span and export it, ending it again does nothing."""
+        if self.end_time_ns is not None:
+            return
+        self.end_time_ns = self.start_time_ns + time.perf_counter_ns() - self._start_counter_ns
+        self.tracer._export_end(self)  # pylint: disable=protected-access
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the span as a JSON-serializable dict."""
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time_ns": self.start_time_ns,
+            "end_time_ns": self.end_time_ns,
+            "duration_ms": round(self.duration_seconds * 1000, 3),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def __enter__(self) -> "Span":
+        self._token = _CURRENT_SPAN.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_value is not None:
+            self.record_error(exc_value)
+        _CURRENT_SPAN.reset(self._token)
+        self.end()
+
+
+class _NoopSpan:
+    """Define the span handed out while tracing is off, every method does nothing."""
+
+    __slots__ = ()
+    recording = False
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        pass
+
+    def set_attributes(self, **attributes: AttributeValue) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_CURRENT_SPAN: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class SpanExporter:
+    """Define the interface of span exporters, `on_start` is optional and `on_end` gets every finished span."""
+
+    def on_start(self, span: Span) -> None:
+        """Handle a span that just started."""
+
+    def on_end(self, span: Span) -> None:
+        """Handle a span that just ended."""
+
+    def close(self) -> None:
+        """Release the exporter's resources."""
+
+
+class JsonlExporter(SpanExporter):
+    """Append every finished span to a JSONL file as one line, the file is opened on the first span."""
+
+    def __init__(self, path: Union[str, Path] = TRACE_PATH) -> None:
+        self.path = Path(path)
+        self._file: Optional[IO[str]] = None
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # line buffered, so an interrupted run keeps every finished span
+                self._file = self.path.open("a", encoding="utf-8", buffering=1)
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class OpenTelemetryExporter(SpanExporter):
+    """
+    Mirror spans into OpenTelemetry, so any OTLP collector or vendor SDK configured on the tracer provider receives them.
+
+    The `opentelemetry-api` package is only imported when the exporter is built.
+    """
+
+    def __init__(self, tracer_provider: Any = None) -> None:
+        # pylint: disable=import-outside-toplevel
+        from opentelemetry import trace as otel_trace
+
+        self._trace = otel_trace
+        self._tracer = otel_trace.get_tracer(OTEL_INSTRUMENTATION_NAME, tracer_provider=tracer_provider)
+        self._spans: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span) -> None:
+        with self._lock:
+            parent = self._spans.get(span.parent_id) if span.parent_id else None
+        context = self._trace.set_span_in_context(parent) if parent is not None else None
+        otel_span = self._tracer.start_span(span.name, context=context, start_time=span.start_time_ns)
+        with self._lock:
+            self._spans[span.span_id] = otel_span
+
+    def on_end(self, span: Span) -> None:
+        with self._lock:
+            otel_span = self._spans.pop(span.span_id, None)
+        if otel_span is None:
+            return
+        # OpenTelemetry rejects None attribute values
+        otel_span.set_attributes({key: value for key, value in span.attributes.items() if value is not None})
+        if span.status == STATUS_ERROR:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=span.end_time_ns)
+
+
+@dataclass
+class SpanStats:
+    """Define the aggregated timings of the spans sharing a name."""
+
+    count: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        """Get the mean duration of the spans."""
+        return self.total_seconds / self.count if self.count else 0.0
+
+
+class SpanMetrics(SpanExporter):
+    """Aggregate the count, errors and durations of finished spans by name."""
+
+    def __init__(self) -> None:
+        self._stats: Dict[str, SpanStats] = {}
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        seconds = span.duration_seconds
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = SpanStats()
+            stats.count += 1
+            stats.errors += span.status == STATUS_ERROR
+            stats.total_seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+
+    def snapshot(self) -> Dict[str, SpanStats]:
+        """Get a copy of the stats of every span name."""
+        with self._lock:
+            return {name: SpanStats(**vars(stats)) for name, stats in self._stats.items()}
+
+    def summary(self) -> str:
+        """Get one line per span name, slowest in total first."""
+        stats = sorted(self.snapshot().items(), key=lambda item: item[1].total_seconds, reverse=True)
+        return "\n".join(
+            f"{name}: {item.count} spans, {item.total_seconds:.3f}s total, {item.mean_seconds * 1000:.1f}ms mean, "
+            f"{item.max_seconds * 1000:.1f}ms max, {item.errors} errors"
+            for name, item in stats
+        )
+
+
+class Tracer:
+    """
+    Define the factory of spans, handing every started and ended span to its exporters.
+
+    A tracer without exporters is disabled and only hands out `NOOP_SPAN`.
+    """
+
+    def __init__(self, exporters: Sequence[SpanExporter] = ()) -> None:
+        self.exporters: List[SpanExporter] = list(exporters)
+        self.enabled = bool(self.exporters)
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: AttributeValue) -> Union[Span, _NoopSpan]:
+        """Start a span that is ended explicitly, its parent defaults to the current span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        span = Span(self, name, parent if parent is not None else _CURRENT_SPAN.get(), attributes)
+        for exporter in self.exporters:
+            exporter.on_start(span)
+        return span
+
+    def span(self, name: str, **attributes: AttributeValue) -> Union[Span, _NoopSpan]:
+        """Get a span to use as a context manager, it becomes the current span inside the block."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return self.start_span(name, **attributes)
+
+    def _export_end(self, span: Span) -> None:
+        for exporter in self.exporters:
+            exporter.on_end(span)
+
+    def close(self) -> None:
+        """Close every exporter."""
+        for exporter in self.exporters:
+            exporter.close()
+
+
+def tracer_from_env() -> Tracer:
+    """Get a tracer exporting to the backend named by AGENT_TRACING, disabled when it is unset."""
+    exporters: List[SpanExporter] = []
+    for backend in filter(None, (name.strip() for name in TRACING_BACKEND.split(","))):
+        if backend == "jsonl":
+            exporters.append(JsonlExporter(TRACE_PATH))
+        elif backend == "otel":
+            exporters.append(OpenTelemetryExporter())
+        else:
+            raise ValueError(f"Unsupported tracing backend: {backend}")
+    return Tracer(exporters)
+
+
+_TRACER: Optional[Tracer] = None
+_TRACER_LOCK = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Get the process-wide tracer, built from the environment on first use."""
+    global _TRACER  # pylint: disable=global-statement
+    if _TRACER is None:
+        with _TRACER_LOCK:
+            if _TRACER is None:
+                _TRACER = tracer_from_env()
+    return _TRACER
+
+
+def configure(*exporters: SpanExporter) -> Tracer:
+    """
+    Replace the process-wide tracer, closing the previous one's exporters.
+
+    Args
+    ----
+        exporters: Where finished spans go, e.g. `JsonlExporter(path)`, `OpenTelemetryExporter()` or `SpanMetrics()`.
+            Without exporters tracing is turned off.
+
+    Returns
+    -------
+        The new tracer.
+
+    """
+    global _TRACER  # pylint: disable=global-statement
+    with _TRACER_LOCK:
+        previous, _TRACER = _TRACER, Tracer(exporters)
+    if previous is not None:
+        previous.close()
+    return _TRACER
+
+
+def span(name: str, **attributes: AttributeValue) -> Union[Span, _NoopSpan]:
+    """Get a span of the process-wide tracer to use as a context manager."""
+    return get_tracer().span(name, **attributes)
+
+
+def current_span() -> Union[Span, _NoopSpan]:
+    """Get the innermost span open in this context, e.g. to add the attributes of a result to it."""
+    return _CURRENT_SPAN.get() or NOOP_SPAN
+
+
+def traced(name: str, *argument_names: str) -> Callable[[Func], Func]:
+    """
+    Wrap every call of a function in a span of the process-wide tracer.
+
+    Args
+    ----
+        name: The name of the span, e.g. "code_runner.run".
+        argument_names: The arguments of the call recorded as span attributes, e.g. "filepath".
+
+    Returns
+    -------
+        The decorator. While tracing is off the wrapper calls straight through, arguments are only
+        bound when a span is recorded.
+
+    """
+
+    def decorator(func: Func) -> Func:
+        signature = inspect.signature(func) if argument_names else None
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            tracer = get_tracer()
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            attributes: Dict[str, Any] = {}
+            if signature is not None:
+                arguments = signature.bind_partial(*args, **kwargs).arguments
+                attributes = {argument: arguments.get(argument) for argument in argument_names}
+            with tracer.span(name, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -0,0 +1,22 @@
+import json
+
+from benchmarks.__main__ import main
+from benchmarks.harness import compare
+
+
+def test_quick_benchmarks_write_a_comparable_json_report(tmp_path):
+    output = tmp_path / "report.json"
+
+    assert main(["--quick", "--only", "chat_session", "code_writer", "--output", str(output)]) == 0
+
+    report = json.loads(output.read_text())
+    keys = [result["key"] for result in report["results"]]
+    assert "chat_session.append[messages=1000]" in keys
+    assert "code_writer.apply_edits[edits=100,lines=3000]" in keys
+    assert all(result["median_seconds"] > 0 and result["per_second"] > 0 for result in report["results"])
+
+    slower = json.loads(output.read_text())
+    slower["results"][0]["median_seconds"] *= 2
+    assert [regression["key"] for regression in compare(report, slower)] == [keys[0]]
+    assert compare(slower, report) == []
+    assert main(["--quick", "--only", "chat_session", "--output", str(tmp_path / "next.json"), "--baseline", str(output), "--threshold", "1000"]) == 0
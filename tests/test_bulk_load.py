@@ -0,0 +1,110 @@
+import threading
+
+from langchain.embeddings.fake import DeterministicFakeEmbedding
+from langchain.schema import Document
+
+import pytest
+
+from llm_cdk_app_agent.search.bulk_load import BulkLoader, document_id
+from llm_cdk_app_agent.search.indexer.manifest import IndexManifest, chunk_id, sync_files
+from llm_cdk_app_agent.search.local_index import LocalIndexManager
+
+
+class FlakyIndex:
+    """Wrap an index, failing the first upsert of every other batch after writing half of it."""
+
+    def __init__(self, index):
+        self.index = index
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def upsert(self, vectors, namespace=None):
+        with self.lock:
+            fail = vectors[0][2]["chunk_number"] % 32 == 0 and vectors[0][0] not in self.seen
+            self.seen.add(vectors[0][0])
+        if fail:
+            self.index.upsert(vectors=vectors[: len(vectors) // 2], namespace=namespace)
+            raise ConnectionError("connection reset")
+        return self.index.upsert(vectors=vectors, namespace=namespace)
+
+
+def _documents(count, source="aws_cdk/aws_lambda/__init__.py"):
+    return (
+        Document(page_content=f"chunk {number} of {source}", metadata={"source": source, "chunk_number": number, "symbol": None})
+        for number in range(count)
+    )
+
+
+def test_bulk_load_retries_partial_failures_without_duplicates(tmp_path):
+    index = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=8)
+    flaky = FlakyIndex(index)
+    loader = BulkLoader(flaky, DeterministicFakeEmbedding(size=8), batch_size=16, max_concurrency=3, backoff_seconds=0)
+
+    stats = loader.load(_documents(250), namespace="cdk-docs")
+
+    assert stats.documents == stats.vectors == 250
+    assert stats.batches == 16 and stats.retries > 0 and not stats.failed_ids
+    assert index.describe_index_stats().namespaces["cdk-docs"].vector_count == 250
+    stored = index.fetch([document_id(next(_documents(1)))], namespace="cdk-docs")
+    assert list(stored.values())[0].metadata == {
+        "source": "aws_cdk/aws_lambda/__init__.py",
+        "chunk_number": 0,
+        "text": "chunk 0 of aws_cdk/aws_lambda/__init__.py",
+    }
+    assert "vectors/s" in stats.summary()
+
+    # re-running the load overwrites the same ids
+    loader.load(_documents(250), namespace="cdk-docs")
+    assert index.describe_index_stats().namespaces["cdk-docs"].vector_count == 250
+
+
+def test_bulk_load_reports_batches_that_never_succeed(tmp_path):
+    class DownIndex:
+        def upsert(self, vectors, namespace=None):
+            raise ConnectionError("index unavailable")
+
+    loader = BulkLoader(DownIndex(), DeterministicFakeEmbedding(size=8), batch_size=10, retries=1, backoff_seconds=0)
+
+    stats = loader.load(_documents(25))
+
+    assert stats.vectors == 0 and stats.retries == 3
+    assert len(stats.failed_ids) == 25
+
+
+def test_bulk_load_all_loads_namespaces_in_parallel(tmp_path):
+    index = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=8)
+    progress = []
+    loader = BulkLoader(index, DeterministicFakeEmbedding(size=8), batch_size=20, on_progress=lambda stats: progress.append(stats.namespace))
+
+    results = loader.load_all({"cdk-docs": _documents(100), "fastapi-docs": _documents(40, "fastapi/main.py")})
+
+    assert {namespace: stats.vectors for namespace, stats in results.items()} == {"cdk-docs": 100, "fastapi-docs": 40}
+    assert sorted(progress) == ["cdk-docs"] * 5 + ["fastapi-docs"] * 2
+    namespaces = index.describe_index_stats().namespaces
+    assert namespaces["cdk-docs"].vector_count == 100 and namespaces["fastapi-docs"].vector_count == 40
+
+
+def test_sync_files_upserts_through_the_loader_under_manifest_ids(tmp_path):
+    index = LocalIndexManager(root_dir=tmp_path / "index").create_or_get_index(dimension=8)
+    source = tmp_path / "stack.py"
+    # identical chunk texts in one file must stay separate vectors
+    source.write_text("x = 1\n" * 40)
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    loader = BulkLoader(FlakyIndex(index), DeterministicFakeEmbedding(size=8), batch_size=8, backoff_seconds=0)
+
+    sync_files(manifest, "cdk", "1", [("stack.py", source, {})], str.splitlines, index, loader.embeddings, loader=loader)
+
+    content_hash = manifest.file_hash("cdk", "stack.py")
+    assert manifest.chunk_ids("cdk", "stack.py") == [chunk_id("cdk", "stack.py", content_hash, number) for number in range(40)]
+    assert index.describe_index_stats().total_vector_count == 40
+
+    class DownIndex:
+        def upsert(self, vectors, namespace=None):
+            raise ConnectionError("index unavailable")
+
+    source.write_text("y = 2\n")
+    down = BulkLoader(DownIndex(), loader.embeddings, retries=0)
+    with pytest.raises(RuntimeError, match="stack.py"):
+        sync_files(manifest, "cdk", "2", [("stack.py", source, {})], str.splitlines, index, loader.embeddings, loader=down)
+    # the failed file keeps its old record, so the next run retries it
+    assert manifest.file_hash("cdk", "stack.py") == content_hash
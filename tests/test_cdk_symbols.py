@@ -0,0 +1,145 @@
+import time
+
+from llm_cdk_app_agent.search.indexer.cdk_symbols import SymbolIndex, parse_module, symbol_chunks
+
+
+LAMBDA_MODULE = """
+import builtins
+import jsii
+import constructs as _constructs_77d1e7e8
+
+
+class Function(
+    FunctionBase,
+    metaclass=jsii.JSIIMeta,
+    jsii_type="aws-cdk-lib.aws_lambda.Function",
+):
+    '''Deploys a file from inside the construct library as a function.
+
+    The supplied file is subject to the 4096 bytes limit.
+
+    :resource: AWS::Lambda::Function
+    :exampleMetadata: infused
+
+    Example::
+
+        fn = lambda_.Function(self, "MyFunction",
+            runtime=lambda_.Runtime.NODEJS_18_X,
+        )
+    '''
+
+    def __init__(
+        self,
+        scope: _constructs_77d1e7e8.Construct,
+        id: builtins.str,
+        *,
+        code: "Code",
+        handler: builtins.str,
+        memory_size: typing.Optional[jsii.Number] = None,
+    ) -> None:
+        '''
+        :param scope: -
+        :param id: -
+        :param code: The source code of your Lambda function.
+            You can point to a file in an Amazon S3 bucket.
+        :param handler: The name of the method within your code that Lambda calls.
+        :param memory_size: The amount of memory, in MB. Default: 128
+        '''
+
+    @jsii.member(jsii_name="addAlias")
+    def add_alias(self, alias_name: builtins.str, *, description: typing.Optional[builtins.str] = None) -> "Alias":
+        '''Defines an alias for this function.
+
+        :param alias_name: The name of the alias.
+        '''
+
+    @jsii.member(jsii_name="fromFunctionArn")
+    @builtins.classmethod
+    def _private(cls) -> None:
+        pass
+
+    @builtins.property
+    @jsii.member(jsii_name="runtime")
+    def runtime(self) -> "Runtime":
+        '''The runtime configured for this lambda.'''
+
+
+@jsii.data_type(jsii_type="aws-cdk-lib.aws_lambda.FunctionProps")
+class FunctionProps(FunctionOptions):
+    @builtins.property
+    def code(self) -> "Code":
+        '''The source code of your Lambda function.
+
+        More text.
+        '''
+
+
+class _FunctionProxy(Function):
+    pass
+"""
+
+
+def test_parse_module_builds_constructs_with_props_methods_and_examples():
+    function, props = parse_module(LAMBDA_MODULE, "aws_cdk.aws_lambda")
+
+    assert function.qualified_name == "aws_cdk.aws_lambda.Function"
+    assert function.doc == "Deploys a file from inside the construct library as a function.\n\nThe supplied file is subject to the 4096 bytes limit."
+    assert [(prop.name, prop.signature) for prop in function.props] == [
+        ("code", '"Code"'),
+        ("handler", "str"),
+        ("memory_size", "Optional[jsii.Number]"),
+    ]
+    assert function.props[0].doc == "The source code of your Lambda function. You can point to a file in an Amazon S3 bucket."
+    assert [method.signature for method in function.methods] == [
+        'add_alias(alias_name: str, *, description: Optional[str] = None) -> "Alias"'
+    ]
+    assert [prop.name for prop in function.properties] == ["runtime"]
+    assert function.examples == ['fn = lambda_.Function(self, "MyFunction",\n    runtime=lambda_.Runtime.NODEJS_18_X,\n)']
+    assert props.name == "FunctionProps" and [prop.name for prop in props.properties] == ["code"]
+
+
+def test_symbol_chunks_take_the_module_from_jsii_types():
+    chunks = symbol_chunks(LAMBDA_MODULE)
+
+    assert [(symbol, section) for symbol, section, _ in chunks] == [
+        ("aws_cdk.aws_lambda.Function", "overview"),
+        ("aws_cdk.aws_lambda.Function", "method:add_alias"),
+        ("aws_cdk.aws_lambda.Function", "example"),
+        ("aws_cdk.aws_lambda.FunctionProps", "overview"),
+    ]
+    overview = chunks[0][2].splitlines()
+    assert overview[0] == "class aws_lambda.Function(FunctionBase)"
+    assert "- handler (str): The name of the method within your code that Lambda calls." in overview
+    assert chunks[3][2].endswith('- code ("Code"): The source code of your Lambda function.')
+
+
+def test_symbol_index_exact_and_prefix_lookup(tmp_path):
+    index = SymbolIndex(parse_module(LAMBDA_MODULE, "aws_cdk.aws_lambda") + parse_module(LAMBDA_MODULE.replace("aws_lambda", "aws_stepfunctions"), "aws_cdk.aws_stepfunctions"))
+
+    assert index.get("aws_lambda.Function").qualified_name == "aws_cdk.aws_lambda.Function"
+    assert index.get("AWS_CDK.AWS_LAMBDA.FUNCTIONPROPS").name == "FunctionProps"
+    assert len(index.lookup("Function")) == 2
+    assert [symbol.qualified_name for symbol in index.prefix("aws_lambda.Func")] == [
+        "aws_cdk.aws_lambda.Function",
+        "aws_cdk.aws_lambda.FunctionProps",
+    ]
+    assert [symbol.name for symbol in index.prefix("functionp")] == ["FunctionProps", "FunctionProps"]
+    assert index.prefix("aws_s3") == [] and index.get("Bucket") is None
+
+    index.save(tmp_path / "symbols.pkl")
+    loaded = SymbolIndex.load(tmp_path / "symbols.pkl")
+    assert loaded.get("aws_stepfunctions.Function").props[1].name == "handler"
+    assert SymbolIndex.load(tmp_path / "missing.pkl") is None
+
+
+def test_symbol_lookup_is_constant_time_on_a_cdk_sized_table():
+    symbols = parse_module(LAMBDA_MODULE, "aws_cdk.aws_lambda")
+    index = SymbolIndex(
+        type(symbol)(module=f"aws_cdk.module{number}", name=f"{symbol.name}{number}") for number in range(20_000) for symbol in symbols
+    )
+
+    started_at = time.perf_counter()
+    for number in range(1000):
+        assert index.get(f"module{number}.Function{number}") is not None
+        assert len(index.prefix(f"aws_cdk.module{number}.functionp", limit=5)) == 1
+    assert (time.perf_counter() - started_at) / 1000 < 0.001
@@ -0,0 +1,182 @@
+import asyncio
+import json
+from uuid import uuid4
+
+import pytest
+from langchain.schema.messages import AIMessageChunk
+
+from llm_cdk_app_agent.llms.schemas import (
+    TOKENS_PER_MESSAGE,
+    AIChat,
+    ChatRole,
+    ChatSession,
+    FunctionChat,
+    ModelName,
+    UserChat,
+)
+from llm_cdk_app_agent.llms.streaming import ChatStreamBroadcaster, StreamClosedError
+
+
+def encode_words(text):
+    """Count whitespace separated words as tokens, so tests don't need tiktoken's encoding files."""
+    return text.split()
+
+
+def _user_chat(content):
+    return UserChat(content=content, role=ChatRole.USER, id=uuid4())
+
+
+def test_chunk_tokens_are_counted_incrementally():
+    session = ChatSession(chats=[_user_chat("hello there")])
+    session.append_chat(AIChat(content="", role=ChatRole.AI, id=uuid4()))
+    assert session.chats[-1].token_count(encode_words) == TOKENS_PER_MESSAGE
+
+    for word in ["one ", "two ", "three "]:
+        session.append_message_chunk(AIMessageChunk(content=word))
+
+    assert session.chats[-1].token_count(encode_words) == TOKENS_PER_MESSAGE + 3
+
+
+def test_window_keeps_system_prompt_and_recent_turns():
+    session = ChatSession(chats=[])
+    for turn in range(2000):
+        session.append_chat(_user_chat(f"question {turn}"))
+        session.append_function_response("read_file", "line " * 200)
+        session.append_ai_chat(f"answer {turn}")
+    session.upsert_system_prompt("you write cdk apps")
+
+    window = session.windowed_chats(ModelName.GPT_TURBO, reserve_tokens=500, keep_recent=3, encoder=encode_words)
+
+    assert window[0].content == "you write cdk apps"
+    assert window[-1].content == "answer 1999"
+    assert window[-2].content == "line " * 200
+    assert "truncated" in window[-5].content
+    assert sum(chat.token_count(encode_words) for chat in window) <= 4096 - 500
+    assert session.token_count(ModelName.GPT_TURBO, encoder=encode_words) > 4096
+
+
+def test_old_function_outputs_are_dropped_when_they_do_not_fit():
+    session = ChatSession(chats=[_user_chat("question")])
+    session.chats.append(FunctionChat(name="search", content="doc " * 5000, role=ChatRole.FUNCTION, id=uuid4(), render_chat=False))
+    session.append_ai_chat("answer")
+
+    window = session.windowed_chats(
+        ModelName.GPT_TURBO, keep_recent=1, function_summary_tokens=5000, encoder=encode_words
+    )
+
+    assert [chat.content for chat in window] == ["question", "answer"]
+
+
+def test_stream_buffer_assembles_content_and_function_call_once():
+    session = ChatSession(chats=[_user_chat("create a bucket")])
+    session.start_ai_stream()
+    for chunk in [
+        AIMessageChunk(content="", additional_kwargs={"function_call": {"name": "create_file", "arguments": ""}}),
+        AIMessageChunk(content="", additional_kwargs={"function_call": {"arguments": '{"path": '}}),
+        AIMessageChunk(content="", additional_kwargs={"function_call": {"arguments": '"app.py"}'}}),
+    ]:
+        session.append_message_chunk(chunk)
+
+    assert len(session.chats) == 1
+    ai_chat = session.finish_ai_stream()
+
+    assert session.chats[-1] is ai_chat
+    assert ai_chat.function_call.name == "create_file"
+    assert ai_chat.function_call.arguments == {"path": "app.py"}
+    assert not ai_chat.render_chat
+
+
+def test_failed_stream_finish_closes_the_buffer():
+    session = ChatSession(chats=[_user_chat("create a bucket")])
+    session.start_ai_stream()
+    session.append_message_chunk(
+        AIMessageChunk(content="", additional_kwargs={"function_call": {"name": "create_file", "arguments": '{"path": '}})
+    )
+
+    with pytest.raises(json.JSONDecodeError):
+        session.finish_ai_stream()
+
+    with pytest.raises(ValueError, match="No AI stream is open"):
+        session.finish_ai_stream()
+    session.start_ai_stream()
+    session.append_message_chunk(AIMessageChunk(content="retried"))
+    assert session.finish_ai_stream().content == "retried" and len(session.chats) == 2
+
+
+def test_broadcaster_fans_tokens_out_with_backpressure():
+    async def chunks():
+        for token in ["a", "b", "c", "d"]:
+            yield AIMessageChunk(content=token)
+
+    async def run():
+        session = ChatSession(chats=[_user_chat("hi")])
+        broadcaster = ChatStreamBroadcaster(session, max_buffered_tokens=1)
+        fast, slow = broadcaster.subscribe(), broadcaster.subscribe()
+
+        async def collect(tokens, delay):
+            received = []
+            async for token in tokens:
+                received.append(token)
+                await asyncio.sleep(delay)
+            return received
+
+        ai_chat, fast_tokens, slow_tokens = await asyncio.gather(
+            broadcaster.run(chunks()), collect(fast, 0), collect(slow, 0.01)
+        )
+        return session, ai_chat, fast_tokens, slow_tokens
+
+    session, ai_chat, fast_tokens, slow_tokens = asyncio.run(run())
+
+    assert fast_tokens == slow_tokens == ["a", "b", "c", "d"]
+    assert ai_chat.content == "abcd"
+    assert session.chats[-1] is ai_chat
+
+
+def test_cancelled_stream_closes_the_buffer_and_ends_every_subscriber():
+    started = asyncio.Event()
+
+    async def chunks():
+        yield AIMessageChunk(content="a")
+        started.set()
+        await asyncio.sleep(60)
+        yield AIMessageChunk(content="b")
+
+    async def run():
+        session = ChatSession(chats=[_user_chat("hi")])
+        broadcaster = ChatStreamBroadcaster(session, max_buffered_tokens=1)
+        tokens = broadcaster.subscribe()
+        task = asyncio.ensure_future(broadcaster.run(chunks()))
+        await started.wait()
+        task.cancel()
+        received = []
+        with pytest.raises(StreamClosedError):
+            async for token in tokens:
+                received.append(token)
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        session.start_ai_stream()
+        return received
+
+    assert asyncio.run(asyncio.wait_for(run(), 5)) == ["a"]
+
+
+def test_closed_and_stalled_subscribers_dont_block_the_stream():
+    async def chunks():
+        for token in ["a", "b", "c", "d"]:
+            yield AIMessageChunk(content=token)
+
+    async def run():
+        session = ChatSession(chats=[_user_chat("hi")])
+        broadcaster = ChatStreamBroadcaster(session, max_buffered_tokens=1, subscriber_timeout_seconds=0.05)
+        closed, stalled = broadcaster.subscribe(), broadcaster.subscribe()
+        closed.close()
+        ai_chat = await broadcaster.run(chunks())
+        with pytest.raises(StreamClosedError):
+            async for _ in stalled:
+                pass
+        return ai_chat, [token async for token in closed]
+
+    ai_chat, closed_tokens = asyncio.run(asyncio.wait_for(run(), 5))
+
+    assert ai_chat.content == "abcd"
+    assert closed_tokens == []
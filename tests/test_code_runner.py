@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_cdk_app_agent.code_writer.async_runner import AsyncRunnerPool, RunLimits
+from llm_cdk_app_agent.code_writer.code_runner import FileRunner
+from llm_cdk_app_agent.code_writer.warm_runner import WarmRunner
+
+
+def _script(tmp_path, name, code):
+    path = tmp_path / name
+    path.write_text(code)
+    return str(path)
+
+
+def test_pool_runs_files_concurrently_and_streams_output(tmp_path):
+    sleepers = [_script(tmp_path, f"sleep_{number}.py", "import time\ntime.sleep(0.5)\nprint('done')\n") for number in range(3)]
+    failing = _script(tmp_path, "fail.py", "import sys\nprint('oops', file=sys.stderr)\nsys.exit(3)\n")
+    streamed = []
+
+    async def run():
+        async with AsyncRunnerPool(max_workers=4) as pool:
+            return await pool.run_many(sleepers + [failing], on_output=lambda stream, text: streamed.append((stream, text)))
+
+    started_at = time.perf_counter()
+    results = asyncio.run(run())
+
+    assert time.perf_counter() - started_at < 1.4
+    assert [result.stdout for result in results[:3]] == ["done\n"] * 3
+    assert results[3].exit_code == 3 and results[3].stderr == "oops\n" and not results[3].ok
+    assert "".join(text for stream, text in streamed if stream == "stderr") == "oops\n"
+    assert all(result.peak_rss_bytes > 1024 * 1024 for result in results)
+
+
+def test_limits_kill_hung_and_chatty_runs(tmp_path):
+    hung = _script(tmp_path, "hung.py", "import time\nprint('start', flush=True)\ntime.sleep(60)\n")
+    chatty = _script(tmp_path, "chatty.py", "print('x' * 100000)\n")
+    runner = FileRunner(RunLimits(timeout_seconds=0.5, max_output_bytes=1000))
+
+    hung_result = runner.run_file(hung)
+    chatty_result = runner.run_file(chatty)
+
+    assert hung_result.timed_out and hung_result.exit_code < 0 and hung_result.stdout == "start\n"
+    assert hung_result.duration_seconds < 5
+    assert chatty_result.ok and chatty_result.truncated and len(chatty_result.stdout) == 1000
+
+
+def test_background_processes_cant_outlive_the_timeout(tmp_path):
+    code = "import subprocess, sys\nsubprocess.Popen(['sleep', '8']{session})\nprint('left', flush=True)\n"
+    in_session = _script(tmp_path, "in_session.py", code.format(session=""))
+    # a process that leaves the session isn't killed with it, but the run still ends at its deadline
+    escaped = _script(tmp_path, "escaped.py", code.format(session=", start_new_session=True"))
+    runner = FileRunner(RunLimits(timeout_seconds=2))
+
+    in_session_result = runner.run_file(in_session)
+    escaped_result = runner.run_file(escaped)
+
+    assert in_session_result.ok and in_session_result.stdout == "left\n" and in_session_result.duration_seconds < 1.5
+    assert escaped_result.timed_out and escaped_result.stdout == "left\n"
+    assert 1.9 < escaped_result.duration_seconds < 3
+
+
+def test_resource_limits_apply_to_the_run_and_what_it_spawns(tmp_path):
+    code = "import resource, sys\nprint(sys.argv[0], resource.getrlimit(resource.RLIMIT_CPU), resource.getrlimit(resource.RLIMIT_AS))\n"
+    script = _script(tmp_path, "limits.py", code)
+    hog = _script(tmp_path, "hog.py", "import subprocess, sys\nsubprocess.run([sys.executable, '-c', 'x = bytearray(512 << 20)'], check=True)\n")
+    runner = FileRunner(RunLimits(timeout_seconds=2, memory_bytes=256 << 20))
+
+    result = runner.run_file(script)
+    hog_result = runner.run_file(hog)
+
+    assert result.ok and result.stdout == f"{script} (2, 3) ({256 << 20}, {256 << 20})\n"
+    assert not hog_result.ok and "MemoryError" in hog_result.stderr
+
+
+def test_warm_runner_forks_children_with_modules_preloaded(tmp_path):
+    script = _script(tmp_path, "check.py", "import sys\nprint('pydantic' in sys.modules)\nsys.exit(2)\n")
+    hung = _script(tmp_path, "hung.py", "import time\ntime.sleep(60)\n")
+
+    with WarmRunner(preload_modules=["pydantic", "not_a_real_module"], limits=RunLimits(timeout_seconds=1)) as runner:
+        results = [runner.run(script) for _ in range(3)]
+        hung_result = runner.run(hung)
+        stats = runner.stats()
+
+    assert runner.failed_preloads == ["not_a_real_module"]
+    assert [(result.stdout, result.exit_code) for result in results] == [("True\n", 2)] * 3
+    assert hung_result.timed_out and hung_result.exit_code < 0
+    assert stats.runs == 4
+    assert stats.average_warm_startup_seconds < stats.cold_startup_seconds
+    assert stats.saved_seconds > 0
+    assert "saved" in stats.report()
+
+
+def test_warm_runner_refuses_to_preload_jsii_backed_modules():
+    with pytest.raises(ValueError, match="aws_cdk"):
+        WarmRunner(preload_modules=["pydantic", "aws_cdk.aws_lambda"])
+
+
+def test_warm_runner_isolates_concurrent_cdk_apps(tmp_path):
+    pytest.importorskip("aws_cdk")
+    apps = [
+        _script(
+            tmp_path,
+            f"app_{number}.py",
+            "import aws_cdk as cdk\n"
+            "from aws_cdk import aws_s3 as s3\n"
+            "app = cdk.App()\n"
+            f"stack = cdk.Stack(app, 'Stack{number}')\n"
+            f"for i in range(20):\n    s3.Bucket(stack, f'Bucket{number}x{{i}}')\n"
+            "print(len(app.synth().get_stack_by_name(stack.stack_name).template['Resources']))\n",
+        )
+        for number in range(2)
+    ]
+
+    with WarmRunner(limits=RunLimits(timeout_seconds=120)) as runner:
+        futures = [runner.submit(app) for app in apps]
+        results = [future.result() for future in futures]
+
+    assert [(result.exit_code, result.stdout) for result in results] == [(0, "20\n")] * 2
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from llm_cdk_app_agent.code_writer.code_writer_base import CodeWriter
+from llm_cdk_app_agent.code_writer.fence_parser import CodeBlockStreamWriter
+from llm_cdk_app_agent.code_writer.patch import Edit, EditKind, PatchError, unified_diff
+from llm_cdk_app_agent.code_writer.workspace import Workspace, WorkspaceConflictError
+
+
+def test_batched_edits_are_flushed_once(tmp_path):
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+
+    with writer.batch():
+        writer.create("import aws_cdk\n", "/app/stack.py")
+        for number in range(1, 11):
+            writer.update("app/stack.py", number + 1, f"line_{number} = {number}")
+        writer.delete_file("app/stack.py", 1, 5, False)
+        assert not (tmp_path / "app" / "stack.py").exists()
+        assert writer.workspace.dirty_files == ["app/stack.py"]
+
+    content = (tmp_path / "app" / "stack.py").read_text()
+    assert content.splitlines() == ["import aws_cdk"] + [f"line_{number} = {number}" for number in range(6, 11)]
+    assert writer.workspace.dirty_files == []
+    assert [path.name for path in (tmp_path / "app").iterdir()] == ["stack.py"]
+
+
+def test_autoflush_writes_and_deletes_immediately(tmp_path):
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+    writer.create("print('hello')", "main.py")
+    assert (tmp_path / "main.py").read_text() == "print('hello')"
+
+    writer.update("main.py", 2, "print('world')")
+    assert (tmp_path / "main.py").read_text() == "print('hello')\nprint('world')\n"
+
+    assert writer.delete_file("main.py", 0, 0, True) == "deleted entire file"
+    assert not (tmp_path / "main.py").exists()
+
+
+def test_files_changed_on_disk_are_reloaded_or_conflict(tmp_path):
+    workspace = Workspace(str(tmp_path))
+    (tmp_path / "main.py").write_text("a = 1\n")
+    (tmp_path / "stack.py").write_text("b = 1\n")
+    assert workspace.read("main.py") == "a = 1\n" and workspace.read("stack.py") == "b = 1\n"
+
+    # sizes differ too, as back-to-back writes can share a coarse mtime
+    (tmp_path / "main.py").write_text("a = 22\n")
+    assert workspace.read("main.py") == "a = 22\n"
+
+    workspace.insert_lines("main.py", 2, "c = 3")
+    workspace.insert_lines("stack.py", 2, "d = 4")
+    (tmp_path / "stack.py").write_text("b = 22\n")
+    with pytest.raises(WorkspaceConflictError):
+        workspace.flush()
+    with pytest.raises(WorkspaceConflictError):
+        workspace.lines("stack.py")
+    # nothing was written, and replacing the whole file resolves the conflict
+    assert (tmp_path / "main.py").read_text() == "a = 22\n"
+    workspace.write("stack.py", "b = 3\n")
+    assert workspace.flush() == ["main.py", "stack.py"]
+    assert (tmp_path / "main.py").read_text() == "a = 22\nc = 3\n" and (tmp_path / "stack.py").read_text() == "b = 3\n"
+
+
+def test_apply_edits_uses_original_line_numbers(tmp_path):
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+    writer.create("".join(f"line {number}\n" for number in range(1, 7)), "app.py")
+
+    diff = writer.apply_edits(
+        "app.py",
+        [
+            {"kind": "delete", "start": 5, "end": 6},
+            Edit(EditKind.INSERT, 1, text="import os"),
+            Edit(EditKind.REPLACE, 2, 3, "two\nthree\nthree and a half"),
+        ],
+    )
+
+    assert (tmp_path / "app.py").read_text().splitlines() == [
+        "import os",
+        "line 1",
+        "two",
+        "three",
+        "three and a half",
+        "line 4",
+    ]
+    assert "-line 5" in diff and "+import os" in diff
+
+    with pytest.raises(PatchError):
+        writer.apply_edits("app.py", [Edit(EditKind.DELETE, 1, 3), Edit(EditKind.REPLACE, 3, 4, "x")])
+
+
+def test_apply_patch_round_trips_a_unified_diff(tmp_path):
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+    before = "".join(f"line {number}\n" for number in range(1, 21))
+    writer.create(before, "stack.py")
+    after = before.replace("line 3\n", "line three\n").replace("line 17\n", "").replace("line 20\n", "line 20\nline 21\n")
+    diff = unified_diff("stack.py", before.splitlines(keepends=True), after.splitlines(keepends=True))
+    diff += unified_diff("new.py", [], ["print('new')\n"]).replace("a/new.py", "/dev/null")
+
+    writer.apply_patch(diff)
+
+    assert (tmp_path / "stack.py").read_text() == after
+    assert (tmp_path / "new.py").read_text() == "print('new')\n"
+    with pytest.raises(PatchError):
+        writer.apply_patch(diff)
+
+
+COMPLETION = """Here is the stack, with **bold** advice:
+
+**app/stack.py**
+```python
+import aws_cdk as cdk
+# a comment that must survive
+```
+
+And the entry point:
+
+```python title=app.py
+print("synth")
+```
+
+```bash
+cdk deploy
+```
+"""
+
+
+def test_remove_markdown_keeps_code():
+    code = CodeWriter(workspace=Workspace("unused")).remove_markdown(COMPLETION)
+
+    assert code == 'import aws_cdk as cdk\n# a comment that must survive\n\nprint("synth")\n\ncdk deploy\n'
+
+
+def test_stream_writer_writes_blocks_as_they_close(tmp_path):
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+    stream_writer = CodeBlockStreamWriter(writer)
+    seen_before_end = []
+
+    async def chunks():
+        for start in range(0, len(COMPLETION), 7):
+            yield COMPLETION[start : start + 7]
+            await asyncio.sleep(0.005)
+            if (tmp_path / "app" / "stack.py").exists() and not seen_before_end:
+                seen_before_end.append(start)
+
+    written = asyncio.run(stream_writer.awrite(chunks()))
+
+    assert [(block.language, block.path) for block in written] == [("python", "app/stack.py"), ("python", "app.py")]
+    assert [block.language for block in stream_writer.skipped] == ["bash"]
+    assert (tmp_path / "app" / "stack.py").read_text().endswith("# a comment that must survive\n")
+    assert (tmp_path / "app.py").read_text() == 'print("synth")\n'
+    assert seen_before_end and seen_before_end[0] < len(COMPLETION) - 7
+
+
+def test_stream_writer_skips_rejected_paths_and_keeps_nested_fences(tmp_path):
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+    stream_writer = CodeBlockStreamWriter(writer)
+    completion = (
+        "```text title=requirements.txt\naws-cdk-lib\n```\n\n"
+        "~~~python title=app.py\nREADME = '''\n```bash\ncdk deploy\n```\n'''\n~~~\n"
+    )
+
+    written = stream_writer.write([completion[:30], completion[30:]])
+
+    assert [block.path for block in written] == ["app.py"]
+    assert [block.path for block in stream_writer.skipped] == ["requirements.txt"]
+    assert (tmp_path / "app.py").read_text() == "README = '''\n```bash\ncdk deploy\n```\n'''\n"
+    assert not (tmp_path / "requirements.txt").exists()
@@ -0,0 +1,40 @@
+from langchain.embeddings.fake import DeterministicFakeEmbedding
+
+from llm_cdk_app_agent.search.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class BatchRecordingEmbedding(DeterministicFakeEmbedding):
+    batches: list = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def test_misses_are_batched_and_hits_are_served_from_disk(tmp_path):
+    provider = BatchRecordingEmbedding(size=4, batches=[])
+    cache_path = tmp_path / "embeddings.bin"
+    embeddings = CachedEmbeddings(provider, model="fake", cache=EmbeddingCache(cache_path), batch_size=2)
+
+    first = embeddings.embed_documents(["a", "b", "c", "a", "  a "])
+
+    assert sorted(len(batch) for batch in provider.batches) == [1, 2]
+    assert first[0] == first[3] == first[4]
+
+    provider.batches = []
+    reopened = CachedEmbeddings(provider, model="fake", cache=EmbeddingCache(cache_path, lru_size=1))
+    second = reopened.embed_documents(["c", "b", "a"])
+
+    assert provider.batches == []
+    assert second == [first[2], first[1], first[0]]
+    assert reopened.stats.hit_rate == 1.0
+
+
+def test_cache_is_keyed_by_model(tmp_path):
+    provider = BatchRecordingEmbedding(size=4, batches=[])
+    cache = EmbeddingCache(tmp_path / "embeddings.bin")
+    CachedEmbeddings(provider, model="model-a", cache=cache).embed_query("text")
+    CachedEmbeddings(provider, model="model-b", cache=cache).embed_query("text")
+
+    assert len(provider.batches) == 2
+    assert len(cache) == 2
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain.embeddings.fake import DeterministicFakeEmbedding
+
+from llm_cdk_app_agent.search.indexer.cdk_wheel import WheelSource, download_wheel
+from llm_cdk_app_agent.search.indexer.fetch_cdk import (
+    ChunkingStats,
+    cdk_version,
+    iter_cdk_chunks,
+    read_init,
+    split_docs,
+    sync_cdk_docs,
+)
+from llm_cdk_app_agent.search.indexer.manifest import IndexManifest
+from llm_cdk_app_agent.search.local_index import LocalIndexManager
+
+
+def test_split_docs_streams_every_module(tmp_path):
+    for module in ("aws_lambda", "aws_s3", "aws_ec2"):
+        module_dir = tmp_path / "aws_cdk" / module
+        module_dir.mkdir(parents=True)
+        (module_dir / "__init__.py").write_text("\n".join(f"def handler_{i}(event):\n    return {i}\n" for i in range(20)))
+    stats = ChunkingStats()
+
+    chunks = split_docs(tmp_path, stats=stats)
+    first = next(chunks)
+    rest = list(chunks)
+
+    assert first.metadata == {
+        "source": "aws_cdk/aws_ec2/__init__.py",
+        "module": "aws_cdk.aws_ec2",
+        "symbol": "aws_cdk.aws_ec2",
+        "section": "method:handler_0",
+        "file_key": "aws_cdk/aws_ec2/__init__.py",
+        "chunk_number": 0,
+    }
+    assert {chunk.metadata["module"] for chunk in rest} == {"aws_cdk.aws_ec2", "aws_cdk.aws_lambda", "aws_cdk.aws_s3"}
+    assert stats.files == 3
+    assert stats.chunks == len(rest) + 1
+
+
+def _build_wheel(path, version, modules):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as wheel:
+        for module, text in modules.items():
+            wheel.writestr(f"aws_cdk/{module}/__init__.py", text)
+        wheel.writestr(f"aws_cdk_lib-{version}.dist-info/METADATA", f"Name: aws-cdk-lib\nVersion: {version}\n")
+    return path
+
+
+class FakePyPI(BaseHTTPRequestHandler):
+    files = {}
+    requests = []
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        FakePyPI.requests.append(self.path)
+        body = FakePyPI.files.get(self.path)
+        self.send_response(200 if body is not None else 404)
+        self.send_header("Content-Length", str(len(body or b"")))
+        self.end_headers()
+        self.wfile.write(body or b"")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def pypi():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePyPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_forked_workers_do_not_share_the_parent_archive_handle(tmp_path):
+    modules = {
+        f"aws_mod_{number}": "\n".join(f"def handler_{number}_{i}(event):\n    return {i} * {number}\n" for i in range(200))
+        for number in range(60)
+    }
+    wheel = _build_wheel(tmp_path / "aws_cdk_lib-2.104.0-py3-none-any.whl", "2.104.0", modules)
+    expected = list(split_docs(wheel))
+
+    for _ in range(3):
+        # the parent opens the archive before forking the workers
+        assert WheelSource(wheel).modules()
+        chunks = list(iter_cdk_chunks(wheel, max_workers=8))
+        assert [chunk.page_content for chunk in chunks] == [chunk.page_content for chunk in expected]
+
+
+def test_download_wheel_resolves_the_latest_version_and_caches_it(pypi, tmp_path):
+    body = _build_wheel(tmp_path / "build" / "aws_cdk_lib-2.110.0-py3-none-any.whl", "2.110.0", {"aws_s3": "x = 1\n"}).read_bytes()
+    release = {
+        "info": {"version": "2.110.0"},
+        "urls": [
+            {"packagetype": "sdist", "filename": "aws-cdk-lib-2.110.0.tar.gz", "url": f"{pypi}/sdist"},
+            {
+                "packagetype": "bdist_wheel",
+                "filename": "aws_cdk_lib-2.110.0-py3-none-any.whl",
+                "url": f"{pypi}/files/aws_cdk_lib-2.110.0-py3-none-any.whl",
+                "digests": {"sha256": hashlib.sha256(body).hexdigest()},
+            },
+        ],
+    }
+    FakePyPI.files = {
+        "/aws-cdk-lib/json": json.dumps(release).encode(),
+        "/files/aws_cdk_lib-2.110.0-py3-none-any.whl": body,
+    }
+    FakePyPI.requests = []
+    cache_dir = tmp_path / "wheels"
+
+    wheel = download_wheel(cache_dir=cache_dir, index_url=pypi)
+
+    assert wheel == cache_dir / "2.110.0" / "aws_cdk_lib-2.110.0-py3-none-any.whl"
+    assert wheel.read_bytes() == body
+    assert download_wheel("2.110.0", cache_dir=cache_dir, index_url=pypi) == wheel
+    assert len(FakePyPI.requests) == 2
+    # an unreachable index falls back to the newest cached wheel
+    assert download_wheel(cache_dir=cache_dir, index_url="http://127.0.0.1:9") == wheel
+
+
+def test_wheel_is_read_and_indexed_without_extraction(tmp_path):
+    wheel = _build_wheel(
+        tmp_path / "aws_cdk_lib-2.104.0-py3-none-any.whl",
+        "2.104.0",
+        {
+            "aws_lambda": "\n".join(f"def handler_{i}(event):\n    return {i}\n" for i in range(20)),
+            "aws_s3": "class Bucket:\n    pass\n",
+        },
+    )
+    source = WheelSource(wheel)
+
+    assert source.version == cdk_version(wheel) == "2.104.0"
+    assert source.modules() == ["aws_cdk/aws_lambda/__init__.py", "aws_cdk/aws_s3/__init__.py"]
+    assert next(source.iter_lines("aws_cdk/aws_s3/__init__.py")) == "class Bucket:\n"
+    assert read_init(wheel)[1] == "class Bucket:\n    pass\n"
+
+    stats = ChunkingStats()
+    chunks = list(split_docs(wheel, stats=stats))
+    assert chunks[0].metadata["source"] == "aws_cdk/aws_lambda/__init__.py"
+    assert chunks[-1].metadata["symbol"] == "aws_cdk.aws_s3.Bucket" and chunks[-1].page_content == "class aws_s3.Bucket"
+    assert stats.files == 2 and stats.chunks == len(chunks)
+
+    index = LocalIndexManager(root_dir=tmp_path / "index").create_or_get_index(dimension=8)
+    manifest = IndexManifest(tmp_path / "manifest.json")
+    synced = sync_cdk_docs(index, DeterministicFakeEmbedding(size=8), manifest, root=wheel)
+    assert synced.indexed_files == 2
+    assert manifest.git_sha("aws_cdk_lib") == "2.104.0"
+    bucket_id = manifest.chunk_ids("aws_cdk_lib", "aws_cdk/aws_s3/__init__.py")[-1]
+    bucket = index.fetch([bucket_id], namespace="cdk-docs")[bucket_id].metadata
+    assert (bucket["symbol"], bucket["section"], bucket["module"]) == ("aws_cdk.aws_s3.Bucket", "overview", "aws_cdk.aws_s3")
+    assert not list(tmp_path.glob("**/aws_cdk"))
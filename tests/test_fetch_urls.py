@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_cdk_app_agent.search.indexer.fetch_urls import MAX_RETRY_AFTER_SECONDS, HttpCache, _retry_delay, fetch_all
+
+
+class FakeDocsSite(BaseHTTPRequestHandler):
+    pages = {}
+    downloads = 0
+    not_modified = 0
+    failures_left = {}
+    stale_304s_left = {}
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        cls = FakeDocsSite
+        if cls.stale_304s_left.get(self.path, 0) > 0:
+            cls.stale_304s_left[self.path] -= 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        if cls.failures_left.get(self.path, 0) > 0:
+            cls.failures_left[self.path] -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = cls.pages.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = f'"{hash(body)}"'
+        if self.headers.get("If-None-Match") == etag:
+            cls.not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        cls.downloads += 1
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def docs_site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeDocsSite)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_unchanged_pages_cost_a_304(docs_site, tmp_path):
+    FakeDocsSite.pages = {f"/aws_lambda.Page{number}.html": f"<h1>Page {number}</h1>".encode() for number in range(10)}
+    FakeDocsSite.pages["/aws_s3.Copy.html"] = b"<h1>Page 0</h1>"
+    FakeDocsSite.failures_left = {"/aws_lambda.Page3.html": 2}
+    urls = [f"{docs_site}{path}" for path in FakeDocsSite.pages] + [f"{docs_site}/missing.html"]
+
+    results = asyncio.run(fetch_all(urls, HttpCache(tmp_path), max_concurrency=4, backoff_seconds=0.01))
+
+    assert [result.status for result in results] == ["fetched"] * 11 + ["error"]
+    assert results[3].attempts == 3
+    assert results[-1].error == "HTTP 404" and results[-1].attempts == 1
+    # identical bodies are stored once
+    assert results[0].content_hash == results[10].content_hash
+    assert len(list((tmp_path / "objects").glob("*/*.html"))) == 10
+
+    FakeDocsSite.downloads = 0
+    FakeDocsSite.pages["/aws_lambda.Page5.html"] = b"<h1>Page 5 changed</h1>"
+    results = asyncio.run(fetch_all(urls[:-1], HttpCache(tmp_path), backoff_seconds=0.01))
+
+    assert [result.status for result in results].count("not_modified") == 10
+    assert results[5].status == "fetched"
+    assert FakeDocsSite.downloads == 1 and FakeDocsSite.not_modified == 10
+    assert HttpCache(tmp_path).object_path(results[5].content_hash).read_bytes() == b"<h1>Page 5 changed</h1>"
+
+
+def test_a_304_without_a_cached_copy_is_fetched_again_unconditionally(docs_site, tmp_path):
+    FakeDocsSite.pages = {"/aws_sqs.Queue.html": b"<h1>Queue</h1>"}
+    FakeDocsSite.failures_left = {}
+    url = f"{docs_site}/aws_sqs.Queue.html"
+    cache = HttpCache(tmp_path)
+    asyncio.run(fetch_all([url], cache, backoff_seconds=0.01))
+
+    # the cached copy is gone by the time the server confirms it
+    cache.object_path(cache.entry(url)["content_hash"]).unlink()
+    FakeDocsSite.stale_304s_left = {"/aws_sqs.Queue.html": 1}
+    results = asyncio.run(fetch_all([url], cache, backoff_seconds=0.01))
+    assert results[0].status == "fetched" and results[0].attempts == 2
+    assert cache.object_path(results[0].content_hash).read_bytes() == b"<h1>Queue</h1>"
+
+    FakeDocsSite.stale_304s_left = {"/aws_sqs.Queue.html": 5}
+    results = asyncio.run(fetch_all([url], HttpCache(tmp_path / "empty"), retries=1, backoff_seconds=0.01))
+    assert results[0].status == "error" and results[0].error == "HTTP 304 without a cached copy"
+    FakeDocsSite.stale_304s_left = {}
+
+
+def test_retry_after_is_parsed_in_both_forms_and_capped():
+    in_thirty_seconds = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    yesterday = format_datetime(datetime.now(timezone.utc) - timedelta(days=1), usegmt=True)
+
+    assert _retry_delay(1, 0.5, "7") == 7.0
+    assert 25 < _retry_delay(1, 0.5, in_thirty_seconds) <= 30
+    assert _retry_delay(1, 0.5, yesterday) == 0.0
+    assert _retry_delay(1, 0.5, "86400") == MAX_RETRY_AFTER_SECONDS
+    # an unparseable header falls back to the backoff
+    assert 0.5 <= _retry_delay(1, 0.5, "soon") <= 0.75
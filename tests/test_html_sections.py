@@ -0,0 +1,100 @@
+from llm_cdk_app_agent.search.indexer.fetch_urls import HttpCache, split_docs
+from llm_cdk_app_agent.search.indexer.html_sections import ReferencePageParser, page_metadata
+
+
+BASE_URL = "https://docs.aws.amazon.com/cdk/api/v2/docs"
+
+ALIAS_PAGE = """<html><head><script>var tracking = 1;</script><style>h1 {}</style></head>
+<body><nav><a href="/">API Reference</a></nav>
+<h1>class Alias (construct)</h1>
+<p>A new alias to a particular version of a Lambda function.</p>
+<p>Example</p>
+<pre>const fn = new lambda.Function(this, 'MyFunction', {
+  runtime: lambda.Runtime.NODEJS_18_X,
+});</pre>
+<h2 id="initializer">Initializer</h2>
+<pre>new Alias(scope: Construct, id: string, props: AliasProps)</pre>
+<h2>Construct Props</h2>
+<table><tr><th>Name</th><th>Type</th><th>Description</th></tr>
+<tr><td>aliasName</td><td><code>string</code></td><td>Name of this alias.</td></tr>
+<tr><td>version</td><td><code>IVersion</code></td><td>Function version this alias refers to.</td></tr></table>
+<h2>Methods</h2>
+<h3 id="addautoscaling">addAutoScaling(options)</h3>
+<pre>public addAutoScaling(options: AutoScalingOptions): IScalableFunctionAttribute</pre>
+<p>Configure provisioned concurrency autoscaling on a function alias &amp; return a scalable attribute.</p>
+<h2>Example</h2>
+<pre>alias.addAutoScaling({ maxCapacity: 50 });</pre>
+<footer>Copyright Amazon</footer>
+</body></html>"""
+
+
+def _sections(html, url=f"{BASE_URL}/aws-cdk-lib.aws_lambda.Alias.html", piece=7):
+    parser = ReferencePageParser(url)
+    sections = []
+    for start in range(0, len(html), piece):
+        parser.feed(html[start : start + piece])
+        sections.extend(parser.drain())
+    parser.close()
+    return sections + parser.drain()
+
+
+def test_page_metadata_comes_from_the_url():
+    assert page_metadata(f"{BASE_URL}/aws-cdk-lib.aws_lambda.Alias.html") == {
+        "url": f"{BASE_URL}/aws-cdk-lib.aws_lambda.Alias.html",
+        "package": "aws-cdk-lib",
+        "module": "aws_lambda",
+        "construct": "Alias",
+    }
+    assert page_metadata(f"{BASE_URL}/aws-cdk-lib.aws_s3-readme.html")["module"] == "aws_s3"
+
+
+def test_parser_splits_a_page_fed_in_pieces_into_sections():
+    sections = _sections(ALIAS_PAGE)
+
+    assert [(section.kind, section.title) for section in sections] == [
+        ("example", "class Alias (construct)"),
+        ("construct", "class Alias (construct)"),
+        ("construct", "Alias Initializer"),
+        ("property", "Alias Construct Props"),
+        ("method", "Alias.addAutoScaling(options)"),
+        ("example", "Alias Example"),
+    ]
+    example, intro, initializer, props, method, _ = sections
+    assert example.text.startswith("const fn = new lambda.Function(this, 'MyFunction', {\n  runtime")
+    assert intro.text == "A new alias to a particular version of a Lambda function.\n\nExample"
+    assert "tracking" not in intro.text and "API Reference" not in intro.text
+    assert initializer.metadata["anchor"] == "initializer"
+    assert "aliasName | string | Name of this alias." in props.text.splitlines()
+    assert method.metadata == {
+        "url": f"{BASE_URL}/aws-cdk-lib.aws_lambda.Alias.html",
+        "package": "aws-cdk-lib",
+        "module": "aws_lambda",
+        "construct": "Alias",
+        "kind": "method",
+        "section": "Alias.addAutoScaling(options)",
+        "group": "Methods",
+        "anchor": "addautoscaling",
+    }
+    assert "alias & return" in method.text
+    assert sections == _sections(ALIAS_PAGE, piece=len(ALIAS_PAGE))
+
+
+def test_split_docs_yields_section_chunks_from_the_cache(tmp_path):
+    cache = HttpCache(tmp_path)
+    for number in range(6):
+        url = f"{BASE_URL}/aws-cdk-lib.aws_lambda.Alias{number}.html"
+        cache.store(url, ALIAS_PAGE.replace("class Alias", f"class Alias{number}").encode(), None, None)
+    long_url = f"{BASE_URL}/aws-cdk-lib.aws_s3.Bucket.html"
+    cache.store(long_url, ("<h1>class Bucket</h1><p>" + "An S3 bucket. " * 200 + "</p>").encode(), None, None)
+    cache.save()
+
+    documents = split_docs(tmp_path, max_workers=2, chunk_size=500, chunk_overlap=50)
+    first = next(documents)
+    rest = list(documents)
+
+    assert first.metadata["construct"] == "Alias0" and first.metadata["kind"] == "example"
+    assert len([document for document in rest if document.metadata["kind"] == "method"]) == 6
+    bucket = [document for document in rest if document.metadata["url"] == long_url]
+    assert len(bucket) > 1 and all(document.page_content.startswith("class Bucket\n") for document in bucket)
+    assert [document.metadata["chunk_number"] for document in bucket] == list(range(len(bucket)))
+    assert len({document.metadata["file_key"] for document in bucket}) == 1
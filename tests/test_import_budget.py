@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+# the cold-import budget of the lightweight modules, measured in a fresh interpreter
+IMPORT_BUDGET_SECONDS = 0.5
+# modules that are slow to import or reach the network, and must only load on first use
+HEAVY_MODULES = [
+    "boto3",
+    "aws_lambda_powertools",
+    "pinecone",
+    "langchain",
+    "langchain.callbacks",
+    "langchain.chat_models",
+    "langchain.embeddings",
+    "openai",
+    "tiktoken",
+]
+REPO_ROOT = Path(__file__).parent.parent
+
+
+def _cold_import(module, env=None):
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+@pytest.mark.parametrize(
+    "module, allowed",
+    [
+        ("llm_cdk_app_agent.secret_provider", []),
+        ("llm_cdk_app_agent.search.config", []),
+        # the chats subclass langchain's message schema, so only langchain's chat models must stay unloaded
+        ("llm_cdk_app_agent.llms.schemas", ["langchain"]),
+    ],
+)
+def test_cold_import_budget(module, allowed):
+    result = _cold_import(module)
+
+    assert result["seconds"] < IMPORT_BUDGET_SECONDS
+    assert not [heavy for heavy in HEAVY_MODULES if heavy in result["modules"] and heavy not in allowed]
+
+
+def test_search_config_imports_without_fetching_secrets():
+    # without AWS credentials any secret fetch at import time would fail the import
+    result = _cold_import(
+        "llm_cdk_app_agent.search.config",
+        env={"SECRET_PROVIDER": "local", "AWS_ACCESS_KEY_ID": "", "AWS_SECRET_ACCESS_KEY": ""},
+    )
+
+    assert "boto3" not in result["modules"]
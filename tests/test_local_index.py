@@ -0,0 +1,102 @@
+import numpy as np
+
+from llm_cdk_app_agent.search.local_index import LocalIndexManager
+
+
+def test_upsert_and_query_by_namespace(tmp_path):
+    index = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=3)
+    index.upsert([("a", [1.0, 0.0, 0.0], {"module": "aws_lambda"}), ("b", [0.0, 1.0, 0.0])], namespace="fastapi-docs")
+    index.upsert([("c", [1.0, 0.1, 0.0])], namespace="cdk")
+
+    response = index.query(vector=[0.9, 0.1, 0.0], top_k=2, namespace="fastapi-docs", include_metadata=True)
+
+    assert [match.id for match in response.matches] == ["a", "b"]
+    assert response.matches[0].metadata == {"module": "aws_lambda"}
+    assert index.describe_index_stats().total_vector_count == 3
+
+
+def test_overwrite_delete_and_filter(tmp_path):
+    index = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=2)
+    index.upsert([("a", [1.0, 0.0], {"module": "x"}), ("b", [0.0, 1.0], {"module": "y"})])
+    index.upsert([("a", [0.0, 1.0], {"module": "x"})])
+    index.delete(ids=["b"])
+
+    response = index.query(vector=[0.0, 1.0], top_k=5, filter={"module": {"$in": ["x", "y"]}})
+
+    assert [match.id for match in response.matches] == ["a"]
+    assert response.matches[0].score == 1.0
+
+
+def test_duplicate_ids_in_one_batch_keep_the_last_copy(tmp_path):
+    index = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=2)
+    index.upsert([("a", [1.0, 0.0], {"copy": 1}), ("b", [0.5, 0.5]), ("a", [0.0, 1.0], {"copy": 2})])
+
+    response = index.query(vector=[0.0, 1.0], top_k=5, include_metadata=True)
+
+    assert [match.id for match in response.matches] == ["a", "b"] and response.matches[0].metadata == {"copy": 2}
+    index.delete(ids=["a", "b"])
+    assert index.query(vector=[0.0, 1.0], top_k=5).matches == []
+    assert index.describe_index_stats().total_vector_count == 0
+
+
+def test_index_is_shared_between_handles(tmp_path):
+    manager = LocalIndexManager(root_dir=tmp_path)
+    writer = manager.create_or_get_index(dimension=2)
+    reader = manager.create_or_get_index(dimension=2)
+
+    writer.upsert([("a", [1.0, 0.0])])
+    assert [match.id for match in reader.query(vector=[1.0, 0.0], top_k=1).matches] == ["a"]
+
+    writer.upsert([(str(i), [1.0, float(i)]) for i in range(2000)])
+    assert reader.describe_index_stats().total_vector_count == 2001
+
+
+def test_writes_append_to_the_log_and_other_handles_read_only_the_tail(tmp_path):
+    writer = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=2)
+    reader = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=2)
+    writer.upsert([(str(i), [1.0, float(i)], {"text": "chunk " * 50}) for i in range(100)])
+    namespace_dir = next((tmp_path / "llm-cdk-agent" / "namespaces").iterdir())
+    assert reader.describe_index_stats().total_vector_count == 100
+
+    writer.upsert([("0", [0.0, 1.0], {"text": "replaced"})])
+    writer.delete(ids=["1", "2"])
+    reader_store = reader._namespace(None)  # pylint: disable=protected-access
+    rows_read = reader_store.rows_bytes
+    matches = reader.query(vector=[0.0, 1.0], top_k=1, include_metadata=True).matches
+
+    # the state file stays small, and the reader only read the one appended row
+    assert (namespace_dir / "state.json").stat().st_size < 200
+    assert reader_store.rows_bytes - rows_read == len('["0", {"text": "replaced"}]\n')
+    assert matches[0].id == "0" and matches[0].metadata == {"text": "replaced"}
+    assert reader.describe_index_stats().total_vector_count == 98
+
+    writer.compact()
+    assert reader.describe_index_stats().total_vector_count == 98 and reader_store.count == 98
+    assert reader.fetch(["3"])["3"].metadata == {"text": "chunk " * 50}
+    assert sorted(path.name for path in namespace_dir.glob("*.*.*")) == ["rows.1.jsonl", "tombstones.1.i64"]
+
+
+def test_approximate_query_matches_exact_for_nearby_vectors(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 8)).astype(np.float32)
+    index = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=8)
+    index.upsert([(str(i), vector.tolist()) for i, vector in enumerate(vectors)])
+    index.build_ivf(n_lists=10)
+
+    exact = index.query(vector=vectors[42].tolist(), top_k=1)
+    approximate = index.query(vector=vectors[42].tolist(), top_k=1, approximate=True, n_probe=2)
+
+    assert exact.matches[0].id == approximate.matches[0].id == "42"
+
+
+def test_approximate_query_probing_every_list_keeps_ids_and_scores_aligned(tmp_path):
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(50, 8)).astype(np.float32)
+    index = LocalIndexManager(root_dir=tmp_path).create_or_get_index(dimension=8)
+    index.upsert([(f"v{i}", vector.tolist()) for i, vector in enumerate(vectors)])
+    index.build_ivf()
+
+    for row in (10, 20, 30):
+        # the default n_probe covers every list of a 50 vector index
+        match = index.query(vector=vectors[row].tolist(), top_k=1, approximate=True).matches[0]
+        assert match.id == f"v{row}" and abs(match.score - 1.0) < 1e-5
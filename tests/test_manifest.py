@@ -0,0 +1,109 @@
+from pathlib import Path
+
+from git import Repo
+from langchain.embeddings.fake import DeterministicFakeEmbedding
+
+from llm_cdk_app_agent.search.indexer.fastapi_data import create_dataset, sync_github_docs
+from llm_cdk_app_agent.search.indexer.manifest import IndexManifest, sync_files
+from llm_cdk_app_agent.search.local_index import LocalIndexManager
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += len(texts)
+        return super().embed_documents(texts)
+
+
+def split_lines(text):
+    return [line for line in text.splitlines() if line]
+
+
+def _files(docs_dir):
+    return [(path.name, path, {"source": path.name}) for path in sorted(docs_dir.iterdir())]
+
+
+def test_sync_only_touches_changed_and_deleted_files(tmp_path):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    (docs_dir / "a.md").write_text("alpha\nbeta\n")
+    (docs_dir / "b.md").write_text("gamma\n")
+    (docs_dir / "c.md").write_text("delta\n")
+    index = LocalIndexManager(root_dir=tmp_path / "index").create_or_get_index(dimension=8)
+    embeddings = CountingEmbedding(size=8)
+    manifest_path = tmp_path / "manifest.json"
+
+    stats = sync_files(IndexManifest(manifest_path), "docs", "sha1", _files(docs_dir), split_lines, index, embeddings)
+    assert (stats.indexed_files, stats.upserted_chunks) == (3, 4)
+    assert index.describe_index_stats().total_vector_count == 4
+
+    (docs_dir / "a.md").write_text("alpha\nbeta changed\n")
+    (docs_dir / "c.md").unlink()
+    embeddings.calls = 0
+    stats = sync_files(IndexManifest(manifest_path), "docs", "sha2", _files(docs_dir), split_lines, index, embeddings)
+
+    assert (stats.skipped_files, stats.indexed_files, stats.deleted_files) == (1, 1, 1)
+    assert embeddings.calls == 2
+    assert index.describe_index_stats().total_vector_count == 3
+    assert IndexManifest(manifest_path).git_sha("docs") == "sha2"
+
+
+def _commit(repo, files):
+    """Write the files of a cached repo, None removing one, and commit them so the repo's sha changes."""
+    for name, text in files.items():
+        path = Path(repo.working_tree_dir) / name
+        if text is None:
+            path.unlink()
+            repo.index.remove([name])
+        else:
+            path.write_text(text)
+            repo.index.add([name])
+    repo.index.commit("update docs")
+
+
+def _cached_repo(tmp_path, files):
+    # a repo already in the cache is loaded instead of cloned, so no network is needed
+    repo = Repo.init(tmp_path / "cache" / "docs")
+    _commit(repo, files)
+    return repo
+
+
+def test_create_dataset_copies_changed_files_and_removes_deleted_ones(tmp_path):
+    repo = _cached_repo(tmp_path, {"a.md": "alpha\n", "b.md": "beta\n"})
+    output_dir = tmp_path / "dataset"
+
+    create_dataset(["https://github.com/org/docs"], output_dir, tmp_path / "cache")
+    assert sorted(path.name for path in (output_dir / "docs").iterdir()) == ["docs-a.md", "docs-b.md"]
+
+    _commit(repo, {"a.md": "alpha changed\n", "b.md": None})
+    create_dataset(["https://github.com/org/docs"], output_dir, tmp_path / "cache")
+    assert [path.name for path in (output_dir / "docs").iterdir()] == ["docs-a.md"]
+    assert (output_dir / "docs" / "docs-a.md").read_text() == "alpha changed\n"
+
+    # a repo left without files still has its stale files removed
+    _commit(repo, {"a.md": None})
+    create_dataset(["https://github.com/org/docs"], output_dir, tmp_path / "cache")
+    assert not list((output_dir / "docs").iterdir()) and not list((output_dir / "metadata" / "docs").iterdir())
+    assert IndexManifest(output_dir / "manifest.json").files("docs") == {}
+
+
+def test_sync_github_docs_skips_unchanged_repos_and_deletes_removed_files(tmp_path):
+    repo = _cached_repo(tmp_path, {"a.md": "alpha\nbeta\n", "b.md": "gamma\n"})
+    index = LocalIndexManager(root_dir=tmp_path / "index").create_or_get_index(dimension=8)
+    embeddings = CountingEmbedding(size=8)
+    manifest = IndexManifest(tmp_path / "manifest.json")
+
+    def sync():
+        return sync_github_docs(["https://github.com/org/docs"], tmp_path / "cache", index, embeddings, manifest, split_lines)
+
+    assert (sync().indexed_files, index.describe_index_stats().total_vector_count) == (2, 3)
+    embeddings.calls = 0
+    assert sync().indexed_files == 0 and embeddings.calls == 0
+
+    _commit(repo, {"a.md": None, "b.md": None})
+    stats = sync()
+
+    assert (stats.deleted_files, stats.deleted_chunks) == (2, 3)
+    assert index.describe_index_stats().total_vector_count == 0
+    assert manifest.git_sha("docs") == repo.head.commit.hexsha
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from uuid import uuid4
+
+import pytest
+from langchain.schema import HumanMessage
+
+from llm_cdk_app_agent.llms.rate_limit import RateLimiter, RateLimits, TokenBucket
+from llm_cdk_app_agent.llms.response_cache import ResponseCache, get_chat_completion
+from llm_cdk_app_agent.llms.schemas import (
+    MODEL_NAME_TO_RATE_LIMITS,
+    ChatRole,
+    ChatSession,
+    ModelClientRegistry,
+    ModelName,
+    UserChat,
+    get_model,
+)
+
+
+class FakeChatCompletions(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeChatCompletions.requests += 1
+        payload = json.dumps(
+            {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_chat_endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeChatCompletions)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def test_clients_are_reused_per_model_key_and_stream():
+    registry = ModelClientRegistry()
+
+    model = get_model(ModelName.GPT_TURBO, "key", registry=registry)
+
+    assert get_model(ModelName.GPT_TURBO, "key", registry=registry) is model
+    assert get_model(ModelName.GPT_TURBO, "key", stream=True, registry=registry) is not model
+    assert get_model(ModelName.GPT_4, "key", registry=registry) is not model
+
+
+def test_calls_are_rate_limited_against_a_fake_endpoint(fake_chat_endpoint):
+    limits = {ModelName.GPT_TURBO: RateLimits(requests_per_minute=600, tokens_per_minute=1_000_000, burst_seconds=0.1)}
+    registry = ModelClientRegistry(rate_limits=limits, api_base=fake_chat_endpoint)
+    model = get_model(ModelName.GPT_TURBO, "key", registry=registry)
+
+    replies = [model.predict_messages([HumanMessage(content="ping")]).content for _ in range(3)]
+
+    metrics = registry.metrics()[ModelName.GPT_TURBO]
+    assert replies == ["pong"] * 3
+    assert metrics.requests == 3
+    assert metrics.waited_requests == 2
+    assert metrics.total_wait_seconds >= 0.15
+
+
+def test_async_calls_wait_on_the_event_loop(fake_chat_endpoint):
+    # gpt-4 is missing from the custom limits, so it falls back to its published ones
+    limits = {ModelName.GPT_TURBO: RateLimits(requests_per_minute=600, tokens_per_minute=1_000_000, burst_seconds=0.1)}
+    registry = ModelClientRegistry(rate_limits=limits, api_base=fake_chat_endpoint)
+    model = get_model(ModelName.GPT_TURBO, "key", registry=registry)
+    limiter = registry.limiter(ModelName.GPT_TURBO, "key")
+
+    def blocking_acquire(tokens):
+        raise AssertionError("an async call blocked on the sync limiter")
+
+    limiter.acquire = blocking_acquire
+
+    async def run():
+        return await asyncio.gather(*(model.apredict_messages([HumanMessage(content="ping")]) for _ in range(3)))
+
+    replies = [message.content for message in asyncio.run(run())]
+
+    assert replies == ["pong"] * 3
+    assert (limiter.metrics.requests, limiter.metrics.waited_requests) == (3, 2)
+    assert registry.limiter(ModelName.GPT_4, "key").limits == MODEL_NAME_TO_RATE_LIMITS[ModelName.GPT_4]
+
+
+def test_chat_completions_go_through_the_response_cache(fake_chat_endpoint, tmp_path):
+    registry = ModelClientRegistry(api_base=fake_chat_endpoint)
+    cache = ResponseCache(tmp_path)
+    requests_before = FakeChatCompletions.requests
+
+    replies = [
+        get_chat_completion(
+            ModelName.GPT_TURBO,
+            "key",
+            ChatSession(chats=[UserChat(content="ping", role=ChatRole.USER, id=uuid4())]),
+            cache=cache,
+            registry=registry,
+        ).content
+        for _ in range(3)
+    ]
+
+    assert replies == ["pong"] * 3
+    assert FakeChatCompletions.requests - requests_before == 1
+    assert (cache.stats.hits, cache.stats.misses) == (2, 1)
+
+
+def test_token_bucket_refills_and_limiter_is_fifo():
+    now = [0.0]
+    bucket = TokenBucket(capacity=10, refill_per_second=5, clock=lambda: now[0])
+    bucket.consume(10)
+    assert bucket.wait_time(5) == 1.0
+    now[0] = 1.0
+    assert bucket.wait_time(5) == 0.0
+
+    limiter = RateLimiter(RateLimits(requests_per_minute=6000, tokens_per_minute=6000, burst_seconds=0.01))
+    order = []
+    threads = [threading.Thread(target=lambda i=i: order.append((i, limiter.acquire(1)))) for i in range(5)]
+    for thread in threads:
+        thread.start()
+        thread.join(0.001)
+    for thread in threads:
+        thread.join()
+    assert len(order) == 5
+    assert limiter.metrics.queue_depth == 0
@@ -0,0 +1,70 @@
+import os
+
+from llm_cdk_app_agent.code_writer.read_directory import DirectoryReader
+
+
+def test_pages_large_files_by_line_and_byte(tmp_path):
+    path = tmp_path / "big.py"
+    path.write_text("".join(f"line_{number} = {number}\n" for number in range(1, 10001)))
+    reader = DirectoryReader(max_output_chars=200)
+
+    page = reader.read_lines(str(path), start_line=5000, end_line=5003)
+    assert page.content.splitlines() == [f"line_{number} = {number}" for number in range(5000, 5004)]
+    assert page.total_lines == 10000 and not page.truncated
+
+    budgeted = reader.read_lines(str(path), start_line=1)
+    assert budgeted.truncated and len(budgeted.content) <= 200 and budgeted.content.endswith("\n")
+    assert "read again from line" in budgeted.render()
+
+    byte_page = reader.read_bytes(str(path), start_byte=page.start_byte, length=12)
+    assert byte_page.content == "line_5000 = " and byte_page.start_line == 5000
+
+
+def test_reads_are_cached_until_the_file_changes(tmp_path):
+    path = tmp_path / "app.py"
+    path.write_text("a = 1\n")
+    reader = DirectoryReader()
+
+    assert reader.read_lines(str(path)).content == "a = 1\n"
+    assert reader.read_lines(str(path)).content == "a = 1\n"
+    assert (reader.hits, reader.misses) == (1, 1)
+
+    path.write_text("a = 1\nb = 2\n")
+    assert reader.read_lines(str(path)).content == "a = 1\nb = 2\n"
+    assert reader.misses == 2
+
+
+def test_tree_is_recursive_and_budgeted(tmp_path):
+    (tmp_path / "app" / "stacks").mkdir(parents=True)
+    (tmp_path / "app" / "stacks" / "bucket.py").write_text("x = 1\ny = 2\n")
+    (tmp_path / "app" / "__pycache__").mkdir()
+    (tmp_path / "main.py").write_text("print('hi')\n")
+    for number in range(20):
+        (tmp_path / f"extra_{number}.py").write_text("")
+
+    reader = DirectoryReader()
+    tree = reader.tree(str(tmp_path))
+    assert "  app/\n    stacks/\n      bucket.py (12 bytes)" in tree
+    assert "__pycache__" not in tree and "main.py (12 bytes)" in tree
+
+    # line counts come from files the reader has already indexed, listing a tree doesn't open files
+    reader.read_lines(str(tmp_path / "main.py"))
+    assert "main.py (12 bytes, 1 lines)" in reader.tree(str(tmp_path))
+
+    small = DirectoryReader(max_tree_entries=5).tree(str(tmp_path))
+    assert small.endswith("list a subdirectory to see more.") and len(small.splitlines()) == 7
+    assert os.path.basename(str(tmp_path)) in small.splitlines()[0]
+
+
+def test_line_indexes_are_bounded_by_the_cache_size(tmp_path):
+    reader = DirectoryReader(cache_size=2)
+    paths = []
+    for number in range(4):
+        path = tmp_path / f"file_{number}.py"
+        path.write_text(f"x = {number}\n")
+        paths.append(str(path))
+        reader.read_lines(str(path))
+
+    reader.read_lines(paths[2])
+    reader.read_lines(paths[0])
+    assert list(reader._indexes) == [paths[2], paths[0]]
@@ -0,0 +1,44 @@
+from uuid import uuid4
+
+import pytest
+from langchain.chat_models.fake import FakeListChatModel
+
+from llm_cdk_app_agent.llms.response_cache import CacheMissError, CacheMode, ResponseCache, cached_chat_completion
+from llm_cdk_app_agent.llms.schemas import ChatRole, ChatSession, ModelName, UserChat
+
+
+def _session(content):
+    return ChatSession(chats=[UserChat(content=content, role=ChatRole.USER, id=uuid4())])
+
+
+def test_identical_prompts_are_served_from_the_cache(tmp_path):
+    model = FakeListChatModel(responses=["first", "second", "third"])
+    cache = ResponseCache(tmp_path)
+
+    first = cached_chat_completion(model, ModelName.GPT_TURBO, _session("deploy a lambda"), cache)
+    # a fresh session with new ids and timestamps but the same content is the same prompt
+    repeat = cached_chat_completion(model, ModelName.GPT_TURBO, _session("deploy a lambda"), cache)
+    bypassed = cached_chat_completion(model, ModelName.GPT_TURBO, _session("deploy a lambda"), cache, bypass=True)
+    other_model = cached_chat_completion(model, ModelName.GPT_4, _session("deploy a lambda"), cache)
+
+    assert (first.content, repeat.content, bypassed.content, other_model.content) == ("first", "first", "second", "third")
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.bypassed) == (1, 2, 1)
+
+
+def test_replay_mode_reads_disk_and_fails_on_miss(tmp_path):
+    cached_chat_completion(FakeListChatModel(responses=["recorded"]), ModelName.GPT_TURBO, _session("hi"), ResponseCache(tmp_path))
+    replay = ResponseCache(tmp_path, mode=CacheMode.REPLAY)
+    model = FakeListChatModel(responses=["live"])
+
+    assert cached_chat_completion(model, ModelName.GPT_TURBO, _session("hi"), replay).content == "recorded"
+    with pytest.raises(CacheMissError):
+        cached_chat_completion(model, ModelName.GPT_TURBO, _session("bye"), replay)
+
+
+def test_expired_entries_are_evicted(tmp_path):
+    cache = ResponseCache(tmp_path, ttl_seconds=-1)
+    model = FakeListChatModel(responses=["a", "b"])
+
+    cached_chat_completion(model, ModelName.GPT_TURBO, _session("hi"), cache)
+    assert cached_chat_completion(model, ModelName.GPT_TURBO, _session("hi"), cache).content == "b"
+    assert cache.evict_expired() == 1
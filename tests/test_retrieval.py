@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+
+import numpy as np
+from langchain.embeddings.fake import DeterministicFakeEmbedding
+
+from llm_cdk_app_agent.search.indexer.manifest import IndexManifest, sync_files
+from llm_cdk_app_agent.search.local_index import LocalIndexManager
+from llm_cdk_app_agent.search.retrieval.bm25 import BM25Index, tokenize
+from llm_cdk_app_agent.search.retrieval.hybrid import HybridRetriever, RetrievedChunk, reciprocal_rank_fusion
+from llm_cdk_app_agent.search.retrieval.rerank import merge_adjacent, mmr_select, rerank
+
+
+def test_tokenize_keeps_identifiers_and_their_words():
+    assert tokenize("aws_lambda.EventSourceMapping(") == [
+        "aws_lambda",
+        "aws",
+        "lambda",
+        "eventsourcemapping",
+        "event",
+        "source",
+        "mapping",
+    ]
+
+
+def test_bm25_finds_exact_identifiers_with_filters():
+    index = BM25Index()
+    index.upsert(
+        [
+            ("a", "class EventSourceMapping(Resource): maps an event source to a function", {"module": "aws_lambda"}),
+            ("b", "an event source for the queue, mapping messages to batches", {"module": "aws_lambda_event_sources"}),
+            ("c", "class FunctionUrl(Resource): an https endpoint for a function", {"module": "aws_lambda"}),
+        ],
+        namespace="cdk-docs",
+    )
+    index.upsert([("d", "EventSourceMapping in the fastapi docs", {"module": "other"})], namespace="fastapi-docs")
+
+    assert [match.id for match in index.search("EventSourceMapping", namespace="cdk-docs")][:2] == ["a", "b"]
+    assert [match.id for match in index.search("EventSourceMapping")][:1] in (["a"], ["d"])
+    assert [match.id for match in index.search("FunctionUrl", filter={"module": "aws_lambda"})] == ["c", "a"]
+    assert index.search("event", filter={"module": {"$in": ["aws_lambda_event_sources"]}})[0].id == "b"
+
+    index.upsert([("a", "class Bucket(Resource)", {"module": "aws_s3"})], namespace="cdk-docs")
+    index.delete(["c"], namespace="cdk-docs")
+    assert [match.id for match in index.search("FunctionUrl EventSourceMapping", namespace="cdk-docs")] == ["b"]
+    assert index.search("bucket")[0].metadata == {"module": "aws_s3", "text": "class Bucket(Resource)"}
+
+
+def test_bm25_search_is_fast_on_a_cdk_sized_corpus(tmp_path):
+    rng = random.Random(0)
+    words = [f"word{number}" for number in range(5000)] + ["self", "props", "scope", "construct", "id"]
+    index = BM25Index()
+    index.upsert(
+        (
+            (str(number), " ".join(rng.choices(words, k=30)), {"module": f"module{number % 200}"})
+            for number in range(50_000)
+        ),
+        namespace="cdk-docs",
+    )
+    index.upsert([("target", "props.event_source_mapping EventSourceMapping(self, id)", {"module": "aws_lambda"})], "cdk-docs")
+    index.search("EventSourceMapping self props")
+
+    started_at = time.perf_counter()
+    for _ in range(20):
+        matches = index.search("EventSourceMapping self props", namespace="cdk-docs")
+    assert matches[0].id == "target"
+    assert (time.perf_counter() - started_at) / 20 < 0.05
+
+    index.save(tmp_path / "bm25.pkl")
+    assert BM25Index.load(tmp_path / "bm25.pkl").search("EventSourceMapping")[0].id == "target"
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]])
+    assert [item_id for item_id, _ in fused] == ["b", "a", "d", "c"]
+
+
+def test_hybrid_retriever_fuses_chunks_synced_by_the_indexers(tmp_path):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    (docs_dir / "lambda.md").write_text("EventSourceMapping connects sqs to lambda\nFunctionUrl exposes https\n")
+    (docs_dir / "s3.md").write_text("Bucket stores objects\n")
+    index = LocalIndexManager(root_dir=tmp_path / "index").create_or_get_index(dimension=16)
+    embeddings = DeterministicFakeEmbedding(size=16)
+    lexical_index = BM25Index()
+    files = [(path.name, path, {"github_url": f"https://github.com/docs/{path.name}"}) for path in sorted(docs_dir.iterdir())]
+
+    sync_files(
+        IndexManifest(tmp_path / "manifest.json"),
+        "docs",
+        "sha",
+        files,
+        lambda text: text.splitlines(),
+        index,
+        embeddings,
+        namespace="cdk-docs",
+        lexical_index=lexical_index,
+    )
+    with HybridRetriever(lexical_index, index, embeddings) as retriever:
+        chunks = retriever.search("FunctionUrl", top_k=3, namespace="cdk-docs")
+        filtered = retriever.search(
+            "objects", namespace="cdk-docs", filter={"github_url": "https://github.com/docs/s3.md"}, include_values=True
+        )
+    # leaving the block stops the lexical search thread
+    assert not any(thread.name.startswith("lexical") for thread in threading.enumerate())
+
+    assert chunks[0].text == "FunctionUrl exposes https"
+    assert chunks[0].lexical_rank == 1 and chunks[0].vector_rank is not None
+    assert len(chunks) == 3
+    assert [chunk.text for chunk in filtered] == ["Bucket stores objects"]
+    assert len(filtered[0].values) == 16
+    assert filtered[0].to_document().metadata["github_url"].endswith("s3.md")
+
+
+def test_synced_lexical_index_survives_a_restart_and_matches_the_vector_namespace(tmp_path):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    (docs_dir / "lambda.md").write_text("FunctionUrl exposes https\n")
+    index = LocalIndexManager(root_dir=tmp_path / "index").create_or_get_index(dimension=16)
+    embeddings = DeterministicFakeEmbedding(size=16)
+    index.upsert([("other", embeddings.embed_query("FunctionUrl elsewhere"), {"text": "FunctionUrl elsewhere"})], namespace="other")
+
+    def sync():
+        lexical_index = BM25Index.load(tmp_path / "bm25.pkl")
+        files = [(path.name, path, {}) for path in sorted(docs_dir.iterdir())]
+        manifest = IndexManifest(tmp_path / "manifest.json")
+        stats = sync_files(manifest, "docs", "sha", files, lambda text: text.splitlines(), index, embeddings, lexical_index=lexical_index)
+        return lexical_index, stats
+
+    sync()
+    # a restart skips the unchanged file, its chunks must come back from the saved lexical index
+    lexical_index, stats = sync()
+    lexical_index.upsert([("other", "FunctionUrl elsewhere", {})], namespace="other")
+
+    assert stats.skipped_files == 1 and len(lexical_index) == 2
+    with HybridRetriever(lexical_index, index, embeddings) as retriever:
+        chunks = retriever.search("FunctionUrl")
+    assert [chunk.text for chunk in chunks] == ["FunctionUrl exposes https"]
+    assert chunks[0].lexical_rank == 1 and chunks[0].vector_rank == 1
+
+
+def _chunk(chunk_id, text, values, file_key=None, number=None, score=1.0):
+    metadata = {} if file_key is None else {"file_key": file_key, "chunk_number": number}
+    return RetrievedChunk(id=chunk_id, score=score, text=text, metadata=metadata, values=values)
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = np.array([[1.0, 0.0, 0.0], [0.99, 0.14, 0.0], [0.6, 0.8, 0.0], [0.0, 0.0, 1.0]])
+
+    assert mmr_select([1.0, 0.1, 0.0], vectors, k=2, lambda_mult=1.0) == [1, 0]
+    assert mmr_select([1.0, 0.1, 0.0], vectors, k=3, lambda_mult=0.3) == [1, 3, 2]
+    assert sorted(mmr_select([1.0, 0.0, 0.0], vectors, k=10)) == [0, 1, 2, 3]
+
+
+def test_mmr_is_fast_for_hundreds_of_candidates():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 1536)).astype(np.float32)
+
+    started_at = time.perf_counter()
+    picked = mmr_select(rng.normal(size=1536), vectors, k=50)
+
+    assert len(set(picked)) == 50
+    assert time.perf_counter() - started_at < 0.5
+
+
+def test_rerank_merges_neighbours_and_packs_to_budget():
+    chunks = [
+        _chunk("a1", "class Function(Resource):\n    def __init__(self", [1.0, 0.0], "lambda.py", 4, score=0.9),
+        _chunk("b", "class Bucket(Resource): stores objects", [0.0, 1.0], "s3.py", 0, score=0.8),
+        _chunk("a2", "    def __init__(self, scope, id):", [0.9, 0.1], "lambda.py", 5, score=0.7),
+        _chunk("c", "x" * 400, [0.5, 0.5], score=0.6),
+    ]
+
+    merged = merge_adjacent(chunks)
+    assert [chunk.id for chunk in merged] == ["a1+a2", "b", "c"]
+    assert merged[0].text == "class Function(Resource):\n    def __init__(self, scope, id):"
+    assert merged[0].score == 0.9 and merged[0].metadata["merged_chunks"] == 2
+
+    packed = rerank("lambda function", chunks, DeterministicFakeEmbedding(size=2), max_tokens=40, lambda_mult=1.0, query_vector=[1.0, 0.0])
+    assert [chunk.id for chunk in packed] == ["a1+a2", "b"]
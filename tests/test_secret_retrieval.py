@@ -1,10 +1,42 @@
-from aws_lambda_powertools.utilities import parameters
-import os
+import boto3
+import pytest
 
+from llm_cdk_app_agent.secret_provider import AwsSecretProvider, CachedSecretProvider, LocalSecretProvider
 
-os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
-openai_secret = parameters.get_secret("openai")
-pinecone_secret = parameters.get_secret("pinecone")
 
-print(openai_secret[:10])
-print(pinecone_secret[:10])
\ No newline at end of file
+requires_aws = pytest.mark.skipif(
+    boto3.session.Session().get_credentials() is None,
+    reason="needs AWS credentials",
+)
+
+
+@requires_aws
+def test_aws_secrets_are_retrievable():
+    provider = AwsSecretProvider()
+    assert provider.get_secret("openai")
+    assert provider.get_secret("pinecone")
+
+
+def test_local_provider_reads_memory_then_environment(monkeypatch):
+    monkeypatch.setenv("LOCAL_SECRET_PINECONE", "pinecone-key")
+    provider = LocalSecretProvider({"openai": "openai-key"})
+
+    assert provider.get_secret("openai") == "openai-key"
+    assert provider.get_secret("pinecone") == "pinecone-key"
+    with pytest.raises(KeyError):
+        provider.get_secret("missing")
+
+
+def test_cached_provider_fetches_once_per_ttl():
+    calls = []
+
+    class CountingProvider:
+        def get_secret(self, name):
+            calls.append(name)
+            return f"{name}-{len(calls)}"
+
+    cached = CachedSecretProvider(CountingProvider(), ttl_seconds=60)
+    assert cached.get_secret("openai") == cached.get_secret("openai") == "openai-1"
+
+    expired = CachedSecretProvider(CountingProvider(), ttl_seconds=0)
+    assert expired.get_secret("openai") != expired.get_secret("openai")
@@ -0,0 +1,110 @@
+import json
+import threading
+from uuid import uuid4
+
+import pytest
+from langchain.schema import HumanMessage, LLMResult
+from langchain.schema.output import ChatGeneration
+from langchain.schema.messages import AIMessage
+
+from llm_cdk_app_agent import tracing
+from llm_cdk_app_agent.code_writer.code_runner import FileRunner
+from llm_cdk_app_agent.code_writer.code_writer_base import CodeWriter
+from llm_cdk_app_agent.code_writer.workspace import Workspace
+from llm_cdk_app_agent.llms.callbacks import TracingCallbackHandler
+
+
+@pytest.fixture
+def spans(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    metrics = tracing.SpanMetrics()
+    tracing.configure(tracing.JsonlExporter(path), metrics)
+
+    def read():
+        return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+    read.metrics = metrics
+    yield read
+    tracing.configure()
+
+
+def test_disabled_tracer_hands_out_the_noop_span(tmp_path):
+    tracing.configure()
+
+    with tracing.span("noop", attribute=1) as span:
+        span.set_attribute("ignored", True)
+
+    assert span is tracing.NOOP_SPAN and tracing.current_span() is tracing.NOOP_SPAN
+    # instrumented code runs straight through and nothing is written
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+    writer.create("x = 1\n", "main.py")
+    assert (tmp_path / "main.py").read_text() == "x = 1\n"
+
+
+def test_spans_nest_record_errors_and_are_written_as_jsonl(spans):
+    with tracing.span("agent.step", step=1):
+        with tracing.span("retrieval.search") as search:
+            search.set_attribute("chunks", 3)
+        with pytest.raises(ValueError):
+            with tracing.span("code_writer.create"):
+                raise ValueError("bad path")
+
+    inner, failed, outer = spans()
+    assert [inner["name"], failed["name"], outer["name"]] == ["retrieval.search", "code_writer.create", "agent.step"]
+    assert inner["parent_id"] == failed["parent_id"] == outer["span_id"] and outer["parent_id"] is None
+    assert inner["trace_id"] == outer["trace_id"]
+    assert inner["attributes"] == {"chunks": 3} and outer["attributes"] == {"step": 1}
+    assert failed["status"] == "error" and failed["error"] == "ValueError: bad path"
+    assert outer["end_time_ns"] >= inner["end_time_ns"] >= inner["start_time_ns"] >= outer["start_time_ns"]
+    stats = spans.metrics.snapshot()
+    assert stats["code_writer.create"].errors == 1 and stats["agent.step"].count == 1
+
+
+def test_spans_from_other_threads_start_their_own_trace(spans):
+    def work():
+        with tracing.span("worker"):
+            pass
+
+    with tracing.span("parent"):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    worker, parent = spans()
+    assert worker["parent_id"] is None and worker["trace_id"] != parent["trace_id"]
+
+
+def test_agent_operations_are_traced_with_their_attributes(spans, tmp_path):
+    writer = CodeWriter(workspace=Workspace(str(tmp_path)))
+    writer.create("import sys\nsys.exit(3)\n", "/app/main.py")
+    result = FileRunner().run_file(str(tmp_path / "app" / "main.py"))
+
+    flush, write, create, run = spans()
+    assert create["name"] == "code_writer.create" and create["attributes"] == {"filepath": "/app/main.py"}
+    assert write["name"] == "code_writer.write" and write["parent_id"] == create["span_id"]
+    assert flush["name"] == "code_writer.flush" and flush["parent_id"] == write["span_id"]
+    assert flush["attributes"] == {"files": 1}
+    assert run["name"] == "code_runner.run"
+    assert run["attributes"]["exit_code"] == result.exit_code == 3
+    assert run["attributes"]["timed_out"] is False and run["attributes"]["peak_rss_bytes"] > 0
+
+
+def test_llm_calls_are_traced_with_tokens_in_and_out(spans):
+    handler = TracingCallbackHandler("gpt-4")
+    reported, estimated, failed = uuid4(), uuid4(), uuid4()
+    for run_id in (reported, estimated, failed):
+        handler.on_chat_model_start({}, [[HumanMessage(content="x" * 400)]], run_id=run_id)
+
+    generation = ChatGeneration(message=AIMessage(content="y" * 80))
+    handler.on_llm_end(
+        LLMResult(generations=[[generation]], llm_output={"token_usage": {"prompt_tokens": 97, "completion_tokens": 21, "total_tokens": 118}}),
+        run_id=reported,
+    )
+    handler.on_llm_end(LLMResult(generations=[[generation]]), run_id=estimated)
+    handler.on_llm_error(TimeoutError("read timed out"), run_id=failed)
+
+    first, second, third = spans()
+    assert first["attributes"] == {"model": "gpt-4", "messages": 1, "tokens_in": 97, "tokens_out": 21, "tokens_estimated": False}
+    assert second["attributes"] == {"model": "gpt-4", "messages": 1, "tokens_in": 101, "tokens_out": 20, "tokens_estimated": True}
+    assert third["status"] == "error" and third["error"] == "TimeoutError: read timed out"
+    assert not handler._spans  # pylint: disable=protected-access
@@ -0,0 +1,42 @@
+import asyncio
+from pathlib import Path
+
+from llm_cdk_app_agent.async_file_watcher.watcher import DebouncedIndexWatcher
+
+
+class RecordingIndexer:
+    def __init__(self):
+        self.indexed = []
+        self.deleted = []
+
+    def index_files(self, paths):
+        self.indexed.append(sorted(paths))
+
+    def delete_files(self, paths):
+        self.deleted.append(sorted(paths))
+
+
+def test_bursts_are_coalesced_into_one_batch(tmp_path):
+    indexer = RecordingIndexer()
+    watcher = DebouncedIndexWatcher(indexer, debounce_seconds=0.2)
+    nested = tmp_path / "nested"
+    nested.mkdir()
+
+    async def run():
+        await watcher.start(tmp_path, recursive=True)
+        for i in range(20):
+            (nested / "app.py").write_text(f"print({i})\n")
+        (tmp_path / "gone.py").write_text("")
+        (tmp_path / "gone.py").unlink()
+        await asyncio.sleep(0.1)
+        await watcher.drain()
+        stats = watcher.stats
+        await watcher.stop()
+        return stats
+
+    stats = asyncio.run(run())
+
+    assert indexer.indexed == [[str(nested / "app.py")]]
+    assert indexer.deleted == [[str(Path(tmp_path) / "gone.py")]]
+    assert stats.coalesced_events > 0
+    assert stats.queue_depth == 0